@@ -0,0 +1,310 @@
+"""
+Offline batch generation through the Azure OpenAI Batch API.
+
+Every chat request of a bulk job (e.g. every section prompt of 50 proposals)
+becomes one line of a JSONL file, with custom_id "<run id>::<section>":
+
+    {"custom_id": "<run id>::scope", "method": "POST", "url": "/chat/completions",
+     "body": {"model": "<deployment>", "messages": [...], "max_tokens": 1200, ...}}
+
+The file is uploaded and run as one batch job at the batch discount and on a
+separate quota, so backfills never compete with interactive users. Jobs are
+recorded under BATCH_DIR/<job id>/ (requests.jsonl, job.json, output.jsonl),
+so polling can resume after a restart.
+
+Backends:
+    AzureBatchBackend  files + batches endpoints (needs a Global Batch deployment,
+                       see "batch_deployment" in config/model_routes.json)
+    LocalBatchBackend  stand-in with the same interface: runs the lines through the
+                       gateway's "batch" lane and writes Azure-format output. With
+                       LLM_BACKEND=fake nothing leaves the machine (tests, demos).
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+from Modules import llm_gateway
+from Modules.checkpoints import _write_json
+from Modules.usage_store import usage_labels
+
+
+BATCH_BACKEND = os.getenv("LLM_BATCH_BACKEND", "azure")              # "azure" or "local"
+BATCH_DIR = os.getenv("BATCH_DIR", os.path.join(".runs", "batches"))
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = float(os.getenv("LLM_BATCH_POLL_SECONDS", "60"))
+BATCH_ENDPOINT = "/chat/completions"
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchError(RuntimeError):
+    """A batch job that failed, expired or was cancelled as a whole."""
+
+
+# -------------------------------------------------------
+# JSONL helpers
+# -------------------------------------------------------
+
+def request_line(custom_id, deployment, messages, **params):
+    """One Batch API request line for a chat completion."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": deployment, "messages": messages, **params},
+    }
+
+
+def write_jsonl(path, lines):
+    """Write JSONL atomically (temp file + os.replace)."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".batch-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def parse_jsonl(text):
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_jsonl(f.read())
+
+
+# -------------------------------------------------------
+# Backends
+# -------------------------------------------------------
+
+class AzureBatchBackend:
+    """Azure OpenAI Batch API (files + batches endpoints)."""
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AzureOpenAI
+
+            self._client = AzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION"),
+            )
+        return self._client
+
+    def submit(self, path):
+        client = self._get_client()
+        with open(path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+        )
+        return batch.id
+
+    def status(self, batch_id):
+        batch = self._get_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id,
+            "completed": getattr(counts, "completed", 0) if counts else 0,
+            "failed": getattr(counts, "failed", 0) if counts else 0,
+            "total": getattr(counts, "total", 0) if counts else 0,
+        }
+
+    def download(self, file_id):
+        return self._get_client().files.content(file_id).text
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for the Batch API. The job id is the input path; the first
+    status() call runs every line through the gateway's "batch" lane and
+    writes the output next to the input, in the Batch API output format.
+    """
+
+    def submit(self, path):
+        return f"local:{os.path.abspath(path)}"
+
+    @staticmethod
+    def _output_path(batch_id):
+        return batch_id[len("local:"):] + ".output.jsonl"
+
+    async def _run_line(self, line):
+        body = dict(line["body"])
+        deployment, messages = body.pop("model"), body.pop("messages")
+        run_id, _, section = line["custom_id"].rpartition("::")
+        try:
+            with usage_labels(run_id=run_id or None, section=section):
+                result = await llm_gateway.achat(messages, deployment=deployment, lane="batch", **body)
+        except llm_gateway.LLMError as e:
+            return {
+                "id": f"batch_req_{uuid.uuid4().hex}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": e.status or 500, "body": {"error": {"message": str(e)}}},
+                "error": None,
+            }
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": line["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "model": deployment,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": result.text},
+                        "finish_reason": result.finish_reason,
+                    }],
+                    "usage": result.usage,
+                },
+            },
+            "error": None,
+        }
+
+    async def _run(self, lines):
+        return await asyncio.gather(*[self._run_line(line) for line in lines])
+
+    def status(self, batch_id):
+        output_path = self._output_path(batch_id)
+        if not os.path.exists(output_path):
+            lines = read_jsonl(batch_id[len("local:"):])
+            write_jsonl(output_path, asyncio.run(self._run(lines)))
+        output = read_jsonl(output_path)
+        failed = sum(1 for line in output if line["response"]["status_code"] != 200)
+        return {
+            "status": "completed",
+            "output_file_id": output_path,
+            "error_file_id": None,
+            "completed": len(output) - failed,
+            "failed": failed,
+            "total": len(output),
+        }
+
+    def download(self, file_id):
+        with open(file_id, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+def get_backend(name=None):
+    return LocalBatchBackend() if (name or BATCH_BACKEND) == "local" else AzureBatchBackend()
+
+
+# -------------------------------------------------------
+# Jobs
+# -------------------------------------------------------
+
+def _job_dir(job_id, batch_dir=BATCH_DIR):
+    return os.path.join(batch_dir, job_id)
+
+
+def submit_batch(lines, backend=None, batch_dir=BATCH_DIR, **info):
+    """Write `lines` as JSONL, submit them and record the job. Returns the job dict."""
+    backend = backend or get_backend()
+    job_id = f"batch-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    directory = _job_dir(job_id, batch_dir)
+    input_path = os.path.join(directory, "requests.jsonl")
+    write_jsonl(input_path, lines)
+
+    job = {
+        "job_id": job_id,
+        "batch_id": backend.submit(input_path),
+        "backend": "local" if isinstance(backend, LocalBatchBackend) else "azure",
+        "requests": len(lines),
+        "submitted_at": time.time(),
+        "status": "submitted",
+        **info,
+    }
+    _write_json(os.path.join(directory, "job.json"), job)
+    print(f"📦 Submitted {len(lines)} requests as {job_id} ({job['batch_id']})")
+    return job
+
+
+def load_job(job_id, batch_dir=BATCH_DIR):
+    with open(os.path.join(_job_dir(job_id, batch_dir), "job.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_requests(job, batch_dir=BATCH_DIR):
+    """Request lines the job was submitted with."""
+    return read_jsonl(os.path.join(_job_dir(job["job_id"], batch_dir), "requests.jsonl"))
+
+
+def poll_batch(job, backend=None, interval=BATCH_POLL_SECONDS, timeout=None, batch_dir=BATCH_DIR):
+    """
+    Wait until the job reaches a terminal state and download its output.
+    Returns the output lines; raises BatchError when the job did not complete.
+    """
+    backend = backend or get_backend(job.get("backend"))
+    directory = _job_dir(job["job_id"], batch_dir)
+    started = time.monotonic()
+    while True:
+        state = backend.status(job["batch_id"])
+        if state["status"] in TERMINAL_STATES:
+            break
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {job['job_id']} still {state['status']} after {timeout:.0f}s")
+        print(f"⏳ {job['job_id']}: {state['status']} ({state['completed']}/{state['total']} done)")
+        time.sleep(interval)
+
+    job.update(status=state["status"], finished_at=time.time(), counts={
+        k: state[k] for k in ("completed", "failed", "total")
+    })
+    _write_json(os.path.join(directory, "job.json"), job)
+    if state["status"] != "completed":
+        raise BatchError(f"Batch {job['job_id']} ended as {state['status']}")
+
+    output = []
+    for file_id in (state["output_file_id"], state["error_file_id"]):
+        if file_id:
+            output += parse_jsonl(backend.download(file_id))
+    write_jsonl(os.path.join(directory, "output.jsonl"), output)
+    print(f"✅ {job['job_id']}: {state['completed']}/{state['total']} requests completed")
+    return output
+
+
+def _usage(usage):
+    usage = usage or {}
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "cached_tokens": usage.get("cached_tokens", details.get("cached_tokens", 0)),
+    }
+
+
+def batch_results(output, requests):
+    """
+    {custom_id: LLMResult | LLMError} from Batch API output lines. The
+    deployment comes from the submitted request line: the output only names
+    the model version (e.g. "gpt-4o-2024-08-06").
+    """
+    deployments = {line["custom_id"]: line["body"]["model"] for line in requests}
+    results = {}
+    for line in output:
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        deployment = deployments.get(line["custom_id"])
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or {}
+            results[line["custom_id"]] = llm_gateway.LLMError(
+                error.get("message", "batch request failed"), deployment, response.get("status_code"), 1, False
+            )
+            continue
+        choice = body["choices"][0]
+        results[line["custom_id"]] = llm_gateway.LLMResult(
+            text=choice["message"].get("content") or "",
+            deployment=deployment,
+            finish_reason=choice.get("finish_reason"),
+            usage=_usage(body.get("usage")),
+        )
+    return results
@@ -0,0 +1,62 @@
+"""
+Library of pre-approved proposal text, rendered as-is around the generated parts.
+
+Blocks that come out the same on every run (Crave's profile in the executive
+summary, the issue management / classification / escalation part of the
+communication plan) live in config/boilerplate.json, edited and reviewed like
+any other file. The model writes only the client-specific sentences and cells;
+blocks are appended after them, with `{client}` filled in. The library's
+`version` is stored with every run so a proposal can be traced back to the
+block text it was rendered with. The file is re-read when it changes.
+"""
+import json
+import os
+import threading
+
+from Modules.structured import table_to_markdown
+
+
+BOILERPLATE_PATH = os.getenv("BOILERPLATE_PATH", os.path.join("config", "boilerplate.json"))
+DEFAULT_CLIENT = "the client"
+
+_library = {"mtime": None, "data": {"version": None, "blocks": {}}}
+_library_lock = threading.Lock()
+
+
+def load_library(path=BOILERPLATE_PATH):
+    """{"version": ..., "blocks": {name: markdown}}, re-read whenever the file's mtime changes."""
+    mtime = os.path.getmtime(path)
+    with _library_lock:
+        if _library["mtime"] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            blocks = {
+                name: "\n".join(lines) if isinstance(lines, list) else lines
+                for name, lines in data["blocks"].items()
+            }
+            _library["data"] = {"version": data["version"], "blocks": blocks}
+            _library["mtime"] = mtime
+        return _library["data"]
+
+
+def library_version():
+    return load_library()["version"]
+
+
+def render_block(name, client=None):
+    return load_library()["blocks"][name].replace("{client}", (client or "").strip() or DEFAULT_CLIENT)
+
+
+def render_exec_summary(opening):
+    """Generated client-specific opening followed by Crave's standard profile."""
+    return "\n\n".join([opening.strip(), render_block("crave_profile")])
+
+
+def render_communication_plan(plan):
+    """Communication plan markdown from the generated intro and interaction table plus the standard procedure."""
+    return "\n\n".join([
+        "### Communication Plan",
+        plan["intro"].strip(),
+        "**Exhibit: Daily Interaction**\n" + table_to_markdown(plan["daily_interaction"]),
+        render_block("issue_resolution", plan["client_name"]),
+    ])
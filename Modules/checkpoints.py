@@ -0,0 +1,107 @@
+"""
+Per-run checkpoints of generated proposal sections.
+
+Each proposal run gets a run id and a directory under RUNS_DIR. A section's
+result (or its error) is written there as soon as the section finishes, with
+an atomic file replace. Re-running the same run id reuses finished sections,
+so a retry regenerates only the sections that failed or never finished.
+Shared inputs of the run (reference text, condensed RFP) are stored as
+artifacts, so a retry prompts with exactly the same context.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+
+
+RUNS_DIR = os.getenv("RUNS_DIR", ".runs")
+RUN_RETENTION_SECONDS = 14 * 24 * 3600
+
+
+def new_run_id():
+    return f"run-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def _write_json(path, data):
+    """Write JSON atomically (temp file + os.replace)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ckpt-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class RunCheckpoint:
+    """Section results and artifacts of one proposal run."""
+
+    def __init__(self, run_id, runs_dir=RUNS_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(runs_dir, _safe_name(run_id))
+
+    def _section_path(self, section):
+        return os.path.join(self.path, "sections", f"{_safe_name(section)}.json")
+
+    def _artifact_path(self, name):
+        return os.path.join(self.path, f"{_safe_name(name)}.json")
+
+    # --- sections ---------------------------------------------------------
+
+    def save(self, section, result, **info):
+        _write_json(self._section_path(section), {
+            "status": "done", "result": result, "finished_at": time.time(), **info,
+        })
+
+    def fail(self, section, error):
+        _write_json(self._section_path(section), {
+            "status": "failed", "error": str(error), "finished_at": time.time(),
+        })
+
+    def entry(self, section):
+        return _read_json(self._section_path(section))
+
+    def load(self, section):
+        """Result of a finished section, or None."""
+        entry = self.entry(section)
+        return entry["result"] if entry and entry.get("status") == "done" else None
+
+    def status(self, sections):
+        """{section: "done" | "failed" | "pending"}"""
+        return {s: (self.entry(s) or {}).get("status", "pending") for s in sections}
+
+    def failed(self, sections):
+        return [s for s, state in self.status(sections).items() if state == "failed"]
+
+    # --- artifacts --------------------------------------------------------
+
+    def save_artifact(self, name, data):
+        _write_json(self._artifact_path(name), data)
+
+    def load_artifact(self, name):
+        return _read_json(self._artifact_path(name))
+
+
+def cleanup_runs(runs_dir=RUNS_DIR, retention=RUN_RETENTION_SECONDS):
+    """Delete run directories not modified within `retention` seconds."""
+    if not os.path.isdir(runs_dir):
+        return
+    cutoff = time.time() - retention
+    for name in os.listdir(runs_dir):
+        path = os.path.join(runs_dir, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,112 @@
+"""
+RFP condensation shared by all section prompts.
+
+The extracted RFP is split into chunks, every chunk is summarized concurrently
+on a cheap deployment (map), and the partial briefs are merged into one
+condensed brief (reduce). Both steps are routed through config/model_routes.json
+("rfp_condense_map" / "rfp_condense_merge"). Briefs are cached on disk by a hash of the RFP text,
+so re-running a proposal, or generating several sections from the same RFP,
+condenses it only once.
+
+CONDENSE_MODE=extractive (or mode="extractive") uses the local TextRank
+condenser in Modules/extractive.py instead: no LLM calls, no network.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+
+from Modules import llm_gateway, model_routing
+from Modules.extractive import extractive_condense
+from Modules.ingestion import chunk_text
+from Modules.prompts import get_rfp_chunk_summary_prompt, get_rfp_merge_prompt
+
+
+CONDENSE_MODE = os.getenv("CONDENSE_MODE", "llm")                # "llm" or "extractive"
+CONDENSE_CACHE_DIR = os.getenv("CONDENSE_CACHE_DIR", os.path.join(".llm_cache", "briefs"))
+CONDENSE_VERSION = "1"          # bump when the condensation prompts change
+CHUNK_CHARS = 12000
+CHUNK_OVERLAP = 300
+MIN_CONDENSE_CHARS = 8000       # shorter RFPs are used as-is
+
+
+def document_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CONDENSE_CACHE_DIR, f"{key}.json")
+
+
+def _cache_key(text, deployment):
+    return document_hash(f"{CONDENSE_VERSION}|{deployment}|{text}")
+
+
+def load_cached_brief(text, deployment):
+    try:
+        with open(_cache_path(_cache_key(text, deployment)), "r", encoding="utf-8") as f:
+            return json.load(f)["brief"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def store_brief(text, brief, deployment, **info):
+    """Write the brief atomically (temp file + os.replace)."""
+    os.makedirs(CONDENSE_CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CONDENSE_CACHE_DIR, prefix=".brief-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"brief": brief, "deployment": deployment, "source_chars": len(text), **info}, f)
+    os.replace(tmp_path, _cache_path(_cache_key(text, deployment)))
+
+
+async def _summarize_chunk(chunk, part, total, refresh):
+    result = await model_routing.achat(
+        "rfp_condense_map",
+        llm_gateway.user_message(get_rfp_chunk_summary_prompt(chunk, part, total)),
+        refresh=refresh,
+    )
+    return result.text.strip()
+
+
+async def acondense_rfp(text, refresh=False):
+    """
+    Condensed brief of `text`. Short RFPs are returned unchanged. Raises
+    llm_gateway.LLMError when a map or merge call fails on every routed deployment.
+    """
+    if len(text) < MIN_CONDENSE_CHARS:
+        return text
+    deployment = model_routing.get_route("rfp_condense_map").deployment
+    if not refresh:
+        cached = load_cached_brief(text, deployment)
+        if cached:
+            return cached
+
+    chunks = chunk_text(text, chunk_size=CHUNK_CHARS, overlap=CHUNK_OVERLAP)
+    partials = await asyncio.gather(*[
+        _summarize_chunk(chunk, i, len(chunks), refresh)
+        for i, chunk in enumerate(chunks, start=1)
+    ])
+
+    if len(partials) == 1:
+        brief = partials[0]
+    else:
+        merged = "\n\n".join(f"--- Part {i} ---\n{p}" for i, p in enumerate(partials, start=1))
+        result = await model_routing.achat(
+            "rfp_condense_merge", llm_gateway.user_message(get_rfp_merge_prompt(merged)), refresh=refresh
+        )
+        brief = result.text.strip()
+
+    store_brief(text, brief, deployment, chunks=len(chunks))
+    print(f"🧾 Condensed RFP: {len(text)} → {len(brief)} chars from {len(chunks)} chunks")
+    return brief
+
+
+def condense_rfp(text, mode=None, refresh=False):
+    """
+    Condensed RFP for the section prompts, from a script without an event loop.
+    mode "llm" runs the map-reduce condensation, "extractive" the local TextRank one.
+    """
+    if (mode or CONDENSE_MODE) == "extractive":
+        return extractive_condense(text)
+    return asyncio.run(acondense_rfp(text, refresh=refresh))
@@ -0,0 +1,115 @@
+"""
+MinHash-based near-duplicate detection for reference chunks.
+
+Past SOWs repeat the same boilerplate (company introduction, ISO 9000 text,
+payment terms, escalation tables) almost word for word. During ingestion each
+chunk is MinHashed over word shingles and bucketed with LSH banding; a chunk
+whose estimated Jaccard similarity to an earlier chunk is above the threshold
+is dropped and recorded as another occurrence of that canonical chunk.
+"""
+import hashlib
+import random
+import re
+
+
+NUM_PERM = 64              # MinHash signature length
+BANDS = 16                 # LSH bands (NUM_PERM / BANDS rows per band)
+SHINGLE_SIZE = 5           # words per shingle
+SIMILARITY_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+def _stable_hash(value):
+    """32-bit hash that is identical across processes (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Lower-cased word n-gram shingles of a text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed, seeded family of permutations."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text):
+        hashes = [_stable_hash(s) for s in shingles(text)]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+
+def estimated_similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index over canonical chunks.
+
+    `add(key, text)` returns None when the text is new (and becomes canonical),
+    or the key of the canonical chunk it duplicates. Occurrences of every
+    canonical chunk, including its own, are kept in `occurrences`.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = {}
+        self.occurrences = {}
+
+    def _band_keys(self, sig):
+        return [tuple(sig[b * self.rows:(b + 1) * self.rows]) for b in range(self.bands)]
+
+    def add(self, key, text, occurrence=None):
+        """Register a chunk; `occurrence` describes where it appeared (defaults to key)."""
+        occurrence = occurrence if occurrence is not None else key
+        sig = self.hasher.signature(text)
+        band_keys = self._band_keys(sig)
+
+        candidates = set()
+        for bucket, band_key in zip(self._buckets, band_keys):
+            candidates.update(bucket.get(band_key, ()))
+
+        best, best_score = None, 0.0
+        for cand in candidates:
+            score = estimated_similarity(sig, self._signatures[cand])
+            if score > best_score:
+                best, best_score = cand, score
+
+        if best is not None and best_score >= self.threshold:
+            self.occurrences[best].append(occurrence)
+            return best
+
+        self._signatures[key] = sig
+        self.occurrences[key] = [occurrence]
+        for bucket, band_key in zip(self._buckets, band_keys):
+            bucket.setdefault(band_key, []).append(key)
+        return None
+
+    def duplicated(self):
+        """Canonical keys that absorbed at least one duplicate, with all their occurrences."""
+        return {key: occ for key, occ in self.occurrences.items() if len(occ) > 1}
@@ -0,0 +1,132 @@
+"""
+Extractive RFP condensation that runs locally, with no LLM calls.
+
+Sentences are embedded (TF-IDF by default, MiniLM optionally), linked by
+cosine similarity and ranked with TextRank (PageRank over the similarity
+graph). The highest-ranked sentences are kept, in document order, until a
+token budget is reached. With TF-IDF a typical RFP is condensed in tens of
+milliseconds.
+"""
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from Modules.token_budget import TokenBudget
+
+
+EXTRACTIVE_EMBEDDINGS = os.getenv("EXTRACTIVE_EMBEDDINGS", "tfidf")     # "tfidf" or "minilm"
+MINILM_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EXTRACTIVE_MAX_TOKENS = 3000
+MIN_SENTENCE_CHARS = 25
+MAX_SENTENCES = 3000            # TextRank is O(n^2) in sentences
+MAX_VOCABULARY = 4096
+DAMPING = 0.85
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-6
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9][a-z0-9\-/\.]*[a-z0-9]|[a-z0-9]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "shall should must may can all any each which who their they our we you your not be been such".split()
+)
+
+
+def split_sentences(text):
+    """Sentence-like units: sentence ends and line breaks, without very short fragments."""
+    sentences = []
+    for piece in _SENTENCE_SPLIT.split(text):
+        piece = " ".join(piece.split())
+        if len(piece) >= MIN_SENTENCE_CHARS:
+            sentences.append(piece)
+    return sentences[:MAX_SENTENCES]
+
+
+def _tokenize(sentence):
+    return [w for w in _WORD.findall(sentence.lower()) if w not in _STOPWORDS]
+
+
+def tfidf_vectors(sentences):
+    """L2-normalised TF-IDF matrix (sentences x vocabulary), NumPy only."""
+    tokenized = [_tokenize(s) for s in sentences]
+    df = Counter(term for terms in tokenized for term in set(terms))
+    vocabulary = {term: i for i, (term, _) in enumerate(df.most_common(MAX_VOCABULARY))}
+    idf = np.array(
+        [np.log((1 + len(sentences)) / (1 + df[term])) + 1 for term in vocabulary], dtype=np.float32
+    )
+
+    matrix = np.zeros((len(sentences), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(tokenized):
+        for term, count in Counter(terms).items():
+            col = vocabulary.get(term)
+            if col is not None:
+                matrix[row, col] = 1 + np.log(count)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+@lru_cache(maxsize=1)
+def _minilm():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MINILM_MODEL)
+
+
+def minilm_vectors(sentences):
+    return np.asarray(_minilm().encode(sentences, normalize_embeddings=True), dtype=np.float32)
+
+
+def textrank_scores(vectors):
+    """PageRank over the cosine-similarity graph of the (normalised) sentence vectors."""
+    n = len(vectors)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    similarity = np.clip(vectors @ vectors.T, 0, None)
+    np.fill_diagonal(similarity, 0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    # dangling sentences (no similar neighbours) link uniformly
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight == 0, 1, out_weight), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+
+def extractive_condense(text, max_tokens=EXTRACTIVE_MAX_TOKENS, embeddings=EXTRACTIVE_EMBEDDINGS,
+                        deployment=None):
+    """
+    Keep the top TextRank sentences of `text` (in document order) within
+    `max_tokens`, counted with the deployment's tokenizer.
+    """
+    budget = TokenBudget(deployment)
+    if budget.count(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    if not sentences:
+        return text
+
+    if embeddings == "minilm":
+        try:
+            vectors = minilm_vectors(sentences)
+        except Exception as e:
+            print(f"⚠️ MiniLM embeddings unavailable ({e}); using TF-IDF")
+            vectors = tfidf_vectors(sentences)
+    else:
+        vectors = tfidf_vectors(sentences)
+
+    scores = textrank_scores(vectors)
+    kept, used = [], 0
+    for i in np.argsort(-scores, kind="stable"):
+        cost = budget.count(sentences[i]) + 1
+        if used + cost > max_tokens:
+            continue
+        kept.append(i)
+        used += cost
+    return "\n".join(sentences[i] for i in sorted(kept))
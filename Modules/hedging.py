@@ -0,0 +1,139 @@
+"""
+Hedged chat completions.
+
+The primary deployment gets the request first. When no token has arrived
+by the hedge threshold (the p95 time-to-first-token seen for that deployment),
+the same request is also sent to an alternate deployment. Whichever request
+streams its first token first wins; the other is cancelled, which closes its
+HTTP stream. The gateway still records the cancelled request in the usage
+store (status "cancelled") with its estimated prompt tokens and whatever it
+had streamed, since the provider bills those. Threshold samples and hedge
+outcomes are tracked per process.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from Modules import llm_gateway
+
+
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "on").lower() not in {"off", "0", "false"}
+DEFAULT_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "8"))
+MIN_HEDGE_AFTER_SECONDS = 1.0
+HEDGE_PERCENTILE = 95
+MIN_SAMPLES = 20                     # below this the default threshold is used
+SAMPLE_WINDOW = 200
+
+_ttft_samples = {}
+_samples_lock = threading.Lock()
+hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0}
+
+
+def record_ttft(deployment, seconds):
+    if seconds is None:
+        return
+    with _samples_lock:
+        _ttft_samples.setdefault(deployment, deque(maxlen=SAMPLE_WINDOW)).append(seconds)
+
+
+def hedge_threshold(deployment):
+    """Seconds to wait for a first token before hedging: the deployment's p95 TTFT."""
+    with _samples_lock:
+        samples = sorted(_ttft_samples.get(deployment, ()))
+    if len(samples) < MIN_SAMPLES:
+        return DEFAULT_HEDGE_AFTER_SECONDS
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return max(MIN_HEDGE_AFTER_SECONDS, samples[index])
+
+
+class HedgeError(llm_gateway.LLMError):
+    """Every hedged request that was not cancelled failed. `errors` maps deployment -> LLMError."""
+
+    def __init__(self, errors):
+        last = list(errors.values())[-1]
+        super().__init__(
+            last.args[0] if last.args else str(last), deployment=last.deployment, status=last.status,
+            attempts=sum(e.attempts for e in errors.values()), retryable=last.retryable,
+        )
+        self.errors = errors
+
+
+async def hedged_achat(messages, primary, alternate, on_text=None, **kwargs):
+    """
+    Stream from `primary`, hedging to `alternate` after the threshold. When the
+    primary fails before the hedge fires, the alternate is sent right away.
+    Returns the winner's LLMResult; raises HedgeError naming the deployments
+    that failed (a deployment cancelled as the loser did not fail).
+    """
+    hedge_stats["requests"] += 1
+    started = time.perf_counter()
+    deployments = {"primary": primary, "hedge": alternate}
+    tasks, errors = {}, {}
+    winner = None
+
+    def callback(tag):
+        def forward(text):
+            nonlocal winner
+            if winner is None:
+                winner = tag
+                for other, task in tasks.items():
+                    if other != tag:
+                        task.cancel()
+            if winner == tag and on_text is not None:
+                on_text(text)
+        return forward
+
+    def start(tag):
+        tasks[tag] = asyncio.ensure_future(
+            llm_gateway.achat(messages, deployment=deployments[tag], on_text=callback(tag), **kwargs)
+        )
+
+    start("primary")
+    threshold = hedge_threshold(primary)
+    await asyncio.wait([tasks["primary"]], timeout=threshold)
+    if winner is not None or tasks["primary"].done():
+        try:
+            result = await tasks["primary"]
+        except llm_gateway.LLMError as e:
+            errors[primary] = e
+            winner = None
+            print(f"🪁 {primary} failed ({e}); sending to {alternate}")
+        else:
+            record_ttft(primary, result.ttft)
+            return result
+    else:
+        hedge_stats["hedged"] += 1
+        print(f"🪁 {primary}: no first token after {threshold:.1f}s; hedging to {alternate}")
+    start("hedge")
+
+    pending = {task for task in tasks.values() if not task.done()}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for tag, task in tasks.items():
+            if task not in done or task.cancelled():
+                continue
+            error = task.exception()
+            if error is not None:
+                if not isinstance(error, llm_gateway.LLMError):
+                    raise error
+                errors[deployments[tag]] = error
+                continue
+            if winner in (None, tag):
+                for other in pending:
+                    other.cancel()
+                result = task.result()
+                if tag == "primary":
+                    hedge_stats["primary_wins"] += 1
+                    record_ttft(primary, result.ttft)
+                else:
+                    hedge_stats["hedge_wins"] += 1
+                    record_ttft(alternate, result.ttft)
+                    # the primary missed its threshold; keep that as a (censored) sample
+                    record_ttft(primary, time.perf_counter() - started)
+                return result
+        if winner is not None and deployments[winner] in errors:
+            # the winner failed mid-stream after the other request was cancelled
+            break
+    raise HedgeError(errors)
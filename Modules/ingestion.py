@@ -0,0 +1,422 @@
+"""
+Pipelined bulk ingestion of reference documents into the Pinecone knowledge base.
+
+The pipeline has four overlapping stages:
+1. Extraction – PDF/DOCX text is extracted in a process pool (PyPDF2 is CPU bound).
+2. Chunking   – each extracted document is split into overlapping chunks.
+3. Embedding  – chunks are embedded in fixed-size batches.
+4. Upsert     – vector batches are upserted in parallel with a cap on in-flight requests.
+
+Vector ids are derived from the source file and chunk position, so re-running an
+ingest overwrites vectors instead of duplicating them. Near-duplicate chunks
+(boilerplate repeated across SOWs) are dropped at chunking time; the canonical
+copy records every position it appeared at in its `positions` metadata.
+"""
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from dataclasses import dataclass, field
+
+import docx
+from PyPDF2 import PdfReader
+
+from Modules.dedup import NearDuplicateIndex
+
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+CHUNK_SIZE = 1500          # characters per chunk
+DOCX_PAGE_CHARS = 3000     # characters per pseudo-page of a DOCX
+CHUNK_OVERLAP = 200        # characters carried over between neighbouring chunks
+EMBED_BATCH_SIZE = 64      # chunks per embedding call
+UPSERT_BATCH_SIZE = 100    # vectors per Pinecone upsert request
+MAX_INFLIGHT_UPSERTS = 4   # concurrent upsert requests
+
+
+# -------------------------------------------------------
+# Extraction
+# -------------------------------------------------------
+
+def extract_pages(file):
+    """
+    Text of each page of a PDF. DOCX files have no stored pagination, so their
+    paragraphs are grouped into pseudo-pages of about DOCX_PAGE_CHARS characters.
+    """
+    if file.name.endswith(".pdf"):
+        reader = PdfReader(file)
+        return [p.extract_text() or "" for p in reader.pages]
+    elif file.name.endswith(".docx"):
+        doc = docx.Document(file)
+        pages, current, size = [], [], 0
+        for p in doc.paragraphs:
+            if current and size + len(p.text) > DOCX_PAGE_CHARS:
+                pages.append("\n".join(current))
+                current, size = [], 0
+            current.append(p.text)
+            size += len(p.text) + 1
+        if current:
+            pages.append("\n".join(current))
+        return pages
+    return []
+
+
+def extract_text(file):
+    """Extract text from PDF or DOCX"""
+    return "\n".join(extract_pages(file))
+
+
+def extract_text_from_path(path):
+    """Extract text from a file on disk, closing the handle afterwards (process-pool safe)."""
+    with open(path, "rb") as f:
+        return extract_text(f)
+
+
+def list_reference_files(folder):
+    """Return the supported reference files in `folder`, sorted for stable ids."""
+    return sorted(
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name.endswith(SUPPORTED_EXTENSIONS)
+    )
+
+
+# -------------------------------------------------------
+# Reference sections
+# -------------------------------------------------------
+
+# Top-level headings of a reference SOW and the proposal section each one feeds.
+# Headings mapped to None (sign-off, appendix, ...) feed no section.
+REFERENCE_HEADINGS = [
+    (r"executive summary|objectives?", "exec_summary"),
+    (r"scope( and out of scope)?|in scope|out of scope|assumptions|(migration )?(project )?prerequisites"
+     r"|responsibility matrix", "scope"),
+    (r"implementation approach.*|resource schedule.*|commercials?|(timesheets?, invoices and )?payment terms",
+     "resource_schedule"),
+    (r"governance.*|communication plan|issue resolution.*", "communication_plan"),
+    (r"sign ?off|appendix.*|table of contents", None),
+]
+MAX_HEADING_CHARS = 80
+_TOC_ENTRY = re.compile(r"[A-Za-z):]\d+$")      # "Scope and Out of Scope5": heading text + page number
+_HEADINGS = [
+    (re.compile(rf"^(?:\d+(?:\.\d+)*\.?\s*)?(?:{pattern})\s*:?$", re.IGNORECASE), section)
+    for pattern, section in REFERENCE_HEADINGS
+]
+
+
+def heading_section(line):
+    """(True, section) when `line` is a reference SOW heading, else (False, None)."""
+    line = " ".join(line.replace("\xa0", " ").split())
+    if not line or len(line) > MAX_HEADING_CHARS or _TOC_ENTRY.search(line):
+        return False, None
+    for pattern, section in _HEADINGS:
+        if pattern.match(line):
+            return True, section
+    return False, None
+
+
+def split_reference_sections(text, sections=("exec_summary", "scope", "resource_schedule", "communication_plan")):
+    """
+    {section: the part of a reference SOW under its headings}. Text before the
+    first heading (cover page, table of contents) is dropped. A section whose
+    headings are not found gets the whole text.
+    """
+    parts, current = {}, None
+    for line in text.split("\n"):
+        is_heading, section = heading_section(line)
+        if is_heading:
+            current = section
+        if current is not None:
+            parts.setdefault(current, []).append(line)
+    return {
+        section: "\n".join(parts[section]).strip() if parts.get(section) else text
+        for section in sections
+    }
+
+
+# -------------------------------------------------------
+# Chunking
+# -------------------------------------------------------
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Split text into chunks of at most `chunk_size` characters on line boundaries.
+    Lines longer than a chunk are hard-split. Consecutive chunks share up to
+    `overlap` characters of trailing lines so that context is not cut mid-thought.
+    """
+    lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        while len(line) > chunk_size:
+            lines.append(line[:chunk_size])
+            line = line[chunk_size:]
+        lines.append(line)
+
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if current and size + len(line) + 1 > chunk_size:
+            chunks.append("\n".join(current))
+            # carry trailing lines over as overlap
+            carry, carry_size = [], 0
+            for prev in reversed(current):
+                if carry_size + len(prev) + 1 > overlap:
+                    break
+                carry.insert(0, prev)
+                carry_size += len(prev) + 1
+            current, size = carry, carry_size
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def document_id(source):
+    """Stable id for a reference document, derived from its file name."""
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+# -------------------------------------------------------
+# Pipeline
+# -------------------------------------------------------
+
+@dataclass
+class IngestStats:
+    """Running counters for an ingest, passed to the progress callback."""
+    total_documents: int = 0
+    documents: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    duplicates: int = 0
+    vectors_upserted: int = 0
+    failed_upserts: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float = None
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def docs_per_sec(self):
+        return self.documents / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.documents}/{self.total_documents} docs, {self.chunks} chunks "
+            f"({self.duplicates} near-duplicates dropped), "
+            f"{self.vectors_upserted} vectors in {self.elapsed:.1f}s "
+            f"({self.docs_per_sec:.2f} docs/s)"
+        )
+
+
+def print_progress(stats, stage):
+    """Default progress reporter."""
+    print(f"📥 [{stage}] {stats.summary()}")
+
+
+def build_chunk_records(path, text):
+    """Turn one extracted document into (id, chunk_text, metadata) records."""
+    source = os.path.basename(path)
+    doc_id = document_id(source)
+    chunks = chunk_text(text)
+    return [
+        (
+            f"{doc_id}#{i}",
+            chunk,
+            {
+                "source": source,
+                "doc_id": doc_id,
+                "chunk_index": i,
+                "chunk_count": len(chunks),
+                # every document / position this chunk stands for (extended by dedup)
+                "doc_ids": [doc_id],
+                "positions": [f"{doc_id}:{i}"],
+            },
+        )
+        for i, chunk in enumerate(chunks)
+    ]
+
+
+def _upsert_batch(index, vectors, namespace):
+    index.upsert(vectors=vectors, namespace=namespace)
+    return len(vectors)
+
+
+def ingest_folder(
+    folder,
+    index,
+    embedding_model,
+    namespace=None,
+    text_key="text",
+    max_workers=None,
+    embed_batch_size=EMBED_BATCH_SIZE,
+    upsert_batch_size=UPSERT_BATCH_SIZE,
+    max_inflight_upserts=MAX_INFLIGHT_UPSERTS,
+    dedup=True,
+    progress=print_progress,
+):
+    """
+    Ingest every supported file in `folder` into `index`.
+
+    Extraction runs in a process pool while the calling thread chunks and embeds
+    completed documents; upserts run in a thread pool with at most
+    `max_inflight_upserts` requests outstanding. Chunk text is stored under
+    `text_key` in the metadata so that PineconeVectorStore can read it back.
+    With `dedup`, near-duplicate chunks are skipped and their canonical chunk's
+    `doc_ids` / `positions` metadata is updated once all upserts have landed.
+    Returns the final IngestStats.
+    """
+    paths = list_reference_files(folder)
+    stats = IngestStats(total_documents=len(paths))
+    if not paths:
+        stats.finished_at = time.perf_counter()
+        return stats
+
+    pending_records = []
+    inflight = set()
+    dedup_index = NearDuplicateIndex() if dedup else None
+
+    def drain(block_until):
+        """Collect finished upserts until at most `block_until` remain in flight."""
+        nonlocal inflight
+        while len(inflight) > block_until:
+            done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    stats.vectors_upserted += fut.result()
+                except Exception as e:
+                    stats.failed_upserts += 1
+                    print(f"⚠️ Upsert batch failed: {e}")
+            progress(stats, "upsert")
+
+    def flush(upsert_pool, final=False):
+        """Embed buffered chunks in batches and schedule their upserts."""
+        while len(pending_records) >= embed_batch_size or (final and pending_records):
+            batch = pending_records[:embed_batch_size]
+            del pending_records[:embed_batch_size]
+
+            embeddings = embedding_model.embed_documents([text for _, text, _ in batch])
+            vectors = [
+                (vec_id, values, {**meta, text_key: text})
+                for (vec_id, text, meta), values in zip(batch, embeddings)
+            ]
+            for start in range(0, len(vectors), upsert_batch_size):
+                drain(max_inflight_upserts - 1)
+                inflight.add(upsert_pool.submit(
+                    _upsert_batch, index, vectors[start:start + upsert_batch_size], namespace
+                ))
+
+    workers = max_workers or min(len(paths), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+            ThreadPoolExecutor(max_workers=max_inflight_upserts) as upsert_pool:
+        futures = {extract_pool.submit(extract_text_from_path, path): path for path in paths}
+
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                text = fut.result()
+            except Exception as e:
+                print(f"⚠️ Could not extract {os.path.basename(path)}: {e}")
+                text = ""
+
+            if not text.strip():
+                stats.skipped += 1
+                continue
+
+            records = build_chunk_records(path, text)
+            stats.documents += 1
+            stats.chunks += len(records)
+            for record in records:
+                vec_id, chunk, meta = record
+                if dedup_index and dedup_index.add(vec_id, chunk, meta["positions"][0]):
+                    stats.duplicates += 1
+                    continue
+                pending_records.append(record)
+            progress(stats, "extract")
+
+            flush(upsert_pool)
+
+        flush(upsert_pool, final=True)
+        drain(0)
+
+    if dedup_index:
+        record_duplicate_positions(index, dedup_index.duplicated(), namespace)
+
+    stats.finished_at = time.perf_counter()
+    progress(stats, "done")
+    return stats
+
+
+def record_duplicate_positions(index, duplicated, namespace=None):
+    """Point canonical chunks at every document position their duplicates came from."""
+    for vec_id, positions in duplicated.items():
+        doc_ids = list(dict.fromkeys(pos.split(":")[0] for pos in positions))
+        try:
+            index.update(
+                id=vec_id,
+                set_metadata={"doc_ids": doc_ids, "positions": positions},
+                namespace=namespace,
+            )
+        except Exception as e:
+            print(f"⚠️ Could not record duplicate positions for {vec_id}: {e}")
+
+
+def expand_to_documents(vector_store, hits):
+    """
+    Reassemble the full text of the documents behind retrieved chunks.
+    Hits are grouped by document (best-ranked first) and every chunk of each
+    document is fetched and joined back in order. Deduplicated boilerplate is
+    found through the canonical chunk's `doc_ids` and placed at each of its
+    `positions` in that document.
+    """
+    documents, seen = [], set()
+    for hit in hits:
+        doc_id = hit.metadata.get("doc_id")
+        if not doc_id:
+            # legacy whole-document vector
+            documents.append(hit.page_content)
+            continue
+        if doc_id in seen:
+            continue
+        seen.add(doc_id)
+
+        chunk_count = int(hit.metadata.get("chunk_count", 1))
+        chunks = vector_store.similarity_search(
+            hit.page_content, k=chunk_count, filter={"doc_ids": {"$in": [doc_id]}}
+        )
+        ordered = []
+        for chunk in chunks:
+            for pos in chunk.metadata.get("positions", []):
+                pos_doc, _, pos_index = pos.partition(":")
+                if pos_doc == doc_id:
+                    ordered.append((int(pos_index), chunk.page_content))
+        ordered.sort(key=lambda item: item[0])
+        documents.append(_join_overlapping([text for _, text in ordered]))
+    return documents
+
+
+def _join_overlapping(chunks):
+    """Join consecutive chunks, dropping the lines they share as overlap."""
+    if not chunks:
+        return ""
+    lines = chunks[0].split("\n")
+    for chunk in chunks[1:]:
+        nxt = chunk.split("\n")
+        # longest suffix of `lines` that is a prefix of `nxt`
+        overlap = 0
+        for n in range(min(len(lines), len(nxt)), 0, -1):
+            if lines[-n:] == nxt[:n]:
+                overlap = n
+                break
+        lines.extend(nxt[overlap:])
+    return "\n".join(lines)
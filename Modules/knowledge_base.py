@@ -0,0 +1,256 @@
+"""
+Revisioned knowledge base on top of a single Pinecone index.
+
+Every rebuild is written into a fresh namespace ("revision"). Only after the new
+revision passes a smoke query is the "active revision" pointer swapped, with an
+atomic file replace. Queries take a lease on the revision that was active when
+they started, so in-flight requests finish on the old revision. Retired
+revisions are garbage-collected once they are past a grace period and no
+longer leased in this process.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_pinecone import PineconeVectorStore
+from pinecone import Pinecone, ServerlessSpec
+
+from Modules.ingestion import ingest_folder, list_reference_files
+from Modules.retrieval import RetrievalRouter, ensure_replica
+
+
+KNOWLEDGE_FOLDER = "Knowledge_Repo"
+STATE_DIR = os.getenv("KB_STATE_DIR", ".kb_state")
+POINTER_FILE = os.path.join(STATE_DIR, "active_revision.json")
+GC_GRACE_SECONDS = 600        # keep retired revisions at least this long (other processes)
+SMOKE_TIMEOUT_SECONDS = 60    # serverless indexes are eventually consistent
+SMOKE_QUERY = "statement of work scope executive summary"
+
+_leases = {}
+_leases_lock = threading.Lock()
+
+
+class RevisionError(RuntimeError):
+    """Raised when a new revision fails to build or validate; the active one is untouched."""
+
+
+# -------------------------------------------------------
+# Active revision pointer
+# -------------------------------------------------------
+
+def _read_pointer():
+    try:
+        with open(POINTER_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"revision": None, "fingerprint": None, "retired": []}
+
+
+def _write_pointer(state):
+    """Write the pointer file atomically (temp file + os.replace)."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_DIR, prefix=".pointer-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, POINTER_FILE)
+
+
+def get_active_revision():
+    """Namespace of the active revision (None means the legacy default namespace)."""
+    return _read_pointer()["revision"]
+
+
+def new_revision_name():
+    return f"rev-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def activate_revision(revision, fingerprint=None):
+    """Point readers at `revision` and retire the previously active one."""
+    state = _read_pointer()
+    previous = state.get("revision")
+    if previous and previous != revision:
+        state.setdefault("retired", []).append({"revision": previous, "retired_at": time.time()})
+    state["revision"] = revision
+    state["fingerprint"] = fingerprint
+    state["activated_at"] = time.time()
+    _write_pointer(state)
+    print(f"🔁 Active knowledge-base revision: {previous} → {revision}")
+
+
+@contextmanager
+def acquire_revision():
+    """Pin the currently active revision for the duration of a request."""
+    revision = get_active_revision()
+    with _leases_lock:
+        _leases[revision] = _leases.get(revision, 0) + 1
+    try:
+        yield revision
+    finally:
+        with _leases_lock:
+            _leases[revision] -= 1
+            if not _leases[revision]:
+                del _leases[revision]
+
+
+def corpus_fingerprint(folder):
+    """Hash of file names, sizes and mtimes; a rebuild is only needed when it changes."""
+    h = hashlib.sha1()
+    for path in list_reference_files(folder):
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}|{st.st_size}|{int(st.st_mtime)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+# -------------------------------------------------------
+# Build / validate / garbage-collect
+# -------------------------------------------------------
+
+def _field(obj, name, default=None):
+    """Read a field from a Pinecone response model or a plain dict."""
+    value = getattr(obj, name, None)
+    if value is None and isinstance(obj, dict):
+        value = obj.get(name)
+    return default if value is None else value
+
+
+def _namespace_vector_count(index, namespace):
+    namespaces = _field(index.describe_index_stats(), "namespaces", {})
+    ns_stats = namespaces.get(namespace)
+    return _field(ns_stats, "vector_count", 0) if ns_stats is not None else 0
+
+
+def smoke_test(index, embedding_model, namespace, expected_vectors, timeout=SMOKE_TIMEOUT_SECONDS):
+    """Wait until the namespace holds the expected vectors and answers a probe query."""
+    probe = embedding_model.embed_query(SMOKE_QUERY)
+    deadline = time.monotonic() + timeout
+    while True:
+        count = _namespace_vector_count(index, namespace)
+        if count >= expected_vectors:
+            result = index.query(vector=probe, top_k=1, namespace=namespace, include_metadata=True)
+            matches = _field(result, "matches", [])
+            if matches and _field(matches[0], "metadata", {}).get("text"):
+                return
+        if time.monotonic() > deadline:
+            raise RevisionError(
+                f"Smoke test failed for {namespace}: {count}/{expected_vectors} vectors visible"
+            )
+        time.sleep(2)
+
+
+def drop_revision(index, revision):
+    index.delete(delete_all=True, namespace=revision)
+
+
+def garbage_collect(index, grace_seconds=GC_GRACE_SECONDS):
+    """Delete retired revisions that are past the grace period and not leased here."""
+    dropped = set()
+    now = time.time()
+    for entry in _read_pointer().get("retired", []):
+        revision = entry["revision"]
+        with _leases_lock:
+            leased = _leases.get(revision, 0) > 0
+        if leased or now - entry["retired_at"] < grace_seconds:
+            continue
+        try:
+            drop_revision(index, revision)
+            dropped.add(revision)
+            print(f"🗑️ Garbage-collected knowledge-base revision {revision}")
+        except Exception as e:
+            print(f"⚠️ Could not delete revision {revision}: {e}")
+
+    if dropped:
+        # re-read so a concurrent activation is not lost
+        latest = _read_pointer()
+        latest["retired"] = [e for e in latest.get("retired", []) if e["revision"] not in dropped]
+        _write_pointer(latest)
+
+
+def rebuild_revision(folder, index, embedding_model, force=False, **ingest_kwargs):
+    """
+    Ingest `folder` into a new revision, validate it and make it active.
+    Skips the rebuild when the corpus fingerprint matches the active revision,
+    unless `force` is set. Returns the active revision name.
+    """
+    fingerprint = corpus_fingerprint(folder)
+    state = _read_pointer()
+    if not force and state.get("revision") and state.get("fingerprint") == fingerprint:
+        return state["revision"]
+
+    revision = new_revision_name()
+    try:
+        stats = ingest_folder(folder, index, embedding_model, namespace=revision, **ingest_kwargs)
+        if not stats.documents:
+            raise RevisionError(f"No documents ingested from {folder}")
+        if stats.failed_upserts:
+            raise RevisionError(f"{stats.failed_upserts} upsert batches failed")
+        smoke_test(index, embedding_model, revision, stats.chunks - stats.duplicates)
+    except Exception:
+        try:
+            drop_revision(index, revision)
+        except Exception as e:
+            print(f"⚠️ Could not clean up failed revision {revision}: {e}")
+        raise
+
+    activate_revision(revision, fingerprint)
+    print(f"✅ Knowledge-base revision {revision} built: {stats.summary()}")
+    garbage_collect(index)
+    return revision
+
+
+class KnowledgeBase:
+    """Handle on the shared index; hands out vector stores bound to one revision."""
+
+    def __init__(self, index, embedding_model):
+        self.index = index
+        self.embedding_model = embedding_model
+
+    def vector_store(self, revision):
+        return PineconeVectorStore(index=self.index, embedding=self.embedding_model, namespace=revision)
+
+    def router(self, revision):
+        """Deadline-bound retrieval for `revision` with local-replica failover."""
+        ensure_replica(self.index, revision)
+        return RetrievalRouter(self.vector_store(revision), self.embedding_model, revision)
+
+    def rebuild(self, folder, force=False, **ingest_kwargs):
+        revision = rebuild_revision(folder, self.index, self.embedding_model, force=force, **ingest_kwargs)
+        ensure_replica(self.index, revision)
+        return revision
+
+
+def open_knowledge_base(folder=KNOWLEDGE_FOLDER):
+    """Connect to the Pinecone index (created if missing) and rebuild the revision when `folder` changed."""
+    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index_name = "response-generator"
+
+    # Create index if it doesn't exist
+    if index_name not in [idx["name"] for idx in pc.list_indexes()]:
+        pc.create_index(
+            name=index_name,
+            dimension=384,  # ✅ MiniLM-L6-v2 has 384 dims (not 1024)
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+
+    index = pc.Index(index_name)
+
+    knowledge_base = KnowledgeBase(index, embedding_model)
+
+    # --- Build a new revision when the reference folder changed ---
+    # Readers keep using the active revision until the new one passes its smoke test.
+    stats = pc.describe_index(index_name)
+    if stats.get("status", {}).get("ready", False):
+        try:
+            knowledge_base.rebuild(folder)
+        except Exception as e:
+            print(f"⚠️ Knowledge-base rebuild failed, keeping revision {get_active_revision()}: {e}")
+
+    return knowledge_base
@@ -0,0 +1,607 @@
+"""
+Single gateway for every chat completion the app makes.
+
+The gateway owns one pooled HTTP/2 client that runs on a dedicated background
+event loop, so connections are reused across Streamlit sessions and reruns.
+On top of the client it adds:
+- per-deployment rate limiting: shared TPM/RPM token buckets, interactive/batch
+  lanes and AIMD concurrency driven by 429s (see Modules/rate_limit.py),
+- jittered exponential backoff on 429 / 5xx / connection errors (honouring Retry-After),
+- a per-call deadline that covers all attempts,
+- structured errors (LLMError / LLMTimeoutError) instead of "Error: ..." strings,
+- a persistent response cache (see Modules/llm_cache.py); pass refresh=True to bypass it,
+- single-flight deduplication: an identical request (same deployment, messages,
+  parameters and lane) that is already in flight is joined, so every caller gets the
+  one result; a call never joins a request queued and timed for another lane,
+- token streaming: pass on_text=callback to receive the accumulated text as it arrives,
+- token accounting: `usage_totals` sums prompt, provider-cached prompt and completion
+  tokens per deployment, to verify the prompt prefix cache discount, and every call
+  is recorded with its run/section labels in the usage store (see Modules/usage_store.py),
+  including calls cancelled mid-flight, with their estimated tokens.
+
+Set LLM_BACKEND=fake to use FakeBackend, which answers locally for offline tests.
+"""
+import asyncio
+import dataclasses
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+from Modules.llm_cache import ResponseCache, cache_key
+from Modules.rate_limit import RateLimiter
+from Modules.token_budget import TokenBudget, prompt_text
+from Modules.usage_store import current_labels, record_call
+
+
+load_dotenv()
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "180"))
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+DEPLOYMENT_CONCURRENCY = {}          # per-deployment overrides (AIMD ceiling), e.g. {"4o": 4}
+DEFAULT_COMPLETION_ESTIMATE = 1000   # tokens reserved when a call sets no max_tokens
+MAX_CONNECTIONS = 32
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+CACHE_ENABLED = os.getenv("LLM_CACHE", "on").lower() not in {"off", "0", "false"}
+STREAM_INCLUDE_USAGE = os.getenv("LLM_STREAM_USAGE", "on").lower() not in {"off", "0", "false"}
+SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "on").lower() not in {"off", "0", "false"}
+
+
+usage_totals = {}                    # deployment -> summed token usage of live calls
+_usage_lock = threading.Lock()
+single_flight_stats = {"joined": 0}  # calls served by joining an identical in-flight request
+
+
+class LLMError(Exception):
+    """A chat completion that failed after all retries (or could not be retried)."""
+
+    def __init__(self, message, deployment=None, status=None, attempts=0, retryable=False):
+        super().__init__(message)
+        self.deployment = deployment
+        self.status = status
+        self.attempts = attempts
+        self.retryable = retryable
+
+    def __str__(self):
+        parts = [super().__str__()]
+        if self.deployment:
+            parts.append(f"deployment={self.deployment}")
+        if self.status:
+            parts.append(f"status={self.status}")
+        if self.attempts:
+            parts.append(f"attempts={self.attempts}")
+        return " | ".join(parts)
+
+
+class LLMTimeoutError(LLMError):
+    """The per-call deadline expired before a completion arrived."""
+
+
+@dataclass
+class LLMResult:
+    """Text and bookkeeping of one completed chat call."""
+    text: str                    # exactly as generated (unstripped, so a truncated answer can be continued)
+    deployment: str
+    finish_reason: str = None
+    usage: dict = field(default_factory=dict)
+    attempts: int = 1
+    latency: float = 0.0
+    ttft: float = None           # seconds to first streamed token
+    cached: bool = False
+    shared: bool = False         # joined an identical request that was already in flight
+    raw: object = None
+
+    @property
+    def tokens_per_sec(self):
+        """Generation rate after the first token (streamed calls only)."""
+        tokens = self.usage.get("completion_tokens", 0)
+        if self.ttft is None or not tokens or self.latency <= self.ttft:
+            return None
+        return tokens / (self.latency - self.ttft)
+
+    def to_cache(self):
+        return {"text": self.text, "finish_reason": self.finish_reason, "usage": self.usage}
+
+
+def user_message(prompt):
+    """Wrap a single prompt string as a chat message list."""
+    return [{"role": "user", "content": prompt}]
+
+
+# -------------------------------------------------------
+# Backends
+# -------------------------------------------------------
+
+class AzureBackend:
+    """Azure OpenAI over a pooled HTTP/2 httpx client (SDK retries disabled; the gateway retries)."""
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            from openai import AsyncAzureOpenAI
+
+            http_client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT_SECONDS, connect=10.0),
+            )
+            self._client = AsyncAzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
+                api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
+                api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION"),
+                http_client=http_client,
+                max_retries=0,
+            )
+        return self._client
+
+    async def create(self, deployment, messages, **params):
+        return await self._get_client().chat.completions.create(
+            model=deployment, messages=messages, **params
+        )
+
+
+class FakeStatusError(Exception):
+    """HTTP-style error raised by FakeBackend."""
+
+    def __init__(self, status_code, message="fake error"):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+
+class FakeBackend:
+    """
+    Offline stand-in for Azure OpenAI.
+
+    `responder(deployment, messages, params)` produces the reply text (defaults
+    to echoing the last message's first line); replies longer than max_tokens
+    (4 chars per token) are cut off with finish_reason "length". `failures` is a list of status
+    codes raised, in order, before calls start succeeding. Every call is kept
+    in `calls`. A repeated system message is reported as cached prompt tokens,
+    like the provider's prefix cache.
+    """
+
+    def __init__(self, responder=None, latency=0.0, failures=None):
+        self.responder = responder or self._echo
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.calls = []
+        self._prefixes = set()
+
+    @staticmethod
+    def _echo(deployment, messages, params):
+        last = messages[-1]["content"].strip().splitlines()
+        return f"[{deployment}] {last[0] if last else ''}"
+
+    async def create(self, deployment, messages, **params):
+        self.calls.append({"deployment": deployment, "messages": messages, "params": params})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failures:
+            raise FakeStatusError(self.failures.pop(0))
+
+        text = self.responder(deployment, messages, params)
+        finish_reason = "stop"
+        if params.get("max_tokens") and len(text) > params["max_tokens"] * 4:
+            text, finish_reason = text[:params["max_tokens"] * 4], "length"
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        cached_tokens = 0
+        if messages[0]["role"] == "system":
+            prefix = messages[0]["content"]
+            if prefix in self._prefixes:
+                cached_tokens = len(prefix) // 4
+            self._prefixes.add(prefix)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(text) // 4,
+            total_tokens=prompt_tokens + len(text) // 4,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        )
+        if params.get("stream"):
+            return self._stream(text, usage, finish_reason)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason=finish_reason)],
+            usage=usage,
+        )
+
+    async def _stream(self, text, usage, finish_reason="stop"):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)],
+                usage=None,
+            )
+        yield SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason=finish_reason)],
+            usage=None,
+        )
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+def _default_backend():
+    return FakeBackend() if os.getenv("LLM_BACKEND", "azure").lower() == "fake" else AzureBackend()
+
+
+# -------------------------------------------------------
+# Gateway
+# -------------------------------------------------------
+
+def _status_of(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def _is_retryable(exc):
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # connection resets, SDK timeouts, etc.
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout"}
+
+
+def _retry_after(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _estimate_tokens(deployment, messages, params):
+    """Tokens a call may consume: the prompt plus its completion allowance."""
+    prompt_tokens = TokenBudget(deployment).count(prompt_text(messages))
+    return prompt_tokens + (params.get("max_tokens") or DEFAULT_COMPLETION_ESTIMATE)
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+
+def _record_usage(deployment, usage):
+    with _usage_lock:
+        totals = usage_totals.setdefault(
+            deployment, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        )
+        totals["calls"] += 1
+        for key in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+            totals[key] += usage.get(key, 0)
+
+
+def cached_prompt_share(deployment=None):
+    """Fraction of prompt tokens served from the provider's prefix cache (all deployments by default)."""
+    with _usage_lock:
+        rows = [usage_totals[deployment]] if deployment in usage_totals else (
+            [] if deployment else list(usage_totals.values())
+        )
+        prompt = sum(r["prompt_tokens"] for r in rows)
+        cached = sum(r["cached_tokens"] for r in rows)
+    return cached / prompt if prompt else 0.0
+
+
+def _used_tokens(usage):
+    return usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+
+class _Flight:
+    """One in-flight request and the callers waiting on it (runs on the gateway loop)."""
+
+    def __init__(self):
+        self.task = None
+        self.text = None
+        self.subscribers = []
+        self.waiters = 0
+
+    def publish(self, text):
+        self.text = text
+        for on_text in list(self.subscribers):
+            on_text(text)
+
+    async def join(self, on_text=None):
+        if on_text is not None:
+            self.subscribers.append(on_text)
+            if self.text is not None:
+                on_text(self.text)            # catch up with what has streamed so far
+        self.waiters += 1
+        try:
+            return await asyncio.shield(self.task)
+        finally:
+            self.waiters -= 1
+            if on_text in self.subscribers:
+                self.subscribers.remove(on_text)
+            if self.waiters == 0 and not self.task.done():
+                self.task.cancel()            # every caller gave up (e.g. a lost hedge)
+
+
+class LLMGateway:
+    """Runs every completion on one background event loop shared by the whole process."""
+
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or _default_backend()
+        self.cache = cache if cache is not None else (ResponseCache() if CACHE_ENABLED else None)
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.limiter = RateLimiter(concurrency=DEFAULT_CONCURRENCY, deployment_concurrency=DEPLOYMENT_CONCURRENCY)
+        self._in_flight = {}                 # (lane, cache key) -> _Flight of the identical request being sent
+
+    # --- event loop -------------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-gateway", daemon=True
+                )
+                self._thread.start()
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # --- core call (runs on the gateway loop) -----------------------------
+
+    async def _complete(self, deployment, messages, timeout, max_attempts, refresh=False, on_text=None,
+                        lane="interactive", labels=None, **params):
+        """
+        Serve from the response cache unless `refresh`; otherwise call and store.
+        Identical requests already in flight are joined instead of sent again.
+        """
+        key = cache_key(deployment, messages, params) if self.cache is not None or SINGLE_FLIGHT else None
+        if self.cache is not None and not refresh:
+            hit = await asyncio.to_thread(self.cache.get, key)
+            if hit is not None:
+                if on_text:
+                    on_text(hit["text"])
+                result = LLMResult(deployment=deployment, attempts=0, cached=True, **hit)
+                await asyncio.to_thread(record_call, deployment, labels, result, lane=lane)
+                return result
+
+        if not SINGLE_FLIGHT:
+            return await self._call_and_store(key, deployment, messages, timeout, max_attempts, on_text, lane,
+                                              labels, **params)
+
+        # the lane sets the queue and the deadline the leader is sent with
+        flight_key = (lane, key)
+        flight = self._in_flight.get(flight_key)
+        if flight is None:
+            flight = _Flight()
+            flight.task = asyncio.ensure_future(self._call_and_store(
+                key, deployment, messages, timeout, max_attempts, flight.publish if on_text else None, lane, labels,
+                **params
+            ))
+            flight.task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+            self._in_flight[flight_key] = flight
+            return await flight.join(on_text)
+
+        single_flight_stats["joined"] += 1
+        print(f"🔗 {deployment}: identical request already in flight; joining it")
+        try:
+            result = dataclasses.replace(await flight.join(on_text), shared=True)
+        except LLMError as e:
+            await asyncio.to_thread(record_call, deployment, labels, error=e, lane=lane)
+            raise
+        await asyncio.to_thread(record_call, deployment, labels, result, lane=lane)
+        return result
+
+    async def _call_and_store(self, key, deployment, messages, timeout, max_attempts, on_text, lane, labels,
+                              **params):
+        progress = {"sent": False, "text": ""}
+        if on_text is not None:
+            publish = on_text
+
+            def on_text(text):
+                progress["text"] = text
+                publish(text)
+
+        try:
+            result = await self._call_with_retries(
+                deployment, messages, timeout, max_attempts, on_text, lane, progress, **params
+            )
+        except LLMError as e:
+            await asyncio.to_thread(record_call, deployment, labels, error=e, lane=lane)
+            raise
+        except asyncio.CancelledError:
+            # e.g. a lost hedge: once sent, the prompt (and what streamed so far) is billed all the same;
+            # a call cancelled while still queued in the rate limiter cost nothing
+            if progress["sent"]:
+                budget = TokenBudget(deployment)
+                usage = {
+                    "prompt_tokens": budget.count(prompt_text(messages)),
+                    "completion_tokens": budget.count(progress["text"]),
+                }
+                await asyncio.to_thread(record_call, deployment, labels, lane=lane, cancelled_usage=usage)
+            raise
+        _record_usage(deployment, result.usage)
+        await asyncio.to_thread(record_call, deployment, labels, result, lane=lane)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, deployment, result.to_cache())
+        return result
+
+    @staticmethod
+    async def _consume_stream(stream, on_text, started):
+        """Accumulate a streamed completion, reporting the text so far after every delta."""
+        text, finish_reason, usage, ttft, chunks = "", None, None, None, 0
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            for choice in chunk.choices or []:
+                piece = getattr(getattr(choice, "delta", None), "content", None)
+                if piece:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    text += piece
+                    chunks += 1
+                    on_text(text)
+                if getattr(choice, "finish_reason", None):
+                    finish_reason = choice.finish_reason
+        return text, finish_reason, usage, ttft, chunks
+
+    async def _call_with_retries(self, deployment, messages, timeout, max_attempts, on_text=None,
+                                 lane="interactive", progress=None, **params):
+        """`progress["sent"]` is set once a request has gone to the backend."""
+        progress = progress if progress is not None else {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        started = time.perf_counter()
+        estimate = _estimate_tokens(deployment, messages, params)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise LLMTimeoutError(
+                    f"Deadline of {timeout:.1f}s exceeded", deployment, attempts=attempt - 1, retryable=True
+                )
+            try:
+                await asyncio.wait_for(self.limiter.acquire(deployment, estimate, lane), remaining)
+                async with self.limiter.slot(deployment).within(deadline - loop.time()):
+                    progress["sent"] = True
+                    if on_text is None:
+                        response = await asyncio.wait_for(
+                            self.backend.create(deployment, messages, **params),
+                            deadline - loop.time(),
+                        )
+                    else:
+                        stream_params = dict(params, stream=True)
+                        if STREAM_INCLUDE_USAGE:
+                            stream_params["stream_options"] = {"include_usage": True}
+
+                        async def run_stream():
+                            stream = await self.backend.create(deployment, messages, **stream_params)
+                            return await self._consume_stream(stream, on_text, started)
+
+                        streamed = await asyncio.wait_for(run_stream(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(
+                    f"Deadline of {timeout:.1f}s exceeded", deployment, attempts=attempt, retryable=True
+                ) from None
+            except Exception as e:
+                status = _status_of(e)
+                if status == 429:
+                    self.limiter.on_throttle(deployment, _retry_after(e))
+                if not _is_retryable(e) or attempt >= max_attempts:
+                    raise LLMError(
+                        f"{type(e).__name__}: {e}", deployment, status, attempt, _is_retryable(e)
+                    ) from e
+                delay = _retry_after(e)
+                if delay is None:
+                    backoff = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+                    delay = random.uniform(0, backoff)  # full jitter
+                if loop.time() + delay >= deadline:
+                    raise LLMTimeoutError(
+                        f"Deadline of {timeout:.1f}s would be exceeded by retry backoff",
+                        deployment, status, attempt, True,
+                    ) from e
+                print(f"⏳ {deployment}: {type(e).__name__} (status={status}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if on_text is not None:
+                text, finish_reason, usage, ttft, chunks = streamed
+                usage = _usage_dict(usage) or {"completion_tokens": chunks}
+                self.limiter.on_success(deployment, estimate, _used_tokens(usage))
+                return LLMResult(
+                    text=text,
+                    deployment=deployment,
+                    finish_reason=finish_reason,
+                    usage=usage,
+                    attempts=attempt,
+                    latency=time.perf_counter() - started,
+                    ttft=ttft,
+                )
+
+            choice = response.choices[0]
+            usage = _usage_dict(getattr(response, "usage", None))
+            self.limiter.on_success(deployment, estimate, _used_tokens(usage))
+            return LLMResult(
+                text=choice.message.content or "",
+                deployment=deployment,
+                finish_reason=getattr(choice, "finish_reason", None),
+                usage=usage,
+                attempts=attempt,
+                latency=time.perf_counter() - started,
+                raw=response,
+            )
+
+    # --- public API -------------------------------------------------------
+
+    async def acomplete(self, messages, deployment, timeout=None, max_attempts=MAX_ATTEMPTS,
+                        refresh=False, on_text=None, lane="interactive", **params):
+        """
+        Awaitable from any event loop; the call itself runs on the gateway loop.
+        `on_text` is invoked on the caller's loop, so it may touch Streamlit elements.
+        `lane` is the rate-limiter priority: "interactive" or "batch".
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if on_text is not None and running is not None and running is not self._loop:
+            caller_callback = on_text
+
+            def on_text(text):
+                running.call_soon_threadsafe(caller_callback, text)
+
+        coro = self._complete(
+            deployment, messages, timeout or DEFAULT_TIMEOUT_SECONDS, max_attempts, refresh, on_text, lane,
+            current_labels(), **params
+        )
+        if running is not None and running is self._loop:
+            return await coro
+        return await asyncio.wrap_future(self._submit(coro))
+
+    def complete(self, messages, deployment, timeout=None, max_attempts=MAX_ATTEMPTS,
+                 refresh=False, on_text=None, lane="interactive", **params):
+        """Blocking variant for synchronous callers (`on_text` runs on the gateway thread)."""
+        coro = self._complete(
+            deployment, messages, timeout or DEFAULT_TIMEOUT_SECONDS, max_attempts, refresh, on_text, lane,
+            current_labels(), **params
+        )
+        return self._submit(coro).result()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide gateway instance."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def set_backend(backend):
+    """Swap the backend of the process-wide gateway (e.g. FakeBackend in tests)."""
+    get_gateway().backend = backend
+
+
+async def achat(messages, deployment, **kwargs):
+    return await get_gateway().acomplete(messages, deployment, **kwargs)
+
+
+def chat(messages, deployment, **kwargs):
+    return get_gateway().complete(messages, deployment, **kwargs)
@@ -0,0 +1,262 @@
+"""
+Config-driven model routing.
+
+config/model_routes.json (or MODEL_ROUTES_PATH) maps every section or task to
+a deployment, its generation parameters and an SLO:
+
+    "scope": {
+        "deployment": "Codetest",
+        "fallbacks": ["4o"],
+        "max_tokens": 1200,
+        "temperature": 0.3,
+        "slo": {"latency_seconds": 90, "max_cost_usd": 0.10}
+    }
+
+Tasks missing from the file use the "default" route. The latency SLO is the
+gateway deadline for each deployment in the chain; when it is missed, or the
+call fails, the next fallback deployment is tried. The cost SLO caps the
+prompt token budget (see Modules/token_budget.py). With "hedge": true, the
+async path hedges a slow first token to the first fallback (see
+Modules/hedging.py). "batch_deployment" names the Global Batch deployment
+that serves the route in offline batch jobs (see Modules/batch.py); without it
+batch lines go to "deployment". The file is re-read when it changes, so routes
+can be moved to another deployment without a restart.
+
+A completion cut off by max_tokens (finish_reason "length") is continued on
+the same deployment: the partial answer goes back as an assistant turn and
+the model is asked to carry on, up to "max_continuations" times per call.
+The continuation is appended to the partial text, so the caller only ever
+sees the complete answer.
+"""
+import dataclasses
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+from Modules import llm_gateway
+from Modules.hedging import HEDGING_ENABLED, HedgeError, hedged_achat, record_ttft
+from Modules.usage_store import usage_labels
+
+
+ROUTES_PATH = os.getenv("MODEL_ROUTES_PATH", os.path.join("config", "model_routes.json"))
+DEFAULT_ROUTE = {"deployment": "Codetest", "temperature": 0.3}
+MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+CONTINUE_PROMPT = (
+    "Your previous answer was cut off by the length limit. Continue exactly where it stopped: "
+    "do not repeat any text already written, do not add a preamble, keep the same format."
+)
+MIN_OVERLAP_CHARS = 12          # repeated text longer than this is dropped when joining
+
+_routes = {"mtime": None, "table": {}}
+_routes_lock = threading.Lock()
+
+
+@dataclass
+class Route:
+    task: str
+    deployment: str
+    fallbacks: list = field(default_factory=list)
+    max_tokens: int = None
+    temperature: float = 0.3
+    latency_seconds: float = None
+    max_cost_usd: float = None
+    hedge: bool = False
+    max_continuations: int = MAX_CONTINUATIONS
+    rfp_tokens: int = None               # RFP passages routed to the section prompt; None = whole brief
+    batch_deployment: str = None         # Global Batch deployment for offline jobs; None = deployment
+
+    @property
+    def chain(self):
+        """Deployments to try, in order, without repeats."""
+        return list(dict.fromkeys([self.deployment, *self.fallbacks]))
+
+    def params(self):
+        params = {"temperature": self.temperature}
+        if self.max_tokens:
+            params["max_tokens"] = self.max_tokens
+        return params
+
+
+def load_routes(path=ROUTES_PATH):
+    """Routing table from `path`, re-read whenever the file's mtime changes."""
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _routes_lock:
+        if _routes["mtime"] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                _routes["table"] = json.load(f)
+            _routes["mtime"] = mtime
+        return _routes["table"]
+
+
+def get_route(task):
+    table = load_routes()
+    entry = {**DEFAULT_ROUTE, **table.get("default", {}), **table.get(task, {})}
+    slo = entry.get("slo") or {}
+    return Route(
+        task=task,
+        deployment=entry["deployment"],
+        fallbacks=list(entry.get("fallbacks") or []),
+        max_tokens=entry.get("max_tokens"),
+        temperature=entry.get("temperature", 0.3),
+        latency_seconds=slo.get("latency_seconds"),
+        max_cost_usd=slo.get("max_cost_usd"),
+        hedge=bool(entry.get("hedge", False)),
+        max_continuations=int(entry.get("max_continuations", MAX_CONTINUATIONS)),
+        rfp_tokens=entry.get("rfp_tokens"),
+        batch_deployment=entry.get("batch_deployment"),
+    )
+
+
+# -------------------------------------------------------
+# Continuation of truncated completions
+# -------------------------------------------------------
+
+def join_continuation(partial, more):
+    """
+    Append `more` to `partial` exactly as generated, dropping text the model
+    repeated. Whitespace at the cut belongs to one of the two pieces, so
+    nothing is added or stripped here.
+    """
+    for size in range(min(len(partial), len(more)), MIN_OVERLAP_CHARS - 1, -1):
+        if partial.endswith(more[:size]):
+            return partial + more[size:]
+    return partial + more
+
+
+def continuation_messages(messages, partial):
+    return messages + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def _merge_results(first, more, text):
+    usage = {k: first.usage.get(k, 0) + more.usage.get(k, 0) for k in {*first.usage, *more.usage}}
+    return dataclasses.replace(
+        first,
+        text=text,
+        finish_reason=more.finish_reason,
+        usage=usage,
+        attempts=first.attempts + more.attempts,
+        latency=first.latency + more.latency,
+        cached=first.cached and more.cached,
+    )
+
+
+def _continuation_params(params, partial):
+    params = dict(params)
+    # a continuation is a suffix of the answer, not a fresh JSON object
+    params.pop("response_format", None)
+    on_text = params.get("on_text")
+    if on_text is not None:
+        params["on_text"] = lambda text: on_text(join_continuation(partial, text))
+    return params
+
+
+async def _acontinue(task, messages, result, route, params):
+    for round_ in range(route.max_continuations):
+        if result.finish_reason != "length":
+            break
+        print(f"✂️ {task}: output hit max_tokens on {result.deployment}; continuing ({round_ + 1})")
+        more = await llm_gateway.achat(
+            continuation_messages(messages, result.text),
+            deployment=result.deployment, **_continuation_params(params, result.text)
+        )
+        result = _merge_results(result, more, join_continuation(result.text, more.text))
+    if result.finish_reason == "length":
+        print(f"⚠️ {task}: output still truncated after {route.max_continuations} continuation(s)")
+    return dataclasses.replace(result, text=result.text.strip())
+
+
+def _continue(task, messages, result, route, params):
+    for round_ in range(route.max_continuations):
+        if result.finish_reason != "length":
+            break
+        print(f"✂️ {task}: output hit max_tokens on {result.deployment}; continuing ({round_ + 1})")
+        more = llm_gateway.chat(
+            continuation_messages(messages, result.text),
+            deployment=result.deployment, **_continuation_params(params, result.text)
+        )
+        result = _merge_results(result, more, join_continuation(result.text, more.text))
+    if result.finish_reason == "length":
+        print(f"⚠️ {task}: output still truncated after {route.max_continuations} continuation(s)")
+    return dataclasses.replace(result, text=result.text.strip())
+
+
+def continue_truncated(task, messages, result, route=None, **kwargs):
+    """Continue `result` (e.g. a batch job answer) on its deployment if it stopped at max_tokens."""
+    route = route or get_route(task)
+    params = {**route.params(), **kwargs}
+    params.setdefault("timeout", route.latency_seconds)
+    with usage_labels(section=task):
+        return _continue(task, messages, result, route, params)
+
+
+# -------------------------------------------------------
+# Routed calls
+# -------------------------------------------------------
+
+
+async def achat(task, messages, route=None, **kwargs):
+    """
+    Chat completion for `task` along its route: each deployment in the chain
+    gets the latency SLO as its deadline; the last LLMError is raised when all fail.
+    Hedged routes race the first two deployments of the chain. Truncated
+    output is continued on the deployment that produced it. Calls are recorded
+    in the usage store under section=`task`.
+    """
+    with usage_labels(section=task):
+        return await _achat(task, messages, route, **kwargs)
+
+
+async def _achat(task, messages, route=None, **kwargs):
+    route = route or get_route(task)
+    params = {**route.params(), **kwargs}
+    params.setdefault("timeout", route.latency_seconds)
+    chain, error = route.chain, None
+    if route.hedge and HEDGING_ENABLED and len(chain) > 1:
+        try:
+            result = await hedged_achat(messages, chain[0], chain[1], **params)
+        except HedgeError as e:
+            # deployments that only lost the race (cancelled) are still worth a try
+            error, chain = e, [d for d in chain if d not in e.errors]
+            if chain:
+                print(f"↪️ {task}: hedged call failed ({e}); falling back")
+        else:
+            return await _acontinue(task, messages, result, route, params)
+    for deployment in chain:
+        try:
+            result = await llm_gateway.achat(messages, deployment=deployment, **params)
+            record_ttft(deployment, result.ttft)
+            return await _acontinue(task, messages, result, route, params)
+        except llm_gateway.LLMError as e:
+            error = e
+            if deployment != chain[-1]:
+                print(f"↪️ {task}: {deployment} failed ({e}); falling back")
+    raise error
+
+
+def chat(task, messages, route=None, **kwargs):
+    """Blocking variant of achat for synchronous callers."""
+    with usage_labels(section=task):
+        return _chat(task, messages, route, **kwargs)
+
+
+def _chat(task, messages, route=None, **kwargs):
+    route = route or get_route(task)
+    params = {**route.params(), **kwargs}
+    params.setdefault("timeout", route.latency_seconds)
+    error = None
+    for deployment in route.chain:
+        try:
+            result = llm_gateway.chat(messages, deployment=deployment, **params)
+            return _continue(task, messages, result, route, params)
+        except llm_gateway.LLMError as e:
+            error = e
+            if deployment != route.chain[-1]:
+                print(f"↪️ {task}: {deployment} failed ({e}); falling back")
+    raise error
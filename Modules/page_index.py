@@ -0,0 +1,140 @@
+"""
+Page-level index of an RFP for incremental regeneration of revised versions.
+
+Every run stores, per RFP page, a content hash, and a section index saying
+which pages feed which proposal section. A page's similarity to a section is
+that of its most relevant passage; a section is fed by its top-scoring pages,
+those within SECTION_PAGE_CUTOFF of the best page (at most SECTION_MAX_PAGES).
+
+For an RFP v2 the earlier version is the recent run, generated with the same
+settings (reference SOW, condensation mode, boilerplate version), sharing the
+most page hashes. The hash sequences are aligned with difflib, so inserted or
+deleted pages do not shift everything after them. Changed and inserted pages
+are mapped through the new index, removed pages through the old one. Only the
+sections they feed are regenerated; every other section is copied from the
+earlier run.
+"""
+import difflib
+import os
+
+import numpy as np
+
+from Modules.checkpoints import RUNS_DIR, RunCheckpoint
+from Modules.proposal_memory import INTERFACE_COUNT_SECTIONS
+from Modules.passages import SECTION_INTENTS, RFPPassages, passage_hash, split_passages
+
+
+PAGES_ARTIFACT = "pages"
+SECTION_PAGE_CUTOFF = 0.8            # pages scoring at least this share of the best page's similarity feed a section
+SECTION_MAX_PAGES = 6
+MIN_SHARED_PAGES = 0.5               # share of pages an earlier run must share to count as a version
+MAX_CANDIDATE_RUNS = 200
+
+
+def section_pages(scores, page_of, pages):
+    """Top-scoring pages of one section, given per-passage similarities and each passage's page."""
+    best = np.full(pages, -np.inf)
+    np.maximum.at(best, page_of, scores)
+    ranked = [int(p) for p in np.argsort(-best, kind="stable") if np.isfinite(best[p])]
+    if not ranked:
+        return []
+    cutoff = best[ranked[0]] * SECTION_PAGE_CUTOFF if best[ranked[0]] > 0 else best[ranked[0]]
+    return sorted(p for p in ranked[:SECTION_MAX_PAGES] if best[p] >= cutoff)
+
+
+def build_page_index(pages, settings, num_interfaces=None):
+    """
+    Page hashes and {section: [page numbers]} of an RFP given as a list of page
+    texts. `settings` (see proposal_memory.reuse_settings) must match for reuse.
+    """
+    passages, page_of = [], []
+    for number, page in enumerate(pages):
+        for passage in split_passages(page):
+            passages.append(passage)
+            page_of.append(number)
+
+    rfp = RFPPassages(passages=passages)
+    page_of = np.asarray(page_of, dtype=int)
+    sections = {
+        section: section_pages(rfp.relevance(section), page_of, len(pages)) if passages else []
+        for section in SECTION_INTENTS
+    }
+    return {
+        "hashes": [passage_hash(page) for page in pages],
+        "sections": sections,
+        "num_interfaces": num_interfaces,
+        "settings": settings,
+    }
+
+
+def diff_pages(new_hashes, old_hashes):
+    """(changed or inserted pages of the new version, changed or removed pages of the old one)."""
+    matcher = difflib.SequenceMatcher(a=old_hashes, b=new_hashes, autojunk=False)
+    new_changed, old_changed = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            old_changed += range(i1, i2)
+            new_changed += range(j1, j2)
+    return new_changed, old_changed
+
+
+def sections_to_regenerate(new_index, old_index, sections=tuple(SECTION_INTENTS)):
+    new_changed, old_changed = diff_pages(new_index["hashes"], old_index["hashes"])
+    regenerate = []
+    for section in sections:
+        fed_new = set(new_index["sections"].get(section, ()))
+        fed_old = set(old_index["sections"].get(section, ()))
+        if (
+            fed_new.intersection(new_changed)
+            or fed_old.intersection(old_changed)
+            or (section in INTERFACE_COUNT_SECTIONS and new_index["num_interfaces"] != old_index["num_interfaces"])
+        ):
+            regenerate.append(section)
+    return regenerate
+
+
+def find_previous_version(index, sections, exclude=None, runs_dir=RUNS_DIR):
+    """(run, shared page fraction) of the recent run with the same settings sharing the most pages, or (None, 0.0)."""
+    if not os.path.isdir(runs_dir) or not index["hashes"]:
+        return None, 0.0
+    candidates = [
+        name for name in os.listdir(runs_dir)
+        if name != exclude and os.path.isfile(os.path.join(runs_dir, name, f"{PAGES_ARTIFACT}.json"))
+    ]
+    candidates.sort(key=lambda name: os.path.getmtime(os.path.join(runs_dir, name)), reverse=True)
+
+    new_hashes = set(index["hashes"])
+    best, best_share = None, 0.0
+    for run_id in candidates[:MAX_CANDIDATE_RUNS]:
+        run = RunCheckpoint(run_id, runs_dir)
+        other = run.load_artifact(PAGES_ARTIFACT)
+        if not other or other.get("settings") != index["settings"]:
+            continue
+        share = len(new_hashes.intersection(other["hashes"])) / max(len(new_hashes), len(set(other["hashes"])))
+        if share > best_share and any(run.load(s) is not None for s in sections):
+            best, best_share = run, share
+    if best_share < MIN_SHARED_PAGES:
+        return None, best_share
+    return best, best_share
+
+
+def reuse_previous_version(run, index, sections, runs_dir=RUNS_DIR):
+    """
+    Copy the sections of the earlier version of this RFP that no changed page
+    feeds into `run`. Returns (source run or None, shared page fraction,
+    changed page numbers, reused sections, sections to generate).
+    """
+    source, share = find_previous_version(index, sections, exclude=os.path.basename(run.path), runs_dir=runs_dir)
+    if source is None:
+        return None, share, [], [], list(sections)
+    old_index = source.load_artifact(PAGES_ARTIFACT)
+    changed_pages, _ = diff_pages(index["hashes"], old_index["hashes"])
+    regenerate = set(sections_to_regenerate(index, old_index, sections))
+    reused = []
+    for section in sections:
+        result = source.load(section)
+        if section in regenerate or result is None or run.load(section) is not None:
+            continue
+        run.save(section, result, reused_from=source.run_id, unchanged_pages=True)
+        reused.append(section)
+    return source, share, changed_pages, reused, [s for s in sections if s not in reused]
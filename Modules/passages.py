@@ -0,0 +1,155 @@
+"""
+RFP passages, their embeddings and their relevance to each proposal section.
+
+An RFP (or its condensed brief) is split into passages on line boundaries and
+every passage is embedded once. Each proposal section has an intent
+description; a passage's relevance to a section is the cosine similarity of
+the two embeddings.
+
+Embeddings are MiniLM by default. "hashing" embeds word uni- and bigrams with
+feature hashing: no model download, stable across processes and good at
+spotting the lexical near-duplicates a re-issued RFP consists of. MiniLM
+falls back to hashing when sentence-transformers is unavailable.
+
+Routing gives every section prompt only the passages most relevant to it,
+up to the section's token budget, instead of the whole text.
+"""
+import hashlib
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from Modules import model_routing
+from Modules.extractive import MINILM_MODEL, minilm_vectors
+from Modules.ingestion import chunk_text
+from Modules.token_budget import TokenBudget
+
+
+PASSAGE_EMBEDDINGS = os.getenv("PASSAGE_EMBEDDINGS", "minilm")     # "minilm" or "hashing"
+PASSAGE_CHARS = 600
+HASHING_DIMENSIONS = 2048
+SECTION_TOP_K = 8                    # passages that characterise a section
+
+SECTION_INTENTS = {
+    "exec_summary": (
+        "Client background and business objectives, purpose and overview of the RFP, "
+        "migration of SAP PI/PO interfaces to SAP Integration Suite, expected outcomes and benefits."
+    ),
+    "scope": (
+        "Scope of work and requirements: in-scope and out-of-scope items, interfaces and ICOs to migrate, "
+        "adapters, environments, testing, deliverables, prerequisites, assumptions and client responsibilities."
+    ),
+    "resource_schedule": (
+        "Timeline, schedule, milestones and phases, project duration and start date, team structure, roles "
+        "and effort, pricing, commercial terms, rates, payment terms and budget."
+    ),
+    "communication_plan": (
+        "Project governance and communication: status reporting, meetings, stakeholders, escalation path, "
+        "issue and risk management, change requests, project management approach."
+    ),
+}
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9\-/\.]*[a-z0-9]|[a-z0-9]")
+
+
+def split_passages(text, chars=PASSAGE_CHARS):
+    return chunk_text(text, chunk_size=chars, overlap=0)
+
+
+def passage_hash(text):
+    """Hash of a passage that ignores whitespace and case."""
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def hashing_vectors(texts, dimensions=HASHING_DIMENSIONS):
+    """L2-normalised feature-hashed word uni/bigram vectors (no vocabulary, no model)."""
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _WORD.findall(text.lower())
+        terms = Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+        for term, count in terms.items():
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "big") % dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            matrix[row, bucket] += sign * (1 + np.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def embed(texts, model=PASSAGE_EMBEDDINGS):
+    """(vectors, model name actually used). Vectors are L2-normalised rows."""
+    if not texts:
+        return np.zeros((0, HASHING_DIMENSIONS), dtype=np.float32), "hashing"
+    if model == "minilm":
+        try:
+            return minilm_vectors(texts), MINILM_MODEL
+        except Exception as e:
+            print(f"⚠️ MiniLM embeddings unavailable ({e}); using feature hashing")
+    return hashing_vectors(texts), "hashing"
+
+
+def embed_like(texts, model):
+    """Embed `texts` with the same model as stored vectors (`model` as returned by embed)."""
+    return embed(texts, "minilm" if model == MINILM_MODEL else "hashing")[0]
+
+
+class RFPPassages:
+    """Passages of one RFP text with their embeddings and per-section relevance."""
+
+    def __init__(self, text="", model=PASSAGE_EMBEDDINGS, passages=None):
+        self.passages = split_passages(text) if passages is None else list(passages)
+        self.vectors, self.model = embed(self.passages, model)
+        self._intents = None
+
+    def intent_vectors(self):
+        if self._intents is None:
+            self._intents = embed_like(list(SECTION_INTENTS.values()), self.model)
+        return dict(zip(SECTION_INTENTS, self._intents))
+
+    def relevance(self, section):
+        """Cosine similarity of every passage to the section's intent."""
+        if not self.passages:
+            return np.zeros(0, dtype=np.float32)
+        return self.vectors @ self.intent_vectors()[section]
+
+    def top_passages(self, section, k=SECTION_TOP_K):
+        """Indices of the `k` passages most relevant to `section`, best first."""
+        return [int(i) for i in np.argsort(-self.relevance(section), kind="stable")[:k]]
+
+    def document_vector(self):
+        """Normalised mean of the passage vectors."""
+        if not self.passages:
+            return self.vectors.sum(axis=0)
+        mean = self.vectors.mean(axis=0)
+        return mean / (np.linalg.norm(mean) or 1)
+
+
+def section_passages(rfp, section, max_tokens, count):
+    """
+    Text of the passages of `rfp` most relevant to `section` that fit in
+    `max_tokens` (counted with `count`), in document order. The opening
+    passage (client and RFP overview) is always kept. The whole text is
+    returned when it fits or when there is no budget.
+    """
+    tokens = [count(passage) for passage in rfp.passages]
+    if not max_tokens or sum(tokens) <= max_tokens:
+        return "\n".join(rfp.passages)
+
+    chosen, used = {0}, tokens[0]
+    for i in rfp.top_passages(section, len(rfp.passages)):
+        if i not in chosen and used + tokens[i] <= max_tokens:
+            chosen.add(i)
+            used += tokens[i]
+    return "\n".join(rfp.passages[i] for i in sorted(chosen))
+
+
+def route_rfp(condensed_rfp, passages=None, sections=tuple(SECTION_INTENTS)):
+    """{section: the brief's passages most relevant to it}, within the `rfp_tokens` budget of its route."""
+    passages = passages or RFPPassages(condensed_rfp)
+    routed = {}
+    for section in sections:
+        route = model_routing.get_route(section)
+        routed[section] = section_passages(passages, section, route.rfp_tokens, TokenBudget(route.deployment).count)
+    return routed
@@ -302,6 +302,36 @@
 # """
 
 
+def get_shared_context_prompt(reference_text, condensed_rfp):
+    """
+    System message of every section call. `reference_text` is the part of the
+    reference SOW matching the section and `condensed_rfp` the RFP passages
+    routed to it; calls with the same reference share a prompt prefix the
+    provider can serve from its cache.
+    """
+    return f"""
+You are an expert SAP RFP proposal writer for **Crave InfoTech**.
+
+You write individual sections of a proposal in response to the client RFP below.
+Match the tone, structure and style of the reference Statement of Work.
+Use facts about the client only from the condensed RFP; use the reference only for style, structure and Crave's standard content.
+
+### 🔹 REFERENCE STATEMENT OF WORK (STYLE AND TONE REFERENCE):
+{reference_text}
+
+### 🔹 CONDENSED RFP CONTENT:
+{condensed_rfp}
+"""
+
+
+def section_messages(reference_text, condensed_rfp, instructions):
+    """Chat messages for one section: shared context first, section instructions last."""
+    return [
+        {"role": "system", "content": get_shared_context_prompt(reference_text, condensed_rfp)},
+        {"role": "user", "content": instructions},
+    ]
+
+
 def get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces=None):
     """
     Generates Crave-style Executive Summary and Objective based on the RFP.
@@ -312,10 +342,8 @@ def get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, nu
         else "The project involves migration from the current SAP PI/PO integration platform to SAP Integration Suite."
     )
 
-    return f"""
-You are an expert SAP RFP proposal writer for **Crave InfoTech**.
-
-Your writing must strictly follow **the tone, structure, and style of the reference text below**.
+    return section_messages(reference_text, condensed_rfp, f"""
+Your writing must strictly follow **the tone, structure, and style of the reference Statement of Work**.
 Do NOT use generic openings like "honored" or "delighted".
 ALWAYS start with:  
 **"Crave InfoTech is pleased to submit proposal for the PI/PO Integration Migration..."**
@@ -323,36 +351,36 @@ ALWAYS start with:
 ---
 
 ### 🔹 TASK:
-Generate **two labeled sections** only:
-1️⃣ **Executive Summary** – 300–350 words.  
+Generate **two sections** and return them as ONE JSON object (no markdown fences, no text outside the JSON):
+
+{{
+  "exec_summary": "<Executive Summary, markdown>",
+  "objective": {{
+    "text": "<Objective paragraph, markdown>",
+    "table": {{"headers": ["No.", "<column title>"], "rows": [["1", "<cell>"]]}}
+  }}
+}}
+
+1️⃣ **exec_summary** – the client-specific opening only, 80–120 words in 2 short paragraphs.  
    Follow Crave’s tone exactly:
    - Start with “Crave InfoTech is pleased to submit proposal for…”
-   - Mention Crave’s SAP partnership (since 2007), global presence, and expertise.
-   - Include bullet points for key SAP competencies (use the same list from the reference if not provided in RFP).
-   - Mention ISO 9000 quality assurance.
-   - Maintain formal, client-centric language.
-   - Keep paragraphs structured and professional (avoid sales tone).
+   - Say how Crave InfoTech will enable the client to reach its business objectives, then the client’s decision and situation from the RFP.
+   - Do NOT describe Crave’s SAP partnership, global presence, ISO 9000, competencies or company profile:
+     Crave’s standard profile is appended automatically after your text.
+   - Maintain formal, client-centric language (avoid sales tone).
+   - Do NOT include the heading "Executive Summary" itself.
 
-2️⃣ **Objective** – a short 100-word paragraph + the below table:
+2️⃣ **objective.text** – a short 100-word paragraph (without the heading "Objective").
 
-| No. | Migration of ICOs from SAP PI/PO to SAP Integration Suite as per details below |
-|------|--------------------------------------------------------------------------------|
-| 1 | No of Interfaces to be migrated from SAP PI/PO to SAP Integration Suite: {num_interfaces} |
-
-Then add:
-**Interfaces Configuration Objects (ICOs) are listed in the Appendix.**
+3️⃣ **objective.table** – exactly these two columns and this row, as arrays of strings:
+   - headers: ["No.", "Migration of ICOs from SAP PI/PO to SAP Integration Suite as per details below"]
+   - rows: [["1", "No of Interfaces to be migrated from SAP PI/PO to SAP Integration Suite: {num_interfaces}"]]
 
 ---
 
 ### 🔹 PROJECT CONTEXT:
 {interface_info}
-
-### 🔹 USE THIS STYLE AND TONE AS STRICT REFERENCE:
-{reference_text}
-
-### 🔹 CONDENSED RFP CONTENT:
-{condensed_rfp}
-"""
+""")
 
 def get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_interfaces=None):
     """Compact, focused prompt to generate a concise 'Scope and Out of Scope' section."""
@@ -362,9 +390,7 @@ def get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_inter
         else "Migration of interfaces from SAP PI/PO to SAP Integration Suite."
     )
 
-    return f"""
-You are an SAP proposal writer at Crave InfoTech.
-
+    return section_messages(reference_text, condensed_rfp, f"""
 Generate a concise, professional section covering:
 - In Scope
 - Migration Project Prerequisites
@@ -376,21 +402,13 @@ Each section should have 4–8 bullet points, each one line or two at most.
 Mention {interface_info} in the scope.  
 Use 'the client' instead of any past customer name.  
 Avoid unnecessary descriptions or closing summaries.
-
-Reference Text:
-{reference_text}
-
-Condensed RFP:
-{condensed_rfp}
-"""
+""")
 
 def get_resource_schedule_and_commercial_prompt(reference_text, condensed_rfp):
     """
     Concise prompt for generating the highly structured Resource Schedule and Commercials section.
     """
-    return f"""
-You are a senior SAP proposal writer at Crave InfoTech.
-
+    return section_messages(reference_text, condensed_rfp, """
 Generate the section titled **Resource Schedule and Commercials**. The output MUST strictly follow this exact structure using Markdown.
 
 **STRUCTURE REQUIRED (Strict Replication):**
@@ -410,60 +428,82 @@ Generate the section titled **Resource Schedule and Commercials**. The output MU
 4.  **Change Request:** Include the bolded paragraph: "**Any new enhancements or changes identified during the project phase will be considered a change request and will be estimated separately**"
 5.  **Notes:** Use header `Note:` followed by a bulleted list of the two specified points (resource/fee estimates and onsite billing details).
 6.  **Payment Terms:** Use header `Timesheet, Invoices and Payment Terms` followed by a bulleted list of the four specified payment/invoicing terms.
-
-Reference Material:
-{reference_text}
-
-Condensed RFP:
-{condensed_rfp}
-"""
+""")
 
 
 def get_communication_plan_prompt(reference_text, condensed_rfp):
     """
-    Generates a concise, structured Communication Plan section prompt with Crave/client role clarity.
+    Client-specific parts of the Communication Plan; the issue management and
+    escalation procedure is rendered from the boilerplate library.
     """
-    return f"""
-You are an expert SAP proposal writer at Crave InfoTech.
+    return section_messages(reference_text, condensed_rfp, """
+Write the client-specific parts of the **Communication Plan** section of the proposal.
+Describe how Crave InfoTech and the client will manage communication, meetings and reporting during the project.
 
-Write a formal, client-ready **Communication Plan** section for an SAP migration or implementation RFP.  
-Describe how Crave InfoTech and the client (use actual client name from context if available, e.g., Haceb) will manage communication, meetings, reporting, and escalation during the project.
+Return ONE JSON object (no markdown fences, no text outside the JSON):
 
-The section must include:
+{
+  "client_name": "<client name from the RFP, or 'the client' if it is not given>",
+  "intro": "<2–3 sentences, markdown>",
+  "daily_interaction": {"headers": [...], "rows": [[...], ...]}
+}
 
-1. 2–3 lines on the importance of clear and consistent communication for project success, stakeholder alignment, and timely decision-making.
+1️⃣ **intro** – 2–3 sentences on clear and consistent communication for project success, stakeholder alignment and timely decision-making, ending with: "Following table represents different reports that will be generated periodically and circulated to various stakeholders."
 
-2. **Exhibit: Daily Interaction** – Table with columns:  
-   Activity | Communication Mode | Report Recipient/s | Frequency | Comments  
-   Include a row for Weekly Status Report and others like Kick-off Meeting, Daily Stand-up, Steering Committee, etc.  
-   Clearly mention which roles belong to **Crave InfoTech** and which belong to **the client** (e.g., “Crave InfoTech Project Manager”, “Haceb Project Manager”).
+2️⃣ **daily_interaction** – the Exhibit: Daily Interaction table:
+   - headers: ["Activity", "Communication Mode", "Report Recipient/s", "Frequency", "Comments"]
+   - rows: Weekly Status Report plus the meetings the RFP asks for (e.g. Kick-off Meeting, Daily Stand-up, Steering Committee), 3–6 rows.
+   - Mark every role as Crave-side or client-side (e.g. "Crave InfoTech Project Manager", "Haceb Project Manager").
 
-3. **Issue Resolution and Escalation Procedure** – Short paragraph describing the structured approach for logging, managing, and escalating issues.  
-   Then include:
-   - **Table: Issue Management** (Task | Timescale | Responsibility)  
-   - **Bulleted list:** Issue reporting guidelines that mention role responsibilities on both Crave and client sides.
+Do NOT write the Issue Resolution and Escalation Procedure, Issue Management, Issue Classification or Escalation Process:
+Crave's standard procedure is appended automatically after your text.
+Keep tone formal, enterprise-level and realistic.
+""")
 
-4. **Table: Issue Classification** – Columns: Problem Type | Definition | Reporting Process | Solution Responsible  
-   Include rows for Low, Serious, and Critical.  
-   Indicate clearly who is responsible on Crave side and on the client side for each case.
+def get_rfp_chunk_summary_prompt(chunk_text, part, total_parts):
+    """
+    Map step of RFP condensation: extract the proposal-relevant facts from one part of the RFP.
+    """
+    return f"""
+You are an SAP pre-sales analyst at Crave InfoTech preparing a proposal brief.
+
+Below is part {part} of {total_parts} of a client RFP. Extract only the facts a proposal writer needs:
+- Client name, industry and business context
+- Current landscape (SAP PI/PO version, systems, interface/ICO counts, adapters)
+- Requested scope, deliverables and explicitly excluded items
+- Timeline, milestones, go-live dates and phases
+- Team, location, language and staffing requirements
+- Commercial terms, pricing model, payment and invoicing rules
+- Communication, reporting, governance and escalation expectations
+- Evaluation criteria and mandatory response requirements
+
+Rules:
+- Bullet points only, grouped under the headings above; skip headings with no facts.
+- Keep numbers, dates, names and system identifiers exactly as written.
+- Do not invent or infer anything that is not in the text.
+- Maximum 350 words.
+
+RFP part {part}/{total_parts}:
+{chunk_text}
+"""
 
-5. **Table: Escalation Process** – Columns: Issue Type | Escalation Point | Escalation Criteria | Governance Role (Project Core Group)  
-   Include rows for Project Delivery, Contract, Unresolved Delivery Issue, and Program Management Issue.  
-   Specify which escalation points or governance roles belong to Crave vs. the client.
 
-6. Close with 1–2 lines summarizing how this structured plan ensures transparency, timely updates, and strong collaboration between Crave InfoTech and the client.
+def get_rfp_merge_prompt(partial_briefs):
+    """
+    Reduce step of RFP condensation: merge the per-part briefs into one brief.
+    """
+    return f"""
+You are an SAP pre-sales analyst at Crave InfoTech.
 
-**Formatting rules:**
-- Use markdown headers and tables exactly.
-- Keep tone formal, enterprise-level, and realistic.
-- Replace “the client” with actual client name (from context or reference) wherever possible.
-- Keep total length around 700–900 words.
-- Ensure all roles are clearly marked as Crave-side or Client-side.
+Merge the partial RFP briefs below into ONE condensed proposal brief.
 
-### 🔹 USE THIS STYLE AND TONE AS STRICT REFERENCE:
-{reference_text}
+Rules:
+- Keep the same headings; merge duplicate facts and keep the most specific value.
+- If parts contradict each other, keep both values and mark them "(conflicting in RFP)".
+- Keep numbers, dates, names and system identifiers exactly as written.
+- Do not add facts that are not in the partial briefs.
+- Bullet points only, maximum 900 words.
 
-Condensed RFP:
-{condensed_rfp}
+Partial briefs:
+{partial_briefs}
 """
-
@@ -0,0 +1,182 @@
+"""
+Rendering of the generated sections into the proposal DOCX template.
+"""
+from docx import Document
+from docx.enum.table import WD_ALIGN_VERTICAL
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.shared import Inches, Pt, RGBColor
+
+
+def apply_bullet_to_para(paragraph, list_id='1'):
+    """
+    Applies a dot bullet style (list level 0) using its XML structure.
+    Uses numId='1' which is often the default bullet style in templates.
+    """
+    pPr = paragraph._element.get_or_add_pPr()
+    numPr = OxmlElement('w:numPr')
+    
+    # Set the list level (0 is the main level)
+    ilvl = OxmlElement('w:ilvl')
+    ilvl.set(qn('w:val'), '0')
+    
+    # Set the list ID (Most default templates use ID '1' for the first bullet definition)
+    numId = OxmlElement('w:numId')
+    numId.set(qn('w:val'), list_id)
+    
+    numPr.append(ilvl)
+    numPr.append(numId)
+    pPr.append(numPr)
+
+
+def insert_executive_summary_into_template(
+    template_path,
+    summary_text,
+    objective_text=None,
+    scope_text=None,
+    resource_schedule_text=None,
+    communication_plan_text=None,
+):
+    """
+    Replace placeholders in the template:
+    <<EXEC_SUMMARY>>, <<OBJECTIVE>>, <<SCOPE_TEXT>>, <<RESOURCE_SCHEDULE>>, <<COMMUNICATION_PLAN>>
+    Now includes robust bullet point handling.
+    """
+
+    doc = Document(template_path)
+
+    def set_cell_shading(cell, fill_color):
+        """Add shading (background color) to a table cell."""
+        tc_pr = cell._element.tcPr
+        shd = OxmlElement("w:shd")
+        shd.set(qn("w:val"), "clear")
+        shd.set(qn("w:color"), "auto")
+        shd.set(qn("w:fill"), fill_color)
+        tc_pr.append(shd)
+
+    def set_table_border_white(table, cell_margin=150):
+        """Set all table borders to white (for clean, minimal look)."""
+        tbl = table._element
+        tbl_pr = tbl.tblPr
+        tbl_borders = OxmlElement("w:tblBorders")
+
+        for border_name in ["top", "left", "bottom", "right", "insideH", "insideV"]:
+            border_el = OxmlElement(f"w:{border_name}")
+            border_el.set(qn("w:val"), "single")
+            border_el.set(qn("w:sz"), "4")  # thin border
+            border_el.set(qn("w:space"), "0")
+            border_el.set(qn("w:color"), "FFFFFF")  # white
+            tbl_borders.append(border_el)
+
+        tbl_pr.append(tbl_borders)
+
+
+    def insert_styled_table(parent, headers, rows):
+        """Create a table styled similar to RFP objective section."""
+        table = parent.add_table(rows=len(rows) + 1, cols=len(headers))
+        table.style = "Table Grid"
+        table.autofit = True
+
+        # Header row styling
+        hdr_cells = table.rows[0].cells
+        for i, h in enumerate(headers):
+            hdr_cells[i].text = h.strip()
+            set_cell_shading(hdr_cells[i], "008FD3")  # blue header
+            for run in hdr_cells[i].paragraphs[0].runs:
+                run.font.bold = True
+                run.font.color.rgb = RGBColor(255, 255, 255)
+            hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
+            hdr_cells[i].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+
+        # Data rows
+        for r, row_data in enumerate(rows):
+            cells = table.rows[r + 1].cells
+            for c, val in enumerate(row_data):
+                cells[c].text = str(val).strip()
+                set_cell_shading(cells[c], "E7EEF7")  # light gray row
+                cells[c].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+                cells[c].paragraphs[0].alignment = (
+                    WD_ALIGN_PARAGRAPH.LEFT if c == 0 else WD_ALIGN_PARAGRAPH.LEFT
+                )
+
+        # Set uniform width
+        for row in table.rows:
+            for cell in row.cells:
+                cell.width = Inches(3)
+
+        # Apply white borders
+        set_table_border_white(table)
+
+        return table
+
+    def replace_placeholder(doc, placeholder, new_text):
+        if not new_text:
+            return
+
+        for para in doc.paragraphs:
+            if placeholder in "".join(run.text for run in para.runs):
+                parent = para._element.getparent()
+                idx = parent.index(para._element)
+                parent.remove(para._element)
+
+                lines = [line.strip() for line in new_text.split("\n") if line.strip()]
+                new_elements = []  # collect to insert once
+
+                i = 0
+                while i < len(lines):
+                    line = lines[i]
+
+                    # Markdown-style table
+                    if line.startswith("|") and "|" in line:
+                        table_lines = []
+                        while i < len(lines) and lines[i].startswith("|"):
+                            table_lines.append(lines[i])
+                            i += 1
+                        headers = [h.strip("* ") for h in table_lines[0].strip("|").split("|")]
+                        rows = [
+                            [c.strip() for c in r.strip("|").split("|")]
+                            for r in table_lines[2:]
+                        ]
+                        table = insert_styled_table(doc, headers, rows)
+                        new_elements.append(table._element)
+                        continue
+
+                    # Section heading
+                    if line.startswith("**") or line.startswith("###"):
+                        header_text = line.strip("*# ").rstrip(":")
+                        new_para = doc.add_paragraph(header_text)
+                        new_para.style = "Table Column Heading"
+                        new_para.paragraph_format.space_after = Pt(4)
+                        new_elements.append(new_para._element)
+                        i += 1
+                        continue
+
+                    # Markdown bullets (FIXED: Use apply_bullet_to_para for robustness)
+                    if line.startswith("- ") or line.startswith("• "):
+                        bullet_text = line[2:].strip() if line.startswith("- ") else line[1:].strip()
+                        new_para = doc.add_paragraph(bullet_text, style="List Bullet 2")
+                        new_para.paragraph_format.left_indent = Pt(18)
+                        new_para.paragraph_format.space_after = Pt(2)
+                        new_elements.append(new_para._element)
+                        i += 1
+                        continue
+
+                    # Regular text
+                    new_para = doc.add_paragraph(line)
+                    new_elements.append(new_para._element)
+                    i += 1
+
+                # ⚡️ Insert all new elements once
+                for element in reversed(new_elements):
+                    parent.insert(idx, element)
+                return
+
+    # Replace placeholders with sections
+    replace_placeholder(doc, "<<EXEC_SUMMARY>>", summary_text)
+    replace_placeholder(doc, "<<OBJECTIVE>>", objective_text)
+    replace_placeholder(doc, "<<SCOPE_TEXT>>", scope_text)
+    replace_placeholder(doc, "<<RESOURCE_SCHEDULE>>", resource_schedule_text)
+    replace_placeholder(doc, "<<COMMUNICATION_PLAN>>", communication_plan_text)
+
+    return doc
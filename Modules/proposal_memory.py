@@ -0,0 +1,130 @@
+"""
+Semantic near-duplicate cache of earlier proposals.
+
+Revised or re-issued RFPs differ from an earlier one by a few edits. Every
+run stores a fingerprint of its condensed RFP: the document embedding, and
+for each section the passages most relevant to it (hash + embedding). A new
+RFP is compared with the recent runs. When a run is similar above
+RFP_SIMILARITY_THRESHOLD and was generated with the same embedding model and
+settings (reference SOW, condensation mode, boilerplate version), its
+finished sections can be reused as an instant draft. A section is regenerated
+only when its relevant passages changed, i.e. some passage on either side has
+no counterpart above PASSAGE_MATCH_THRESHOLD on the other.
+"""
+import os
+
+import numpy as np
+
+from Modules.checkpoints import RUNS_DIR, RunCheckpoint
+from Modules.passages import SECTION_INTENTS, RFPPassages, passage_hash
+
+
+RFP_SIMILARITY_THRESHOLD = float(os.getenv("RFP_SIMILARITY_THRESHOLD", "0.92"))
+PASSAGE_MATCH_THRESHOLD = 0.97
+MAX_CANDIDATE_RUNS = 200             # most recent fingerprints compared
+FINGERPRINT_ARTIFACT = "fingerprint"
+# sections whose prompt also takes the detected interface count
+INTERFACE_COUNT_SECTIONS = {"exec_summary", "scope"}
+
+
+def reuse_settings(reference_text, condense_mode, boilerplate_version):
+    """Inputs besides the RFP that shape the sections; runs are only reused across equal settings."""
+    return {
+        "reference_hash": passage_hash(reference_text),
+        "condense_mode": condense_mode,
+        "boilerplate_version": boilerplate_version,
+    }
+
+
+def build_fingerprint(condensed_rfp, settings, num_interfaces=None, passages=None):
+    passages = passages or RFPPassages(condensed_rfp)
+    sections = {}
+    for section in SECTION_INTENTS:
+        top = passages.top_passages(section)
+        sections[section] = {
+            "hashes": [passage_hash(passages.passages[i]) for i in top],
+            "vectors": np.round(passages.vectors[top], 4).tolist(),
+        }
+    return {
+        "model": passages.model,
+        "vector": np.round(passages.document_vector(), 4).tolist(),
+        "settings": settings,
+        "num_interfaces": num_interfaces,
+        "sections": sections,
+    }
+
+
+def _passages_match(new, old):
+    """True when every passage on each side has a near-identical counterpart on the other."""
+    if set(new["hashes"]) == set(old["hashes"]):
+        return True
+    a, b = np.asarray(new["vectors"], dtype=np.float32), np.asarray(old["vectors"], dtype=np.float32)
+    if not len(a) or not len(b):
+        return False
+    similarity = a @ b.T
+    return bool(similarity.max(axis=1).min() >= PASSAGE_MATCH_THRESHOLD
+                and similarity.max(axis=0).min() >= PASSAGE_MATCH_THRESHOLD)
+
+
+def changed_sections(new, old, sections=tuple(SECTION_INTENTS)):
+    """Sections whose relevant RFP passages (or prompt inputs) differ between two fingerprints."""
+    changed = []
+    for section in sections:
+        if section in INTERFACE_COUNT_SECTIONS and new["num_interfaces"] != old["num_interfaces"]:
+            changed.append(section)
+        elif not _passages_match(new["sections"][section], old["sections"][section]):
+            changed.append(section)
+    return changed
+
+
+def _recent_runs(runs_dir, exclude):
+    if not os.path.isdir(runs_dir):
+        return []
+    paths = [
+        os.path.join(runs_dir, name) for name in os.listdir(runs_dir)
+        if name != exclude and os.path.isfile(os.path.join(runs_dir, name, f"{FINGERPRINT_ARTIFACT}.json"))
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    return [os.path.basename(p) for p in paths[:MAX_CANDIDATE_RUNS]]
+
+
+def find_similar_run(fingerprint, sections, exclude=None, runs_dir=RUNS_DIR):
+    """
+    (run, similarity) of the most similar recent run above the threshold that
+    has at least one finished section, or (None, best similarity seen).
+    """
+    vector = np.asarray(fingerprint["vector"], dtype=np.float32)
+    best, best_similarity = None, 0.0
+    for run_id in _recent_runs(runs_dir, exclude):
+        run = RunCheckpoint(run_id, runs_dir)
+        other = run.load_artifact(FINGERPRINT_ARTIFACT)
+        if not other or other["model"] != fingerprint["model"]:
+            continue
+        if other.get("settings") != fingerprint["settings"]:
+            continue
+        similarity = float(vector @ np.asarray(other["vector"], dtype=np.float32))
+        if similarity > best_similarity and any(run.load(s) is not None for s in sections):
+            best, best_similarity = run, similarity
+    if best_similarity < RFP_SIMILARITY_THRESHOLD:
+        return None, best_similarity
+    return best, best_similarity
+
+
+def reuse_from_similar(run, fingerprint, sections, runs_dir=RUNS_DIR):
+    """
+    Copy the unchanged finished sections of the most similar earlier run into
+    `run`. Returns (source run or None, similarity, reused sections, sections to generate).
+    """
+    source, similarity = find_similar_run(fingerprint, sections, exclude=os.path.basename(run.path),
+                                          runs_dir=runs_dir)
+    if source is None:
+        return None, similarity, [], list(sections)
+    changed = set(changed_sections(fingerprint, source.load_artifact(FINGERPRINT_ARTIFACT), sections))
+    reused = []
+    for section in sections:
+        result = source.load(section)
+        if section in changed or result is None or run.load(section) is not None:
+            continue
+        run.save(section, result, reused_from=source.run_id, similarity=round(similarity, 4))
+        reused.append(section)
+    return source, similarity, reused, [s for s in sections if s not in reused]
@@ -0,0 +1,285 @@
+"""
+Process-wide rate limiting of LLM calls per deployment.
+
+Every call first takes its estimated tokens (prompt + max_tokens) and one
+request from two token buckets per deployment, sized from the deployment's
+TPM / RPM quota. Bucket state lives in memory (one Streamlit server) or, with
+RATE_LIMIT_BACKEND=sqlite, in a SQLite file shared by several worker processes.
+
+Calls run in one of two lanes. "interactive" calls (a user waiting on a
+section) go first. "batch" calls wait while interactive calls are queued and
+leave a reserve of each bucket for them.
+
+Concurrency per deployment adapts AIMD-style: +1/limit on every success, halved
+on a 429. A 429 also drains the buckets and blocks the deployment for its
+Retry-After, for every session (and every worker in SQLite mode). Waiting for
+a concurrency slot counts against the caller's deadline like waiting for the
+buckets does.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, closing
+
+
+DEFAULT_TPM = int(os.getenv("LLM_DEFAULT_TPM", "150000"))
+DEFAULT_RPM = int(os.getenv("LLM_DEFAULT_RPM", "900"))
+DEPLOYMENT_QUOTAS = {}               # per-deployment overrides, e.g. {"4o": {"tpm": 80000, "rpm": 480}}
+BURST_SECONDS = 10                   # Azure enforces quotas over short windows; bucket holds 10s of quota
+BATCH_RESERVE_FRACTION = 0.25        # share of each bucket batch calls must leave for interactive ones
+THROTTLE_COOLDOWN_SECONDS = 5.0      # blocking time after a 429 without Retry-After
+DECREASE_INTERVAL_SECONDS = 2.0      # at most one multiplicative decrease per interval
+MAX_WAIT_STEP_SECONDS = 1.0
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")         # "memory" or "sqlite"
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(".llm_cache", "ratelimit.sqlite3"))
+
+LANES = ("interactive", "batch")
+
+
+def quota(deployment):
+    q = DEPLOYMENT_QUOTAS.get(deployment, {})
+    return q.get("tpm", DEFAULT_TPM), q.get("rpm", DEFAULT_RPM)
+
+
+def _bucket_specs(deployment):
+    """(capacity, refill per second) of the token and the request bucket."""
+    tpm, rpm = quota(deployment)
+    return {
+        "tokens": (tpm / 60 * BURST_SECONDS, tpm / 60),
+        "requests": (max(1.0, rpm / 60 * BURST_SECONDS), rpm / 60),
+    }
+
+
+def _take(levels, specs, costs, reserve_fraction, now, updated_at):
+    """
+    Refill `levels` to `now` and take `costs` if they fit. Returns the wait in
+    seconds (0 when taken). A cost above capacity needs a full bucket and
+    leaves it in debt.
+    """
+    wait = 0.0
+    for kind, (capacity, rate) in specs.items():
+        levels[kind] = min(capacity, levels[kind] + (now - updated_at) * rate)
+        needed = min(costs[kind], capacity) + capacity * reserve_fraction
+        needed = min(needed, capacity)
+        if levels[kind] < needed:
+            wait = max(wait, (needed - levels[kind]) / rate)
+    if wait == 0:
+        for kind in specs:
+            levels[kind] -= costs[kind]
+    return wait
+
+
+class MemoryBucketStore:
+    """Bucket state for one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def _get(self, deployment, specs, now):
+        if deployment not in self._state:
+            self._state[deployment] = {
+                "levels": {kind: capacity for kind, (capacity, _) in specs.items()},
+                "updated_at": now,
+                "blocked_until": 0.0,
+            }
+        return self._state[deployment]
+
+    def try_acquire(self, deployment, tokens, reserve_fraction=0.0):
+        specs, now = _bucket_specs(deployment), time.time()
+        with self._lock:
+            state = self._get(deployment, specs, now)
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            wait = _take(state["levels"], specs, {"tokens": tokens, "requests": 1},
+                         reserve_fraction, now, state["updated_at"])
+            state["updated_at"] = now
+            return wait
+
+    def adjust(self, deployment, tokens):
+        """Correct the token bucket once the real usage is known (negative refunds)."""
+        with self._lock:
+            state = self._state.get(deployment)
+            if state:
+                state["levels"]["tokens"] -= tokens
+
+    def block(self, deployment, seconds):
+        specs, now = _bucket_specs(deployment), time.time()
+        with self._lock:
+            state = self._get(deployment, specs, now)
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["levels"] = {kind: 0.0 for kind in specs}
+            state["updated_at"] = now + seconds
+
+
+class SQLiteBucketStore:
+    """Bucket state shared by every process using the same SQLite file."""
+
+    def __init__(self, path=RATE_LIMIT_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    deployment TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    requests REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _locked(self, conn, deployment, specs, now):
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT tokens, requests, updated_at, blocked_until FROM buckets WHERE deployment = ?",
+            (deployment,),
+        ).fetchone()
+        if row is None:
+            row = (specs["tokens"][0], specs["requests"][0], now, 0.0)
+            conn.execute("INSERT INTO buckets VALUES (?, ?, ?, ?, ?)", (deployment, *row))
+        return row
+
+    def try_acquire(self, deployment, tokens, reserve_fraction=0.0):
+        specs, now = _bucket_specs(deployment), time.time()
+        with closing(self._connect()) as conn:
+            try:
+                level_tokens, level_requests, updated_at, blocked_until = self._locked(conn, deployment, specs, now)
+                if blocked_until > now:
+                    conn.execute("COMMIT")
+                    return blocked_until - now
+                levels = {"tokens": level_tokens, "requests": level_requests}
+                wait = _take(levels, specs, {"tokens": tokens, "requests": 1}, reserve_fraction, now, updated_at)
+                conn.execute(
+                    "UPDATE buckets SET tokens = ?, requests = ?, updated_at = ? WHERE deployment = ?",
+                    (levels["tokens"], levels["requests"], now, deployment),
+                )
+                conn.execute("COMMIT")
+                return wait
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def adjust(self, deployment, tokens):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE buckets SET tokens = tokens - ? WHERE deployment = ?", (tokens, deployment))
+
+    def block(self, deployment, seconds):
+        specs, now = _bucket_specs(deployment), time.time()
+        with closing(self._connect()) as conn:
+            try:
+                self._locked(conn, deployment, specs, now)
+                conn.execute(
+                    "UPDATE buckets SET tokens = 0, requests = 0, updated_at = ?, "
+                    "blocked_until = MAX(blocked_until, ?) WHERE deployment = ?",
+                    (now + seconds, now + seconds, deployment),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit with additive increase / multiplicative decrease."""
+
+    def __init__(self, limit, max_limit=None):
+        self.limit = float(limit)
+        self.max_limit = float(max_limit or limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = None
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def __aenter__(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def within(self, timeout):
+        """Hold a slot, waiting at most `timeout` seconds for it (asyncio.TimeoutError otherwise)."""
+        await asyncio.wait_for(self.__aenter__(), timeout)
+        try:
+            yield self
+        finally:
+            await self.__aexit__(None, None, None)
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_INTERVAL_SECONDS:
+            self.limit = max(1.0, self.limit / 2)
+            self._last_decrease = now
+
+
+class RateLimiter:
+    """Token/request buckets, priority lanes and AIMD concurrency per deployment."""
+
+    def __init__(self, store=None, concurrency=8, deployment_concurrency=None):
+        self.store = store or (SQLiteBucketStore() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBucketStore())
+        self.concurrency = concurrency
+        self.deployment_concurrency = deployment_concurrency or {}
+        self._limits = {}
+        self._waiting = {}                 # (deployment, lane) -> queued callers in this process
+        self.stats = {"throttled": 0, "waited_seconds": 0.0}
+
+    def slot(self, deployment):
+        """AIMD concurrency limiter for `deployment` (use with `async with`)."""
+        if deployment not in self._limits:
+            limit = self.deployment_concurrency.get(deployment, self.concurrency)
+            self._limits[deployment] = AdaptiveConcurrency(limit)
+        return self._limits[deployment]
+
+    async def acquire(self, deployment, tokens, lane="interactive"):
+        """Wait until `tokens` and one request are available for `deployment` in `lane`."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {LANES}")
+        key = (deployment, lane)
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        started = time.monotonic()
+        try:
+            while True:
+                if lane == "batch" and self._waiting.get((deployment, "interactive"), 0):
+                    wait = 0.2
+                else:
+                    reserve = BATCH_RESERVE_FRACTION if lane == "batch" else 0.0
+                    wait = await asyncio.to_thread(self.store.try_acquire, deployment, tokens, reserve)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, MAX_WAIT_STEP_SECONDS))
+        finally:
+            self._waiting[key] -= 1
+            self.stats["waited_seconds"] += time.monotonic() - started
+
+    def on_success(self, deployment, estimated_tokens, used_tokens):
+        self.slot(deployment).on_success()
+        if used_tokens:
+            self.store.adjust(deployment, used_tokens - estimated_tokens)
+
+    def on_throttle(self, deployment, retry_after=None):
+        self.stats["throttled"] += 1
+        self.slot(deployment).on_throttle()
+        self.store.block(deployment, retry_after or THROTTLE_COOLDOWN_SECONDS)
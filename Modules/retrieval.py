@@ -0,0 +1,221 @@
+"""
+Local read replica of the active knowledge-base revision, and a retrieval
+router that fails over to it.
+
+The replica is a NumPy matrix of the revision's vectors plus their metadata,
+pulled from Pinecone after a revision is activated. The router embeds the
+query locally, sends it to Pinecone with a latency deadline and answers from
+the replica when the remote query misses the deadline or errors.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+from langchain_core.documents import Document as LDocument
+
+
+REPLICA_DIR = os.path.join(os.getenv("KB_STATE_DIR", ".kb_state"), "replica")
+RETRIEVAL_DEADLINE_SECONDS = float(os.getenv("RETRIEVAL_DEADLINE_SECONDS", "3.0"))
+FETCH_BATCH_SIZE = 100
+
+_remote_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+_replicas = {}
+_replicas_lock = threading.Lock()
+_syncing = set()
+
+failover_stats = {"remote": 0, "timeout": 0, "error": 0, "events": []}
+_stats_lock = threading.Lock()
+
+
+# -------------------------------------------------------
+# Replica
+# -------------------------------------------------------
+
+def _replica_paths(revision):
+    name = revision or "default"
+    return os.path.join(REPLICA_DIR, f"{name}.npy"), os.path.join(REPLICA_DIR, f"{name}.json")
+
+
+def _matches_filter(metadata, flt):
+    """Evaluate the subset of Pinecone filter syntax used by this app ($eq / $in, list fields)."""
+    for key, cond in (flt or {}).items():
+        value = metadata.get(key)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(cond, dict):
+            if "$in" in cond and not set(values) & set(cond["$in"]):
+                return False
+            if "$eq" in cond and cond["$eq"] not in values:
+                return False
+        elif cond not in values:
+            return False
+    return True
+
+
+class LocalReplica:
+    """In-memory cosine index over a synced revision."""
+
+    def __init__(self, ids, vectors, metadata, text_key="text"):
+        self.ids = ids
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.where(norms == 0, 1, norms)
+        self.metadata = metadata
+        self.text_key = text_key
+
+    @classmethod
+    def load(cls, revision):
+        vec_path, meta_path = _replica_paths(revision)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["ids"], np.load(vec_path), meta["metadata"])
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = self.vectors @ query
+        if filter:
+            mask = np.array([_matches_filter(m, filter) for m in self.metadata], dtype=bool)
+            scores = np.where(mask, scores, -np.inf)
+        top = np.argsort(-scores)[:k]
+        results = []
+        for i in top:
+            if not np.isfinite(scores[i]):
+                break
+            meta = dict(self.metadata[i])
+            text = meta.pop(self.text_key, "")
+            results.append((LDocument(page_content=text, metadata=meta), float(scores[i])))
+        return results
+
+
+def sync_replica(index, revision):
+    """Pull every vector of `revision` from Pinecone and store it locally."""
+    ids = [vec_id for page in index.list(namespace=revision) for vec_id in page]
+    kept_ids, rows, metadata = [], [], []
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        batch = ids[start:start + FETCH_BATCH_SIZE]
+        fetched = index.fetch(ids=batch, namespace=revision).vectors
+        for vec_id in batch:
+            vec = fetched.get(vec_id)
+            if vec is None:
+                continue
+            kept_ids.append(vec_id)
+            rows.append(vec.values)
+            metadata.append(dict(vec.metadata or {}))
+
+    if not rows:
+        print(f"⚠️ Revision {revision} has no vectors; local replica not written")
+        return
+
+    os.makedirs(REPLICA_DIR, exist_ok=True)
+    vec_path, meta_path = _replica_paths(revision)
+    np.save(vec_path, np.asarray(rows, dtype=np.float32))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"ids": kept_ids, "metadata": metadata}, f)
+
+    # keep only the replicas of this revision and the one before it
+    replicas = sorted(
+        (p for p in os.listdir(REPLICA_DIR) if p.endswith(".json")),
+        key=lambda p: os.path.getmtime(os.path.join(REPLICA_DIR, p)),
+    )
+    for stale in replicas[:-2]:
+        base = os.path.join(REPLICA_DIR, stale[:-len(".json")])
+        for ext in (".json", ".npy"):
+            if os.path.exists(base + ext):
+                os.remove(base + ext)
+
+    print(f"💾 Synced local replica of revision {revision}: {len(metadata)} vectors")
+
+
+def ensure_replica(index, revision, background=True):
+    """Sync the replica for `revision` if it is not on disk yet."""
+    vec_path, meta_path = _replica_paths(revision)
+    if os.path.exists(vec_path) and os.path.exists(meta_path):
+        return
+    with _replicas_lock:
+        if revision in _syncing:
+            return
+        _syncing.add(revision)
+
+    def run():
+        try:
+            sync_replica(index, revision)
+        except Exception as e:
+            print(f"⚠️ Could not sync local replica of {revision}: {e}")
+        finally:
+            with _replicas_lock:
+                _syncing.discard(revision)
+
+    if background:
+        threading.Thread(target=run, name="replica-sync", daemon=True).start()
+    else:
+        run()
+
+
+def get_replica(revision):
+    """Loaded replica for `revision`, or None when it has not been synced."""
+    with _replicas_lock:
+        if revision in _replicas:
+            return _replicas[revision]
+    try:
+        replica = LocalReplica.load(revision)
+    except FileNotFoundError:
+        return None
+    with _replicas_lock:
+        _replicas[revision] = replica
+    return replica
+
+
+# -------------------------------------------------------
+# Router
+# -------------------------------------------------------
+
+def _record(kind, revision=None, detail=None):
+    with _stats_lock:
+        failover_stats[kind] += 1
+        if kind != "remote":
+            failover_stats["events"].append(
+                {"at": time.time(), "kind": kind, "revision": revision, "detail": detail}
+            )
+            del failover_stats["events"][:-100]
+
+
+class RetrievalRouter:
+    """
+    Vector-store facade that queries Pinecone under a deadline and falls back
+    to the local replica. Every failover on this router is appended to
+    `failovers` as a "<reason>: <detail>" string.
+    """
+
+    def __init__(self, remote_store, embedding_model, revision, deadline=RETRIEVAL_DEADLINE_SECONDS):
+        self.remote_store = remote_store
+        self.embedding_model = embedding_model
+        self.revision = revision
+        self.deadline = deadline
+        self.failovers = []
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        embedding = self.embedding_model.embed_query(query)
+        future = _remote_pool.submit(
+            self.remote_store.similarity_search_by_vector_with_score, embedding, k=k, filter=filter
+        )
+        try:
+            results = future.result(timeout=self.deadline)
+            _record("remote")
+            return results
+        except FutureTimeout:
+            reason, detail = "timeout", f"no answer within {self.deadline:.1f}s"
+        except Exception as e:
+            reason, detail = "error", str(e)
+
+        replica = get_replica(self.revision)
+        if replica is None:
+            raise RuntimeError(f"Pinecone {reason} ({detail}) and no local replica for {self.revision}")
+        _record(reason, self.revision, detail)
+        self.failovers.append(f"{reason}: {detail}")
+        print(f"⚠️ Retrieval failover to local replica ({reason}: {detail})")
+        return replica.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
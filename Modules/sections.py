@@ -0,0 +1,88 @@
+"""
+The four proposal sections, shared by the Streamlit page (integration.py) and
+the batch CLI (batch_proposals.py): their keys and labels, loading them from a
+run checkpoint, the reference SOW lookup, the interface count of an RFP and
+the prompt of each section.
+"""
+import re
+
+from Modules.ingestion import expand_to_documents
+from Modules.knowledge_base import acquire_revision
+from Modules.prompts import (
+    get_executive_summary_and_objective_prompt,
+    get_scope_prereq_assumptions_prompt,
+    get_resource_schedule_and_commercial_prompt,
+    get_communication_plan_prompt
+)
+from Modules.token_budget import fit_prompt
+
+
+SECTION_LABELS = (
+    "Executive Summary & Objective",
+    "Scope & Assumptions",
+    "Resource Schedule & Commercials",
+    "Communication Plan",
+)
+# checkpoint / routing keys, in SECTION_LABELS order
+SECTION_KEYS = ("exec_summary", "scope", "resource_schedule", "communication_plan")
+
+
+def load_section(run, key):
+    """
+    Checkpointed result of section `key`, or None. The executive summary is
+    stored as a [summary, objective] JSON list and comes back as a tuple,
+    whether it was generated, resumed or reused from another run.
+    """
+    result = run.load(key)
+    if key == "exec_summary" and result is not None:
+        return tuple(result)
+    return result
+
+
+def retrieve_reference(knowledge_db, rfp_text):
+    """(reference_text, reference documents, retriever) of the SOW closest to the RFP in the active KB revision."""
+    with acquire_revision() as revision:
+        retriever = knowledge_db.router(revision)
+        ref_docs = expand_to_documents(retriever, retriever.similarity_search(rfp_text, k=1))
+    return "\n\n".join(ref_docs), ref_docs, retriever
+
+
+def detect_interface_count(rfp_text):
+    """(count, "ICOs" | "interfaces") of the largest interface count mentioned in the RFP, or (None, None)."""
+    priority_keywords = ["ICOs?", "iCos?", "integration configuration objects?"]
+    general_keywords = [
+        "interfaces?", "integration points?", "flows?", "connections?",
+        "touchpoints?", "IFlows?", "mappings?", "adapters?"
+    ]
+
+    # First: look specifically for ICO mentions
+    ico_pattern = r'~?\b(\d{1,5})\s*(?:' + "|".join(priority_keywords) + r')\b'
+    ico_matches = re.findall(ico_pattern, rfp_text, flags=re.IGNORECASE)
+    if ico_matches:
+        return max(map(int, ico_matches)), "ICOs"
+
+    # fallback to general terms like 'interfaces' if ICOs not found
+    pattern = r'~?\b(\d{1,5})\s*(?:' + "|".join(general_keywords) + r')\b'
+    matches = re.findall(pattern, rfp_text, flags=re.IGNORECASE)
+    if matches:
+        return max(map(int, matches)), "interfaces"
+    return None, None
+
+
+def build_section_messages(key, route, reference_text, condensed_rfp, num_interfaces=None):
+    """Chat messages of section `key`, fitted to the token budget of its route."""
+    builders = {
+        "exec_summary": lambda reference_text, condensed_rfp: get_executive_summary_and_objective_prompt(
+            reference_text, condensed_rfp, num_interfaces
+        ),
+        "scope": lambda reference_text, condensed_rfp: get_scope_prereq_assumptions_prompt(
+            reference_text, condensed_rfp, num_interfaces
+        ),
+        "resource_schedule": get_resource_schedule_and_commercial_prompt,
+        "communication_plan": get_communication_plan_prompt,
+    }
+    messages, _ = fit_prompt(
+        route.deployment, builders[key], reference_text, condensed_rfp, route.max_tokens,
+        max_cost=route.max_cost_usd,
+    )
+    return messages
@@ -0,0 +1,297 @@
+"""
+Schema-constrained JSON output for multi-part sections.
+
+A section is described by a list of Fields (dotted path, JSON schema, check).
+The model is asked for one JSON object matching the schema built from those
+fields (response_format=json_schema, strict). The reply is parsed once and
+each field is checked on its own; only fields that are missing or malformed
+are asked for again, in a follow-up turn on the same conversation, so the
+shared prompt prefix stays cached. Nothing is ever split heuristically.
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+
+from Modules import model_routing
+
+
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "json_schema")   # or "json_object" (older models)
+MAX_REASKS = 2                  # follow-up rounds for malformed fields
+
+
+class StructuredOutputError(ValueError):
+    """Fields that were still malformed after every re-ask."""
+
+    def __init__(self, problems):
+        super().__init__("; ".join(f"{path}: {reason}" for path, reason in problems.items()))
+        self.problems = problems
+
+
+@dataclass
+class Field:
+    path: str                   # dotted path, e.g. "objective.table"
+    schema: dict
+    check: object = None        # check(value) -> problem string or None
+
+
+TABLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "headers": {"type": "array", "items": {"type": "string"}},
+        "rows": {"type": "array", "items": {"type": "array", "items": {"type": "string"}}},
+    },
+    "required": ["headers", "rows"],
+    "additionalProperties": False,
+}
+
+
+# -------------------------------------------------------
+# Checks
+# -------------------------------------------------------
+
+def text_check(min_words=1):
+    def check(value):
+        if not isinstance(value, str) or not value.strip():
+            return "must be a non-empty string"
+        if len(value.split()) < min_words:
+            return f"must have at least {min_words} words"
+        return None
+    return check
+
+
+def table_check(columns=None, min_rows=1):
+    def check(value):
+        if not isinstance(value, dict):
+            return "must be an object with headers and rows"
+        headers, rows = value.get("headers"), value.get("rows")
+        if not isinstance(headers, list) or not headers or not all(isinstance(h, str) for h in headers):
+            return "headers must be a non-empty list of strings"
+        if columns and len(headers) != columns:
+            return f"must have exactly {columns} columns"
+        if not isinstance(rows, list) or len(rows) < min_rows:
+            return f"must have at least {min_rows} row(s)"
+        for i, row in enumerate(rows):
+            if not isinstance(row, list) or len(row) != len(headers):
+                return f"row {i + 1} must be a list of {len(headers)} strings"
+        return None
+    return check
+
+
+# -------------------------------------------------------
+# Schema / paths
+# -------------------------------------------------------
+
+def build_schema(fields):
+    """Strict JSON schema of the object holding every field at its path."""
+    root = {"type": "object", "properties": {}, "required": [], "additionalProperties": False}
+    for f in fields:
+        node, parts = root, f.path.split(".")
+        for part in parts[:-1]:
+            if part not in node["properties"]:
+                node["properties"][part] = {
+                    "type": "object", "properties": {}, "required": [], "additionalProperties": False,
+                }
+                node["required"].append(part)
+            node = node["properties"][part]
+        node["properties"][parts[-1]] = f.schema
+        node["required"].append(parts[-1])
+    return root
+
+
+def get_path(data, path):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def set_path(data, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def parse_json(text):
+    """Parse a JSON object, tolerating code fences or prose around it. None if impossible."""
+    text = (text or "").strip()
+    for candidate in (text, text[text.find("{"):text.rfind("}") + 1]):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def validate(data, fields):
+    """{path: problem} for every missing or malformed field."""
+    problems = {}
+    for f in fields:
+        value = get_path(data, f.path)
+        if value is None:
+            problems[f.path] = "missing"
+        elif f.check:
+            problem = f.check(value)
+            if problem:
+                problems[f.path] = problem
+    return problems
+
+
+def response_format(name, schema):
+    if STRUCTURED_OUTPUT_MODE == "json_object":
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
+def reask_message(path, problem, schema):
+    return {
+        "role": "user",
+        "content": (
+            f"The field `{path}` in your JSON answer is {problem}. Keep everything else as it was. "
+            f"Return ONLY a JSON object of the form {{\"value\": ...}} where value matches this schema:\n"
+            f"{json.dumps(schema)}"
+        ),
+    }
+
+
+# -------------------------------------------------------
+# Generation
+# -------------------------------------------------------
+
+async def agenerate_structured(task, messages, fields, name, route=None, max_reasks=MAX_REASKS, **kwargs):
+    """
+    Ask for the fields as one JSON object, then re-ask only malformed fields.
+    Returns (data, result) with the LLMResult of the first call. Raises
+    StructuredOutputError when fields are still malformed after `max_reasks`.
+    """
+    route = route or model_routing.get_route(task)
+    result = await model_routing.achat(
+        task, messages, route=route,
+        response_format=response_format(name, build_schema(fields)), **kwargs
+    )
+    kwargs.pop("on_text", None)
+    data = await arepair_structured(task, messages, result.text, fields, name, route, max_reasks, **kwargs)
+    return data, result
+
+
+async def arepair_structured(task, messages, raw_text, fields, name, route=None, max_reasks=MAX_REASKS, **kwargs):
+    """
+    Parse `raw_text` (the answer to `messages`) and re-ask its missing or
+    malformed fields. Used directly for answers that came back from a batch job.
+    """
+    route = route or model_routing.get_route(task)
+    data = parse_json(raw_text) or {}
+    problems = validate(data, fields)
+    by_path = {f.path: f for f in fields}
+
+    for _ in range(max_reasks):
+        if not problems:
+            break
+
+        async def reask(path, problem):
+            value_schema = {
+                "type": "object", "properties": {"value": by_path[path].schema},
+                "required": ["value"], "additionalProperties": False,
+            }
+            follow_up = messages + [
+                {"role": "assistant", "content": raw_text},
+                reask_message(path, problem, by_path[path].schema),
+            ]
+            reply = await model_routing.achat(
+                task, follow_up, route=route,
+                response_format=response_format(f"{name}_{path.replace('.', '_')}", value_schema), **kwargs
+            )
+            return path, (parse_json(reply.text) or {}).get("value")
+
+        print(f"🔁 {task}: re-asking malformed fields {sorted(problems)}")
+        for path, value in await asyncio.gather(*[reask(p, why) for p, why in problems.items()]):
+            if value is not None:
+                set_path(data, path, value)
+        problems = validate(data, fields)
+
+    if problems:
+        raise StructuredOutputError(problems)
+    return data
+
+
+def generate_structured(task, messages, fields, name, route=None, max_reasks=MAX_REASKS, **kwargs):
+    """Sync wrapper around agenerate_structured for scripts without an event loop."""
+    return asyncio.run(agenerate_structured(task, messages, fields, name, route, max_reasks, **kwargs))
+
+
+def repair_structured(task, messages, raw_text, fields, name, route=None, max_reasks=MAX_REASKS, **kwargs):
+    """Sync wrapper around arepair_structured."""
+    return asyncio.run(arepair_structured(task, messages, raw_text, fields, name, route, max_reasks, **kwargs))
+
+
+# -------------------------------------------------------
+# Section schemas
+# -------------------------------------------------------
+
+EXEC_OBJECTIVE_FIELDS = [
+    # client-specific opening only; Crave's profile is appended from the boilerplate library
+    Field("exec_summary", {"type": "string"}, text_check(min_words=40)),
+    Field("objective.text", {"type": "string"}, text_check(min_words=30)),
+    Field("objective.table", TABLE_SCHEMA, table_check(columns=2)),
+]
+COMMUNICATION_PLAN_FIELDS = [
+    Field("client_name", {"type": "string"}, text_check()),
+    Field("intro", {"type": "string"}, text_check(min_words=20)),
+    Field("daily_interaction", TABLE_SCHEMA, table_check(columns=5, min_rows=3)),
+]
+ICO_APPENDIX_NOTE = "**Interfaces Configuration Objects (ICOs) are listed in the Appendix.**"
+
+
+def render_objective(objective):
+    """Objective markdown (paragraph, table, appendix note) for the tabs and the DOCX template."""
+    return "\n\n".join([objective["text"].strip(), table_to_markdown(objective["table"]), ICO_APPENDIX_NOTE])
+
+
+# -------------------------------------------------------
+# Rendering / streaming helpers
+# -------------------------------------------------------
+
+def table_to_markdown(table):
+    headers, rows = table["headers"], table["rows"]
+    lines = ["| " + " | ".join(headers) + " |", "|" + "|".join("---" for _ in headers) + "|"]
+    lines += ["| " + " | ".join(str(c).replace("|", "/") for c in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def partial_string_field(text, key):
+    """
+    Best-effort value of the top-level string `key` from a JSON object that is
+    still streaming, for live previews. None until the field has started.
+    """
+    marker = f'"{key}"'
+    start = text.find(marker)
+    if start < 0:
+        return None
+    quote = text.find('"', text.find(":", start + len(marker)) + 1)
+    if quote < 0:
+        return None
+    chars, i = [], quote + 1
+    while i < len(text):
+        ch = text[i]
+        if ch == "\\":
+            if i + 1 >= len(text):
+                break
+            chars.append(text[i:i + 2])
+            i += 2
+            continue
+        if ch == '"':
+            break
+        chars.append(ch)
+        i += 1
+    raw = "".join(chars)
+    # a trailing \u escape may still be incomplete
+    if "\\u" in raw[-5:]:
+        raw = raw[:raw.rfind("\\u")]
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw.replace("\\n", "\n")
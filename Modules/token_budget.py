@@ -0,0 +1,157 @@
+"""
+Token budgets for prompts, counted with tiktoken.
+
+A prompt (a string or a chat message list) is built from static instructions plus variable segments
+(the retrieved reference SOW, the RFP text, ...). TokenBudget counts every
+segment, works out how many prompt tokens the deployment allows (context
+window minus the completion reservation, capped by a per-call cost budget)
+and trims segments in priority order until the prompt fits:
+reference text first, then the tail of the RFP.
+
+Token counts of the static parts are cached, since the same instructions
+are encoded on every call.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import tiktoken
+
+
+DEFAULT_ENCODING = "o200k_base"          # gpt-4o family
+SAFETY_MARGIN_TOKENS = 256               # chat formatting overhead + slack
+
+# Per-deployment limits. Prices are USD per 1K tokens.
+DEPLOYMENT_LIMITS = {
+    "Codetest": {"context": 128000, "prompt_price": 0.0025, "completion_price": 0.01, "max_cost": 0.15},
+    "codetest": {"context": 128000, "prompt_price": 0.0025, "completion_price": 0.01, "max_cost": 0.15},
+    "4o": {"context": 128000, "prompt_price": 0.0025, "completion_price": 0.01, "max_cost": 0.15},
+}
+DEFAULT_LIMITS = {"context": 128000, "prompt_price": 0.0025, "completion_price": 0.01, "max_cost": 0.15}
+DEPLOYMENT_ENCODINGS = {}                # deployment -> tiktoken encoding name overrides
+
+
+@dataclass
+class Segment:
+    """A variable part of a prompt. `min_tokens` is kept on the first trimming pass."""
+    name: str
+    text: str
+    min_tokens: int = 0
+
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    return tiktoken.get_encoding(name)
+
+
+@lru_cache(maxsize=512)
+def _count_static(encoding_name, text):
+    return len(_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+def prompt_text(prompt):
+    """Text of a prompt given as a string or as chat messages, for counting."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(message["content"] for message in prompt)
+
+
+class TokenBudget:
+    """Counts tokens and fits prompt segments into a deployment's budget."""
+
+    def __init__(self, deployment, limits=None):
+        self.deployment = deployment
+        self.limits = limits or DEPLOYMENT_LIMITS.get(deployment, DEFAULT_LIMITS)
+        self.encoding_name = DEPLOYMENT_ENCODINGS.get(deployment, DEFAULT_ENCODING)
+        self.encoding = _encoding(self.encoding_name)
+
+    def encode(self, text):
+        return self.encoding.encode(text, disallowed_special=())
+
+    def count(self, text):
+        return len(self.encode(text))
+
+    def count_static(self, text):
+        """Count for text that repeats across calls (instructions, templates); cached."""
+        return _count_static(self.encoding_name, text)
+
+    def prompt_budget(self, max_tokens):
+        """Prompt tokens allowed by the context window and by the per-call cost budget."""
+        context_budget = self.limits["context"] - max_tokens - SAFETY_MARGIN_TOKENS
+        spend_left = self.limits["max_cost"] - max_tokens / 1000 * self.limits["completion_price"]
+        cost_budget = int(spend_left / self.limits["prompt_price"] * 1000)
+        return max(0, min(context_budget, cost_budget))
+
+    def estimate_cost(self, prompt_tokens, completion_tokens):
+        return (
+            prompt_tokens / 1000 * self.limits["prompt_price"]
+            + completion_tokens / 1000 * self.limits["completion_price"]
+        )
+
+    def fit(self, build_prompt, segments, max_tokens):
+        """
+        Build a prompt that fits the budget.
+
+        `build_prompt(**{segment.name: text})` renders the full prompt and
+        `segments` are listed in trim order (first is trimmed first). Each
+        segment is cut from its tail. A first pass keeps every segment's
+        `min_tokens`, a second pass may trim segments further.
+        Returns (prompt, report).
+        """
+        static_tokens = self.count_static(prompt_text(build_prompt(**{seg.name: "" for seg in segments})))
+        budget = self.prompt_budget(max_tokens)
+        tokens = {seg.name: self.encode(seg.text) for seg in segments}
+        original = {name: len(toks) for name, toks in tokens.items()}
+
+        overflow = static_tokens + sum(original.values()) - budget
+        for use_floor in (True, False):
+            for seg in segments:
+                if overflow <= 0:
+                    break
+                floor = seg.min_tokens if use_floor else 0
+                removable = max(0, len(tokens[seg.name]) - floor)
+                cut = min(removable, overflow)
+                if cut:
+                    tokens[seg.name] = tokens[seg.name][:len(tokens[seg.name]) - cut]
+                    overflow -= cut
+
+        texts = {
+            seg.name: seg.text if len(tokens[seg.name]) == original[seg.name]
+            else self.encoding.decode(tokens[seg.name])
+            for seg in segments
+        }
+        prompt = build_prompt(**texts)
+        prompt_tokens = static_tokens + sum(len(t) for t in tokens.values())
+        report = {
+            "deployment": self.deployment,
+            "budget": budget,
+            "static_tokens": static_tokens,
+            "segments": {name: (original[name], len(tokens[name])) for name in original},
+            "prompt_tokens": prompt_tokens,
+            "max_cost_usd": round(self.estimate_cost(prompt_tokens, max_tokens), 4),
+            "trimmed": any(len(tokens[n]) < original[n] for n in original),
+        }
+        if report["trimmed"]:
+            trimmed = ", ".join(f"{n} {a}→{b}" for n, (a, b) in report["segments"].items() if b < a)
+            print(f"✂️ {self.deployment}: prompt trimmed to {budget} tokens ({trimmed})")
+        return prompt, report
+
+
+def fit_prompt(deployment, build_prompt, reference_text, condensed_rfp, max_tokens,
+               reference_min_tokens=1500, rfp_min_tokens=3000, max_cost=None):
+    """
+    Standard policy for the proposal prompts: trim the reference SOW first
+    (keeping its opening as a style exemplar), then the tail of the RFP.
+    `max_cost` overrides the deployment's per-call cost budget (USD).
+    """
+    limits = DEPLOYMENT_LIMITS.get(deployment, DEFAULT_LIMITS)
+    if max_cost is not None:
+        limits = dict(limits, max_cost=max_cost)
+    budget = TokenBudget(deployment, limits)
+    return budget.fit(
+        build_prompt,
+        [
+            Segment("reference_text", reference_text, reference_min_tokens),
+            Segment("condensed_rfp", condensed_rfp, rfp_min_tokens),
+        ],
+        max_tokens,
+    )
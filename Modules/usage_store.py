@@ -0,0 +1,226 @@
+"""
+Usage, latency and cost accounting of every LLM call.
+
+The gateway records each call (including response-cache hits, failures and
+calls cancelled mid-flight, e.g. the loser of a hedged request) in a local
+SQLite file: run id, section, deployment, prompt / cached prompt /
+completion tokens, latency, retries and an estimated cost. The run id and
+section come from labels bound by the caller:
+
+    with usage_labels(run_id=run.run_id):
+        ...                                   # every call in here is attributed to the run
+
+model_routing labels each call with its task (the proposal section), so the
+generators themselves need no changes. The admin page (usage_admin.py) reads
+the per-run and per-day aggregates from here.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+from Modules.token_budget import DEFAULT_LIMITS, DEPLOYMENT_LIMITS
+
+
+USAGE_DB = os.getenv("USAGE_DB", os.path.join(".llm_cache", "usage.sqlite3"))
+USAGE_TRACKING = os.getenv("USAGE_TRACKING", "on").lower() not in {"off", "0", "false"}
+CACHED_PROMPT_DISCOUNT = 0.5         # provider prefix-cache hits are billed at half the prompt price
+BATCH_DISCOUNT = 0.5                 # batch jobs are billed at half the live price
+
+_labels = contextvars.ContextVar("usage_labels", default={})
+
+
+# -------------------------------------------------------
+# Labels
+# -------------------------------------------------------
+
+@contextmanager
+def usage_labels(**labels):
+    """Attribute every LLM call made inside the block (and its tasks) to `labels`."""
+    token = _labels.set({**_labels.get(), **labels})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def set_usage_labels(**labels):
+    """Bind labels for the rest of the current context (e.g. a Streamlit script run)."""
+    _labels.set({**_labels.get(), **labels})
+
+
+def current_labels():
+    return dict(_labels.get())
+
+
+# -------------------------------------------------------
+# Cost
+# -------------------------------------------------------
+
+def estimate_cost(deployment, usage, batch=False):
+    """USD estimate of one call from its token usage and the deployment's prices."""
+    limits = DEPLOYMENT_LIMITS.get(deployment, DEFAULT_LIMITS)
+    prompt = usage.get("prompt_tokens", 0)
+    cached = min(usage.get("cached_tokens", 0), prompt)
+    cost = (
+        (prompt - cached) / 1000 * limits["prompt_price"]
+        + cached / 1000 * limits["prompt_price"] * CACHED_PROMPT_DISCOUNT
+        + usage.get("completion_tokens", 0) / 1000 * limits["completion_price"]
+    )
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+# -------------------------------------------------------
+# Store
+# -------------------------------------------------------
+
+class UsageStore:
+    """SQLite table of LLM calls with the aggregates the admin page shows."""
+
+    def __init__(self, path=USAGE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    run_id TEXT,
+                    section TEXT,
+                    deployment TEXT,
+                    lane TEXT,
+                    status TEXT NOT NULL,
+                    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                    cached_tokens INTEGER NOT NULL DEFAULT 0,
+                    completion_tokens INTEGER NOT NULL DEFAULT 0,
+                    latency REAL,
+                    ttft REAL,
+                    retries INTEGER NOT NULL DEFAULT 0,
+                    response_cached INTEGER NOT NULL DEFAULT 0,
+                    cost_usd REAL NOT NULL DEFAULT 0,
+                    error TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_calls_run ON llm_calls (run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_calls_created ON llm_calls (created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, **row):
+        row.setdefault("created_at", time.time())
+        columns = ", ".join(row)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT INTO llm_calls ({columns}) VALUES ({', '.join('?' for _ in row)})", list(row.values())
+            )
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as conn:
+            return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+    def run_totals(self, limit=50):
+        """Newest runs first, with their tokens, cost and wall-clock span."""
+        return self._query(
+            """
+            SELECT run_id, MIN(created_at) AS started_at, COUNT(*) AS calls,
+                   SUM(status = 'error') AS failures, SUM(status = 'cancelled') AS cancelled,
+                   SUM(response_cached) AS cache_hits,
+                   SUM(prompt_tokens) AS prompt_tokens, SUM(cached_tokens) AS cached_tokens,
+                   SUM(completion_tokens) AS completion_tokens, SUM(retries) AS retries,
+                   MAX(created_at) - MIN(created_at - COALESCE(latency, 0)) AS span_seconds,
+                   SUM(cost_usd) AS cost_usd
+            FROM llm_calls WHERE run_id IS NOT NULL
+            GROUP BY run_id ORDER BY started_at DESC LIMIT ?
+            """,
+            (limit,),
+        )
+
+    def daily_totals(self, days=30):
+        return self._query(
+            """
+            SELECT DATE(created_at, 'unixepoch', 'localtime') AS day, COUNT(*) AS calls,
+                   COUNT(DISTINCT run_id) AS runs, SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(cached_tokens) AS cached_tokens, SUM(completion_tokens) AS completion_tokens,
+                   AVG(latency) AS avg_latency, SUM(cost_usd) AS cost_usd
+            FROM llm_calls WHERE created_at >= ?
+            GROUP BY day ORDER BY day DESC
+            """,
+            (time.time() - days * 86400,),
+        )
+
+    def top_sections(self, limit=10, days=30):
+        """Sections by total cost, with their average cost and latency per call."""
+        return self._query(
+            """
+            SELECT section, deployment, COUNT(*) AS calls, SUM(cost_usd) AS cost_usd,
+                   AVG(cost_usd) AS avg_cost_usd, AVG(latency) AS avg_latency,
+                   AVG(completion_tokens) AS avg_completion_tokens
+            FROM llm_calls WHERE created_at >= ? AND response_cached = 0
+            GROUP BY section, deployment ORDER BY cost_usd DESC LIMIT ?
+            """,
+            (time.time() - days * 86400, limit),
+        )
+
+    def run_calls(self, run_id):
+        return self._query("SELECT * FROM llm_calls WHERE run_id = ? ORDER BY created_at", (run_id,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UsageStore()
+        return _store
+
+
+def record_call(deployment, labels=None, result=None, error=None, lane="interactive", batch=False,
+                cancelled_usage=None):
+    """
+    Record one call from its LLMResult, the LLMError it ended with, or, for a
+    call cancelled after it was sent, the usage estimated from its prompt and
+    the text streamed so far. Never raises.
+    """
+    if not USAGE_TRACKING:
+        return
+    labels = labels or {}
+    row = {"run_id": labels.get("run_id"), "section": labels.get("section"), "deployment": deployment, "lane": lane}
+    if result is not None:
+        # a response-cache hit, or a call that joined an identical in-flight one, sent nothing
+        reused = result.cached or result.shared
+        usage = {} if reused else (result.usage or {})
+        row.update(
+            status="ok",
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            cached_tokens=usage.get("cached_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            latency=result.latency,
+            ttft=result.ttft,
+            retries=max(0, result.attempts - 1),
+            response_cached=int(reused),
+            cost_usd=0.0 if reused else estimate_cost(deployment, usage, batch),
+        )
+    elif cancelled_usage is not None:
+        row.update(
+            status="cancelled",
+            prompt_tokens=cancelled_usage.get("prompt_tokens", 0),
+            completion_tokens=cancelled_usage.get("completion_tokens", 0),
+            cost_usd=estimate_cost(deployment, cancelled_usage, batch),
+        )
+    else:
+        row.update(status="error", retries=max(0, getattr(error, "attempts", 1) - 1), error=str(error))
+    try:
+        get_store().record(**row)
+    except sqlite3.Error as e:
+        print(f"⚠️ Usage store write failed: {e}")
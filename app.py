@@ -7,9 +7,7 @@ from dotenv import load_dotenv
 from PyPDF2 import PdfReader
 import docx
 from docx import Document
-from openai import AzureOpenAI
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_core.documents import Document as LDocument
 from docx.shared import Inches, RGBColor
 from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
@@ -22,6 +20,16 @@ from Modules.prompts import (
     get_resource_schedule_and_commercial_prompt,
     get_communication_plan_prompt
 )
+from Modules.ingestion import extract_text, expand_to_documents, split_reference_sections
+from Modules.knowledge_base import KnowledgeBase, acquire_revision, get_active_revision
+from Modules import llm_gateway, model_routing
+from Modules.token_budget import fit_prompt
+from Modules.condense import condense_rfp
+from Modules.passages import route_rfp
+from Modules.structured import (
+    COMMUNICATION_PLAN_FIELDS, EXEC_OBJECTIVE_FIELDS, generate_structured, render_objective,
+)
+from Modules.boilerplate import library_version, render_communication_plan, render_exec_summary
 
 
 
@@ -110,23 +118,12 @@ div.stButton > button:hover {
 # 2. UTILITIES
 # -------------------------------------------------------
 
-def extract_text(file):
-    """Extract text from PDF or DOCX"""
-    if file.name.endswith(".pdf"):
-        reader = PdfReader(file)
-        return "\n".join([p.extract_text() or "" for p in reader.pages])
-    elif file.name.endswith(".docx"):
-        doc = docx.Document(file)
-        return "\n".join([p.text for p in doc.paragraphs])
-    return ""
-
-
 from pinecone import Pinecone, ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
 from langchain_community.embeddings import HuggingFaceEmbeddings
 import os
 
-def build_knowledge_base(folder="Knowledge_Repo"):
+def build_knowledge_base(folder=KNOWLEDGE_FOLDER):
     embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
@@ -143,25 +140,18 @@ def build_knowledge_base(folder="Knowledge_Repo"):
 
     index = pc.Index(index_name)
 
-    vector_store = PineconeVectorStore(index=index, embedding=embedding_model)
+    knowledge_base = KnowledgeBase(index, embedding_model)
 
-    # --- Upload documents if index is empty ---
+    # --- Build a new revision when the reference folder changed ---
+    # Readers keep using the active revision until the new one passes its smoke test.
     stats = pc.describe_index(index_name)
     if stats.get("status", {}).get("ready", False):
-        # Load local RFP references
-        docs = []
-        for file in os.listdir(folder):
-            if file.endswith((".pdf", ".docx")):
-                path = os.path.join(folder, file)
-                text = extract_text(open(path, "rb"))
-                if text.strip():
-                    docs.append(LDocument(page_content=text, metadata={"source": file}))
+        try:
+            knowledge_base.rebuild(folder)
+        except Exception as e:
+            print(f"⚠️ Knowledge-base rebuild failed, keeping revision {get_active_revision()}: {e}")
 
-        if docs:
-            vector_store.add_documents(docs)
-            print(f"✅ Uploaded {len(docs)} docs to Pinecone index '{index_name}'")
-
-    return vector_store
+    return knowledge_base
 
 
 
@@ -340,94 +330,62 @@ def insert_executive_summary_into_template(
 
 def generate_exec_summary_and_objective(reference_text, condensed_rfp, num_interfaces=113):
     # ... (function body remains the same)
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
+    # --- Prevent input overflow (token budget: reference trimmed first, then RFP tail) ---
+    route = model_routing.get_route("exec_summary")
+    messages, _ = fit_prompt(
+        route.deployment,
+        lambda reference_text, condensed_rfp: get_executive_summary_and_objective_prompt(
+            reference_text, condensed_rfp, num_interfaces
+        ),
+        reference_text, condensed_rfp, route.max_tokens,
+        max_cost=route.max_cost_usd,
     )
 
-    prompt = get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces)
-
-        # --- Prevent input overflow ---
-    if len(reference_text) > 8000:
-        reference_text = reference_text[:8000]
-    if len(condensed_rfp) > 8000:
-        condensed_rfp = condensed_rfp[:8000]
-
-
-    response = client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    full_output = response.choices[0].message.content.strip()
-
-    # --- Split into Executive Summary and Objective ---
-    exec_match = re.search(r"\*\*?Executive Summary\*\*?\s*(.*?)\s*(?=\*\*?Objective\*\*?)", full_output, re.S | re.I)
-    obj_match = re.search(r"\*\*?Objective\*\*?\s*(.*)", full_output, re.S | re.I)
-
-    exec_text = exec_match.group(1).strip() if exec_match else full_output
-    obj_text = obj_match.group(1).strip() if obj_match else ""
+    # --- One JSON object (exec_summary, objective text + table); malformed fields are re-asked ---
+    data, _ = generate_structured("exec_summary", messages, EXEC_OBJECTIVE_FIELDS, "exec_summary_objective", route=route)
 
-    return exec_text, obj_text
+    return render_exec_summary(data["exec_summary"]), render_objective(data["objective"])
 
 def generate_scope_sections(reference_text, condensed_rfp, num_interfaces=None):
     # ... (function body remains the same)
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
+    route = model_routing.get_route("scope")
+    messages, _ = fit_prompt(
+        route.deployment,
+        lambda reference_text, condensed_rfp: get_scope_prereq_assumptions_prompt(
+            reference_text, condensed_rfp, num_interfaces
+        ),
+        reference_text, condensed_rfp, route.max_tokens,
+        max_cost=route.max_cost_usd,
     )
 
-    prompt = get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_interfaces)
+    result = model_routing.chat("scope", messages, route=route)
 
-    response = client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=1200,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    return response.choices[0].message.content.strip()
+    return result.text
 
 def generate_resource_schedule_and_commercial(reference_text, condensed_rfp):
     # ... (function body remains the same)
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
+    route = model_routing.get_route("resource_schedule")
+    messages, _ = fit_prompt(
+        route.deployment, get_resource_schedule_and_commercial_prompt, reference_text, condensed_rfp, route.max_tokens,
+        max_cost=route.max_cost_usd,
     )
 
-    prompt = get_resource_schedule_and_commercial_prompt(reference_text, condensed_rfp)
+    result = model_routing.chat("resource_schedule", messages, route=route)
 
-    response = client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    return response.choices[0].message.content.strip()
+    return result.text
 
 def generate_communication_plan(reference_text, condensed_rfp):
     # ... (function body remains the same)
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
-
-    prompt = get_communication_plan_prompt(reference_text, condensed_rfp)
-    response = client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2500,
-        messages=[{"role": "user", "content": prompt}]
+    route = model_routing.get_route("communication_plan")
+    messages, _ = fit_prompt(
+        route.deployment, get_communication_plan_prompt, reference_text, condensed_rfp, route.max_tokens,
+        max_cost=route.max_cost_usd,
     )
+    # --- Client-specific intro and interaction table; the escalation procedure comes from the boilerplate library ---
+    data, _ = generate_structured("communication_plan", messages, COMMUNICATION_PLAN_FIELDS, "communication_plan",
+                                  route=route)
 
-    return response.choices[0].message.content.strip()
+    return render_communication_plan(data)
 
 
 # -------------------------------------------------------
@@ -454,6 +412,12 @@ st.markdown("---")
 st.markdown("### ⚙️ Proposal Configuration")
 
 
+quick_draft = st.checkbox(
+    "⚡ Quick draft (condense the RFP locally, no extra LLM calls)",
+    help="Ranks RFP sentences with TextRank instead of summarizing them with the model."
+)
+
+
 # --- Conditional Logic ---
 if uploaded_file:
 
@@ -514,35 +478,51 @@ if uploaded_file:
                 # STEP 2: Build or load knowledge base & Retrieve context
                 st.write("2/6 📚 Loading knowledge base and retrieving reference documents...")
                 knowledge_db = build_knowledge_base()
-                retriever = knowledge_db.as_retriever(search_kwargs={"k": 1})
-                ref_docs = retriever.invoke(rfp_text)
-                reference_text = "\n\n".join([d.page_content for d in ref_docs])
+                with acquire_revision() as revision:
+                    retriever = knowledge_db.router(revision)
+                    ref_docs = expand_to_documents(retriever, retriever.similarity_search(rfp_text, k=1))
+                reference_text = "\n\n".join(ref_docs)
+                if retriever.failovers:
+                    st.warning(f"⚠️ Knowledge base was slow or unreachable — answered from the local replica ({retriever.failovers[0]}).")
                 st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference documents!")
+
+                # Condense the RFP once; every section prompt reuses the brief
+                st.write("🧾 Condensing RFP into a proposal brief...")
+                try:
+                    condensed_rfp = condense_rfp(rfp_text, mode="extractive" if quick_draft else None)
+                except llm_gateway.LLMError as e:
+                    st.warning(f"⚠️ RFP condensation failed, using the full RFP text: {e}")
+                    condensed_rfp = rfp_text
+                st.success(f"✅ RFP condensed ({len(rfp_text):,} → {len(condensed_rfp):,} characters)")
+                # Each section prompt gets only the passages of the brief routed to it
+                section_rfp = route_rfp(condensed_rfp)
+                # ... and only the matching part of the reference SOW as its exemplar
+                reference_sections = split_reference_sections(reference_text)
                 status.update(label="🚀 Generating Proposal Sections... (40% Complete)", state="running")
 
 
                 
                 # STEP 3: Generate Core Sections
                 st.write("3/6 ✍️ Generating Executive Summary and Objective...")
-                exec_summary, objective = generate_exec_summary_and_objective(reference_text, rfp_text, num_interfaces)
+                exec_summary, objective = generate_exec_summary_and_objective(reference_sections["exec_summary"], section_rfp["exec_summary"], num_interfaces)
                 st.success("3/6 ✅ Executive Summary & Objective generated.")
                 status.update(label="🚀 Generating Proposal Sections... (60% Complete)", state="running")
 
                 # STEP 4: Generate Scope Sections
                 st.write("4/6 🧩 Generating Scope, Assumptions, and Prerequisites...")
-                scope_text = generate_scope_sections(reference_text, rfp_text, num_interfaces)
+                scope_text = generate_scope_sections(reference_sections["scope"], section_rfp["scope"], num_interfaces)
                 st.success("4/6 ✅ Scope and Assumptions section generated.")
                 status.update(label="🚀 Generating Proposal Sections... (75% Complete)", state="running")
                 
                 # STEP 5: Resource Schedule & Commercials
                 st.write("5/6 📊 Generating Resource Schedule and Commercials...")
-                resource_schedule_text = generate_resource_schedule_and_commercial(reference_text, rfp_text)
+                resource_schedule_text = generate_resource_schedule_and_commercial(reference_sections["resource_schedule"], section_rfp["resource_schedule"])
                 st.success("5/6 ✅ Resource Schedule and Commercials generated.")
                 status.update(label="🚀 Generating Proposal Sections... (85% Complete)", state="running")
 
                 # STEP 6: Communication Plan
                 st.write("6/6 📢 Generating Communication Plan...")
-                communication_plan_text = generate_communication_plan(reference_text, rfp_text)
+                communication_plan_text = generate_communication_plan(reference_sections["communication_plan"], section_rfp["communication_plan"])
                 st.success("6/6 ✅ Communication Plan generated.")
                 status.update(label="✅ Proposal Content Complete!", state="complete", expanded=False)
 
@@ -579,6 +559,8 @@ if uploaded_file:
                     resource_schedule_text=resource_schedule_text,
                     communication_plan_text=communication_plan_text
                 )
+                # trace the document back to the boilerplate text it was rendered with
+                final_doc.core_properties.comments = f"Boilerplate library {library_version()}"
 
                 buffer = BytesIO()
                 final_doc.save(buffer)
@@ -0,0 +1,212 @@
+"""
+Bulk proposal generation through the offline batch endpoint.
+
+    python batch_proposals.py RFPs/*.pdf --out Generated/            # submit, wait, render
+    python batch_proposals.py --resume batch-20250101T120000-ab12cd  # after a restart
+    LLM_BATCH_BACKEND=local LLM_BACKEND=fake python batch_proposals.py RFPs/*.pdf   # offline dry run
+
+Each RFP is prepared like an interactive run (extraction, reference retrieval
+split by section, condensed brief routed to the sections) under its own run id; its four section prompts become batch
+lines "<run id>::<section>". When the job completes, every answer goes through
+the same post-processing as the live path (malformed JSON fields of the
+executive summary and communication plan re-asked, boilerplate blocks
+appended, truncated answers continued) and is checkpointed
+in the run, then the DOCX is rendered from the normal template.
+"""
+import argparse
+import dataclasses
+import os
+
+from Modules import model_routing
+from Modules.batch import (
+    batch_results, get_backend, load_job, load_requests, poll_batch, request_line, submit_batch,
+)
+from Modules.checkpoints import RunCheckpoint, new_run_id
+from Modules.condense import CONDENSE_MODE, condense_rfp
+from Modules.ingestion import extract_pages, split_reference_sections
+from Modules.knowledge_base import open_knowledge_base
+from Modules.page_index import PAGES_ARTIFACT, build_page_index
+from Modules.passages import RFPPassages, route_rfp
+from Modules.proposal_memory import FINGERPRINT_ARTIFACT, build_fingerprint, reuse_settings
+from Modules.usage_store import record_call, usage_labels
+from Modules.boilerplate import library_version, render_communication_plan, render_exec_summary
+from Modules.structured import (
+    COMMUNICATION_PLAN_FIELDS, EXEC_OBJECTIVE_FIELDS, build_schema, render_objective, repair_structured,
+    response_format,
+)
+from Modules.proposal_docx import insert_executive_summary_into_template
+from Modules.sections import (
+    SECTION_KEYS, build_section_messages, detect_interface_count, load_section, retrieve_reference,
+)
+
+
+TEMPLATE_PATH = "Template/PIPO TO IS Response Template.docx"
+OUTPUT_DIR = "Generated"
+# sections answered as JSON: key -> (fields, schema name, render(data))
+STRUCTURED_SECTIONS = {
+    "exec_summary": (
+        EXEC_OBJECTIVE_FIELDS, "exec_summary_objective",
+        lambda data: (render_exec_summary(data["exec_summary"]), render_objective(data["objective"])),
+    ),
+    "communication_plan": (COMMUNICATION_PLAN_FIELDS, "communication_plan", render_communication_plan),
+}
+
+
+def prepare_rfp(path, knowledge_db, quick=False):
+    """Run id and section messages of one RFP; the shared context is stored as a run artifact."""
+    run = RunCheckpoint(new_run_id())
+    with open(path, "rb") as f:
+        pages = extract_pages(f)
+    rfp_text = "\n".join(pages).replace(",", "")
+    num_interfaces, _ = detect_interface_count(rfp_text)
+    reference_text, ref_docs, _ = retrieve_reference(knowledge_db, rfp_text)
+    condense_mode = "extractive" if quick else CONDENSE_MODE
+    with usage_labels(run_id=run.run_id):
+        condensed_rfp = condense_rfp(rfp_text, mode=condense_mode)
+    brief_passages = RFPPassages(condensed_rfp)
+    section_rfp = route_rfp(condensed_rfp, brief_passages)
+    reference_sections = split_reference_sections(reference_text)
+
+    run.save_artifact("context", {
+        "reference_text": reference_text,
+        "reference_sections": reference_sections,
+        "condensed_rfp": condensed_rfp,
+        "section_rfp": section_rfp,
+        "reference_documents": len(ref_docs),
+        "num_interfaces": num_interfaces,
+        "boilerplate_version": library_version(),
+        "rfp_path": path,
+    })
+    settings = reuse_settings(reference_text, condense_mode, library_version())
+    run.save_artifact(PAGES_ARTIFACT, build_page_index(pages, settings, num_interfaces))
+    run.save_artifact(FINGERPRINT_ARTIFACT, build_fingerprint(
+        condensed_rfp, settings, num_interfaces, passages=brief_passages
+    ))
+    messages = {
+        key: build_section_messages(
+            key, model_routing.get_route(key), reference_sections[key], section_rfp[key], num_interfaces
+        )
+        for key in SECTION_KEYS
+    }
+    return run.run_id, messages
+
+
+def section_lines(run_id, messages):
+    lines = []
+    for key, section_messages in messages.items():
+        route = model_routing.get_route(key)
+        params = route.params()
+        if key in STRUCTURED_SECTIONS:
+            fields, name, _ = STRUCTURED_SECTIONS[key]
+            params["response_format"] = response_format(name, build_schema(fields))
+        deployment = route.batch_deployment or route.deployment
+        lines.append(request_line(f"{run_id}::{key}", deployment, section_messages, **params))
+    return lines
+
+
+def finish_section(run, key, messages, result):
+    """Post-process one batch answer like the live generators do and checkpoint it."""
+    route = model_routing.get_route(key)
+    deployment = result.deployment
+    if deployment == route.batch_deployment:
+        # a Global Batch deployment takes no live calls; continue on the route's own deployment
+        result = dataclasses.replace(result, deployment=route.deployment)
+    result = model_routing.continue_truncated(key, messages, result, route=route, lane="batch")
+    if key in STRUCTURED_SECTIONS:
+        fields, name, render = STRUCTURED_SECTIONS[key]
+        section = render(repair_structured(key, messages, result.text, fields, name, route=route, lane="batch"))
+    else:
+        section = result.text
+    run.save(key, section, batch=True, deployment=deployment, usage=result.usage)
+    return section
+
+
+def render_proposal(run, output_dir=OUTPUT_DIR):
+    sections = {key: load_section(run, key) for key in SECTION_KEYS}
+    if any(section is None for section in sections.values()):
+        return None
+    exec_summary, objective = sections["exec_summary"]
+    document = insert_executive_summary_into_template(
+        TEMPLATE_PATH,
+        summary_text=exec_summary,
+        objective_text=objective,
+        scope_text=sections["scope"],
+        resource_schedule_text=sections["resource_schedule"],
+        communication_plan_text=sections["communication_plan"],
+    )
+    name = os.path.splitext(os.path.basename(run.load_artifact("context")["rfp_path"]))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"RFP_Response_{name}.docx")
+    document.save(path)
+    return path
+
+
+def collect(job, output_dir=OUTPUT_DIR):
+    """Wait for `job`, checkpoint every section and render the finished proposals."""
+    output = poll_batch(job, get_backend(job["backend"]))
+    results = batch_results(output, load_requests(job))
+
+    for run_id in job["runs"]:
+        run = RunCheckpoint(run_id)
+        context = run.load_artifact("context")
+        section_rfp = context.get("section_rfp") or route_rfp(context["condensed_rfp"])
+        reference_sections = context.get("reference_sections") or split_reference_sections(context["reference_text"])
+        for key in SECTION_KEYS:
+            result = results.get(f"{run_id}::{key}")
+            if result is None:
+                run.fail(key, "missing from batch output")
+                continue
+            messages = build_section_messages(
+                key, model_routing.get_route(key), reference_sections[key], section_rfp[key],
+                context["num_interfaces"],
+            )
+            labels = {"run_id": run_id, "section": key}
+            if isinstance(result, Exception):
+                # the local stand-in went through the gateway, which recorded its calls already
+                if job["backend"] == "azure":
+                    record_call(result.deployment, labels, error=result, lane="batch", batch=True)
+                run.fail(key, result)
+                print(f"⚠️ {run_id}::{key} failed: {result}")
+                continue
+            if job["backend"] == "azure":
+                record_call(result.deployment, labels, result, lane="batch", batch=True)
+            try:
+                with usage_labels(run_id=run_id):
+                    finish_section(run, key, messages, result)
+            except Exception as e:
+                run.fail(key, e)
+                print(f"⚠️ {run_id}::{key} failed: {e}")
+
+        path = render_proposal(run, output_dir)
+        if path:
+            print(f"📄 {context['rfp_path']} → {path}")
+        else:
+            print(f"⚠️ {context['rfp_path']}: sections failed, see run {run_id} ({run.failed(SECTION_KEYS)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate proposals for many RFPs through the batch endpoint.")
+    parser.add_argument("rfps", nargs="*", help="RFP files (PDF or DOCX)")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="folder for the generated DOCX files")
+    parser.add_argument("--quick", action="store_true", help="condense RFPs locally (no LLM calls before the batch)")
+    parser.add_argument("--resume", metavar="JOB_ID", help="collect a job submitted earlier")
+    args = parser.parse_args()
+
+    if args.resume:
+        job = load_job(args.resume)
+    else:
+        if not args.rfps:
+            parser.error("give RFP files or --resume JOB_ID")
+        knowledge_db = open_knowledge_base()
+        runs, lines = {}, []
+        for path in args.rfps:
+            print(f"🔎 Preparing {path}...")
+            run_id, messages = prepare_rfp(path, knowledge_db, quick=args.quick)
+            runs[run_id] = path
+            lines += section_lines(run_id, messages)
+        job = submit_batch(lines, runs=runs)
+    collect(job, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -457,8 +457,10 @@ import io
 import os
 from pptx import Presentation
 from docx import Document
-from openai import AzureOpenAI
 from dotenv import load_dotenv
+from Modules import llm_gateway, model_routing
+from Modules.checkpoints import new_run_id
+from Modules.usage_store import usage_labels
 
 
 # --- Load your .env file safely ---
@@ -486,17 +488,10 @@ load_dotenv()
 # Helper Functions
 # ============================================================
 
-def call_llm(prompt, client, model_name):
-    """Call Azure OpenAI model."""
-    try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.4
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        return f"Error: {e}"
+def call_llm(prompt, task="coreassess_sow"):
+    """Call the Azure OpenAI deployment routed for `task` (config/model_routes.json). Raises LLMError on failure."""
+    result = model_routing.chat(task, llm_gateway.user_message(prompt))
+    return result.text
 
 
 
@@ -627,7 +622,7 @@ def insert_annexure_table(doc, placeholder, df):
 # Core Function
 # ============================================================
 
-def generate_sow(df, client, model_name, client_name=None, repo_dir="Knowledge_Repo/Coreassess_KR"):
+def generate_sow(df, client_name=None, repo_dir="Knowledge_Repo/Coreassess_KR"):
     """Generate full SOW docx directly."""
     client_ref = client_name if client_name else "the Client"
 
@@ -732,7 +727,12 @@ def generate_sow(df, client, model_name, client_name=None, repo_dir="Knowledge_R
 
     # Get LLM result
     # --- Split SOW by numbered headings like "1. Executive Summary" ---
-    full_sow = call_llm(prompt, client, model_name)
+    try:
+        with usage_labels(run_id=new_run_id()):
+            full_sow = call_llm(prompt)
+    except llm_gateway.LLMError as e:
+        st.error(f"⚠️ SOW generation failed, nothing was written to the document: {e}")
+        return
 
 
     # --- Use Template ---
@@ -981,13 +981,5 @@ def main():
         st.success(f"✅ File `{uploaded.name}` loaded successfully!")
         st.dataframe(df.head(5))
 
-        # Azure OpenAI setup
-        client = AzureOpenAI(
-            azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-            api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-            api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-        )
-        model_name = "codetest"
-
         if st.button("⚡ Generate SOW Document"):
-            generate_sow(df, client, model_name, client_name)
\ No newline at end of file
+            generate_sow(df, client_name)
\ No newline at end of file
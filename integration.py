@@ -1,31 +1,33 @@
 import streamlit as st
 import os
 import time
-import re
 from io import BytesIO
 from dotenv import load_dotenv
 from PyPDF2 import PdfReader
 import docx
 from docx import Document
-from openai import AzureOpenAI
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_core.documents import Document as LDocument
-from docx.shared import Inches, RGBColor
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_ALIGN_VERTICAL
-from Modules.prompts import (
-    get_executive_summary_and_objective_prompt,
-    get_scope_prereq_assumptions_prompt,
-    get_resource_schedule_and_commercial_prompt,
-    get_communication_plan_prompt
+from Modules.ingestion import extract_pages, split_reference_sections
+from Modules.knowledge_base import KNOWLEDGE_FOLDER, open_knowledge_base
+from Modules import llm_gateway, model_routing
+from Modules.sections import (
+    SECTION_KEYS, SECTION_LABELS, build_section_messages, detect_interface_count, load_section, retrieve_reference,
 )
+from Modules.proposal_docx import insert_executive_summary_into_template
+from Modules.condense import CONDENSE_MODE, condense_rfp
+from Modules.hedging import hedge_stats
+from Modules.checkpoints import RunCheckpoint, cleanup_runs, new_run_id
+from Modules.usage_store import set_usage_labels
+from Modules.proposal_memory import FINGERPRINT_ARTIFACT, build_fingerprint, reuse_from_similar, reuse_settings
+from Modules.page_index import PAGES_ARTIFACT, build_page_index, reuse_previous_version
+from Modules.passages import RFPPassages, route_rfp
+from Modules.structured import (
+    COMMUNICATION_PLAN_FIELDS, EXEC_OBJECTIVE_FIELDS, agenerate_structured, partial_string_field, render_objective,
+)
+from Modules.boilerplate import library_version, render_communication_plan, render_exec_summary
 import asyncio
 import concurrent.futures
 import aiohttp
-from openai import AsyncAzureOpenAI
 
 
 
@@ -33,21 +35,8 @@ from openai import AsyncAzureOpenAI
 # 1. SETUP
 # -------------------------------------------------------
 load_dotenv()
-KNOWLEDGE_FOLDER = "Knowledge_Repo"
 PERSIST_DIR = "chroma_db"
 
-# ---- Shared Async Azure Client + Caching ----
-@st.cache_resource
-def get_azure_client():
-    """Create and cache Async Azure OpenAI client"""
-    return AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
-
-async_client = get_azure_client()
-
 
 st.set_page_config(page_title="RFP Proposal AI Generator", layout="wide")
 
@@ -127,323 +116,152 @@ div.stButton > button:hover {
 # 2. UTILITIES
 # -------------------------------------------------------
 
-def extract_text(file):
-    """Extract text from PDF or DOCX"""
-    if file.name.endswith(".pdf"):
-        reader = PdfReader(file)
-        return "\n".join([p.extract_text() or "" for p in reader.pages])
-    elif file.name.endswith(".docx"):
-        doc = docx.Document(file)
-        return "\n".join([p.text for p in doc.paragraphs])
-    return ""
-
-
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import os
-
 @st.cache_resource
-def build_knowledge_base(folder="Knowledge_Repo"):
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-    index_name = "response-generator"
-
-    # Create index if it doesn't exist
-    if index_name not in [idx["name"] for idx in pc.list_indexes()]:
-        pc.create_index(
-            name=index_name,
-            dimension=384,  # ✅ MiniLM-L6-v2 has 384 dims (not 1024)
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-
-    index = pc.Index(index_name)
-
-    vector_store = PineconeVectorStore(index=index, embedding=embedding_model)
-
-    # --- Upload documents if index is empty ---
-    stats = pc.describe_index(index_name)
-    if stats.get("status", {}).get("ready", False):
-        # Load local RFP references
-        docs = []
-        for file in os.listdir(folder):
-            if file.endswith((".pdf", ".docx")):
-                path = os.path.join(folder, file)
-                text = extract_text(open(path, "rb"))
-                if text.strip():
-                    docs.append(LDocument(page_content=text, metadata={"source": file}))
-
-        if docs:
-            vector_store.add_documents(docs)
-            print(f"✅ Uploaded {len(docs)} docs to Pinecone index '{index_name}'")
-
-    return vector_store
-
-
-
-def apply_bullet_to_para(paragraph, list_id='1'):
-    """
-    Applies a dot bullet style (list level 0) using its XML structure.
-    Uses numId='1' which is often the default bullet style in templates.
-    """
-    pPr = paragraph._element.get_or_add_pPr()
-    numPr = OxmlElement('w:numPr')
-    
-    # Set the list level (0 is the main level)
-    ilvl = OxmlElement('w:ilvl')
-    ilvl.set(qn('w:val'), '0')
-    
-    # Set the list ID (Most default templates use ID '1' for the first bullet definition)
-    numId = OxmlElement('w:numId')
-    numId.set(qn('w:val'), list_id)
-    
-    numPr.append(ilvl)
-    numPr.append(numId)
-    pPr.append(numPr)
-
-
-def insert_executive_summary_into_template(
-    template_path,
-    summary_text,
-    objective_text=None,
-    scope_text=None,
-    resource_schedule_text=None,
-    communication_plan_text=None,
-):
-    """
-    Replace placeholders in the template:
-    <<EXEC_SUMMARY>>, <<OBJECTIVE>>, <<SCOPE_TEXT>>, <<RESOURCE_SCHEDULE>>, <<COMMUNICATION_PLAN>>
-    Now includes robust bullet point handling.
-    """
-
-    doc = Document(template_path)
-
-    def set_cell_shading(cell, fill_color):
-        """Add shading (background color) to a table cell."""
-        tc_pr = cell._element.tcPr
-        shd = OxmlElement("w:shd")
-        shd.set(qn("w:val"), "clear")
-        shd.set(qn("w:color"), "auto")
-        shd.set(qn("w:fill"), fill_color)
-        tc_pr.append(shd)
-
-    def set_table_border_white(table, cell_margin=150):
-        """Set all table borders to white (for clean, minimal look)."""
-        tbl = table._element
-        tbl_pr = tbl.tblPr
-        tbl_borders = OxmlElement("w:tblBorders")
-
-        for border_name in ["top", "left", "bottom", "right", "insideH", "insideV"]:
-            border_el = OxmlElement(f"w:{border_name}")
-            border_el.set(qn("w:val"), "single")
-            border_el.set(qn("w:sz"), "4")  # thin border
-            border_el.set(qn("w:space"), "0")
-            border_el.set(qn("w:color"), "FFFFFF")  # white
-            tbl_borders.append(border_el)
-
-        tbl_pr.append(tbl_borders)
-
-
-    def insert_styled_table(parent, headers, rows):
-        """Create a table styled similar to RFP objective section."""
-        table = parent.add_table(rows=len(rows) + 1, cols=len(headers))
-        table.style = "Table Grid"
-        table.autofit = True
-
-        # Header row styling
-        hdr_cells = table.rows[0].cells
-        for i, h in enumerate(headers):
-            hdr_cells[i].text = h.strip()
-            set_cell_shading(hdr_cells[i], "008FD3")  # blue header
-            for run in hdr_cells[i].paragraphs[0].runs:
-                run.font.bold = True
-                run.font.color.rgb = RGBColor(255, 255, 255)
-            hdr_cells[i].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.LEFT
-            hdr_cells[i].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-
-        # Data rows
-        for r, row_data in enumerate(rows):
-            cells = table.rows[r + 1].cells
-            for c, val in enumerate(row_data):
-                cells[c].text = str(val).strip()
-                set_cell_shading(cells[c], "E7EEF7")  # light gray row
-                cells[c].vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-                cells[c].paragraphs[0].alignment = (
-                    WD_ALIGN_PARAGRAPH.LEFT if c == 0 else WD_ALIGN_PARAGRAPH.LEFT
-                )
-
-        # Set uniform width
-        for row in table.rows:
-            for cell in row.cells:
-                cell.width = Inches(3)
-
-        # Apply white borders
-        set_table_border_white(table)
-
-        return table
-
-    def replace_placeholder(doc, placeholder, new_text):
-        if not new_text:
-            return
-
-        for para in doc.paragraphs:
-            if placeholder in "".join(run.text for run in para.runs):
-                parent = para._element.getparent()
-                idx = parent.index(para._element)
-                parent.remove(para._element)
-
-                lines = [line.strip() for line in new_text.split("\n") if line.strip()]
-                new_elements = []  # collect to insert once
-
-                i = 0
-                while i < len(lines):
-                    line = lines[i]
-
-                    # Markdown-style table
-                    if line.startswith("|") and "|" in line:
-                        table_lines = []
-                        while i < len(lines) and lines[i].startswith("|"):
-                            table_lines.append(lines[i])
-                            i += 1
-                        headers = [h.strip("* ") for h in table_lines[0].strip("|").split("|")]
-                        rows = [
-                            [c.strip() for c in r.strip("|").split("|")]
-                            for r in table_lines[2:]
-                        ]
-                        table = insert_styled_table(doc, headers, rows)
-                        new_elements.append(table._element)
-                        continue
-
-                    # Section heading
-                    if line.startswith("**") or line.startswith("###"):
-                        header_text = line.strip("*# ").rstrip(":")
-                        new_para = doc.add_paragraph(header_text)
-                        new_para.style = "Table Column Heading"
-                        new_para.paragraph_format.space_after = Pt(4)
-                        new_elements.append(new_para._element)
-                        i += 1
-                        continue
-
-                    # Markdown bullets (FIXED: Use apply_bullet_to_para for robustness)
-                    if line.startswith("- ") or line.startswith("• "):
-                        bullet_text = line[2:].strip() if line.startswith("- ") else line[1:].strip()
-                        new_para = doc.add_paragraph(bullet_text, style="List Bullet 2")
-                        new_para.paragraph_format.left_indent = Pt(18)
-                        new_para.paragraph_format.space_after = Pt(2)
-                        new_elements.append(new_para._element)
-                        i += 1
-                        continue
-
-                    # Regular text
-                    new_para = doc.add_paragraph(line)
-                    new_elements.append(new_para._element)
-                    i += 1
-
-                # ⚡️ Insert all new elements once
-                for element in reversed(new_elements):
-                    parent.insert(idx, element)
-                return
-
-    # Replace placeholders with sections
-    replace_placeholder(doc, "<<EXEC_SUMMARY>>", summary_text)
-    replace_placeholder(doc, "<<OBJECTIVE>>", objective_text)
-    replace_placeholder(doc, "<<SCOPE_TEXT>>", scope_text)
-    replace_placeholder(doc, "<<RESOURCE_SCHEDULE>>", resource_schedule_text)
-    replace_placeholder(doc, "<<COMMUNICATION_PLAN>>", communication_plan_text)
-
-    return doc
-
-
-
-async def async_generate_exec_summary_and_objective(reference_text, condensed_rfp, num_interfaces=113):
-    # client = AsyncAzureOpenAI(
-    #     azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-    #     api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-    #     api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    # )
-    client = async_client
-
-
-    prompt = get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces)
-
-    response = await client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
+def build_knowledge_base(folder=KNOWLEDGE_FOLDER):
+    return open_knowledge_base(folder)
+
+
+# Followers wait (at most this long) for the lead call's first token, so the shared
+# system prefix is already in the provider's prompt cache when they are sent. 0 disables.
+PREFIX_WARMUP_SECONDS = float(os.getenv("PREFIX_WARMUP_SECONDS", "20"))
+
+
+class PrefixWarmup:
+    """Sends one call first and releases calls sharing its prompt prefix once it is prefilled."""
+
+    def __init__(self, timeout=PREFIX_WARMUP_SECONDS):
+        self.timeout = timeout
+        self.ready = asyncio.Event()
+
+    def lead_callback(self, on_text):
+        def callback(text):
+            self.ready.set()
+            on_text(text)
+        return callback
+
+    async def lead(self, coro):
+        try:
+            return await coro
+        finally:
+            self.ready.set()
+
+    async def follow(self, coro):
+        if self.timeout > 0:
+            try:
+                await asyncio.wait_for(self.ready.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                pass
+        return await coro
+
+
+def stream_to(placeholder, min_interval=0.15):
+    """Callback that renders partial text into a Streamlit placeholder, throttled to `min_interval` seconds."""
+    last_render = [0.0]
+
+    def on_text(text):
+        now = time.perf_counter()
+        if now - last_render[0] >= min_interval:
+            last_render[0] = now
+            placeholder.markdown(text + " ▌")
+
+    return on_text
+
+
+def record_stream_metrics(metrics, result):
+    """Copy time-to-first-token and generation rate of an LLMResult into `metrics`."""
+    if metrics is None:
+        return
+    metrics.update(
+        ttft=result.ttft,
+        tokens_per_sec=result.tokens_per_sec,
+        latency=result.latency,
+        prompt_tokens=result.usage.get("prompt_tokens", 0),
+        cached_prompt_tokens=result.usage.get("cached_tokens", 0),
+        completion_tokens=result.usage.get("completion_tokens", 0),
+        cached=result.cached,
     )
 
-    full_output = response.choices[0].message.content.strip()
-
-    # Safer regex split
-    exec_text = ""
-    obj_text = ""
-
-    match_exec = re.search(r"(?i)\*\*?Executive Summary\*\*?\s*([\s\S]*?)(?=\*\*?Objective\*\*?)", full_output)
-    if match_exec:
-        exec_text = match_exec.group(1).strip()
 
-    match_obj = re.search(r"(?i)\*\*?Objective\*\*?\s*(.*)", full_output, re.S)
-    if match_obj:
-        obj_text = match_obj.group(1).strip()
-
-    # fallback
-    if not exec_text:
-        exec_text = full_output[:len(full_output)//2]
-    if not obj_text:
-        obj_text = full_output[len(full_output)//2:]
-
-    return exec_text, obj_text
-
-
-async def async_generate_scope_sections(reference_text, condensed_rfp, num_interfaces=None):
-    # client = AsyncAzureOpenAI(
-    #     azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-    #     api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-    #     api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    # )
-    client = async_client
-
-    prompt = get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_interfaces)
-    response = await client.chat.completions.create(
-        model="Codetest", temperature=0.3, max_tokens=1200,
-        messages=[{"role": "user", "content": prompt}]
+def format_stream_metrics(metrics):
+    if not metrics:
+        return ""
+    if metrics.get("cached"):
+        return "(served from cache)"
+    parts = []
+    if metrics.get("ttft") is not None:
+        parts.append(f"first token {metrics['ttft']:.1f}s")
+    if metrics.get("tokens_per_sec"):
+        parts.append(f"{metrics['tokens_per_sec']:.0f} tok/s")
+    parts.append(f"total {metrics.get('latency', 0):.1f}s")
+    if metrics.get("cached_prompt_tokens"):
+        parts.append(f"{metrics['cached_prompt_tokens']:,}/{metrics['prompt_tokens']:,} prompt tokens from prefix cache")
+    return "(" + " · ".join(parts) + ")"
+
+
+async def async_generate_exec_summary_and_objective(reference_text, condensed_rfp, num_interfaces=113, refresh=False,
+                                                    on_text=None, metrics=None):
+    route = model_routing.get_route("exec_summary")
+    messages = build_section_messages("exec_summary", route, reference_text, condensed_rfp, num_interfaces)
+
+    def preview(text):
+        # stream only the executive summary string out of the JSON being generated
+        exec_so_far = partial_string_field(text, "exec_summary")
+        if exec_so_far:
+            on_text(exec_so_far)
+
+    data, result = await agenerate_structured(
+        "exec_summary", messages, EXEC_OBJECTIVE_FIELDS, "exec_summary_objective", route=route,
+        refresh=refresh,
+        on_text=preview if on_text else None,
     )
-    return response.choices[0].message.content.strip()
+    record_stream_metrics(metrics, result)
 
+    return render_exec_summary(data["exec_summary"]), render_objective(data["objective"])
 
-async def async_generate_resource_schedule_and_commercial(reference_text, condensed_rfp):
-    # client = AsyncAzureOpenAI(
-    #     azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-    #     api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-    #     api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    # )
-    client = async_client
 
-    prompt = get_resource_schedule_and_commercial_prompt(reference_text, condensed_rfp)
-    response = await client.chat.completions.create(
-        model="Codetest", temperature=0.3, max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
+async def async_generate_scope_sections(reference_text, condensed_rfp, num_interfaces=None, refresh=False,
+                                        on_text=None, metrics=None):
+    route = model_routing.get_route("scope")
+    messages = build_section_messages("scope", route, reference_text, condensed_rfp, num_interfaces)
+    result = await model_routing.achat(
+        "scope", messages, route=route,
+        refresh=refresh,
+        on_text=on_text,
+    )
+    record_stream_metrics(metrics, result)
+    return result.text
+
+
+async def async_generate_resource_schedule_and_commercial(reference_text, condensed_rfp, refresh=False,
+                                                          on_text=None, metrics=None):
+    route = model_routing.get_route("resource_schedule")
+    messages = build_section_messages("resource_schedule", route, reference_text, condensed_rfp)
+    result = await model_routing.achat(
+        "resource_schedule", messages, route=route,
+        refresh=refresh,
+        on_text=on_text,
     )
-    return response.choices[0].message.content.strip()
+    record_stream_metrics(metrics, result)
+    return result.text
 
 
-async def async_generate_communication_plan(reference_text, condensed_rfp):
-    # client = AsyncAzureOpenAI(
-    #     azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-    #     api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-    #     api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    # )
-    client = async_client
+async def async_generate_communication_plan(reference_text, condensed_rfp, refresh=False,
+                                            on_text=None, metrics=None):
+    route = model_routing.get_route("communication_plan")
+    messages = build_section_messages("communication_plan", route, reference_text, condensed_rfp)
 
-    prompt = get_communication_plan_prompt(reference_text, condensed_rfp)
-    response = await client.chat.completions.create(
-        model="4o", temperature=0.3, max_tokens=2500,
-        messages=[{"role": "user", "content": prompt}]
+    def preview(text):
+        intro_so_far = partial_string_field(text, "intro")
+        if intro_so_far:
+            on_text(intro_so_far)
+
+    data, result = await agenerate_structured(
+        "communication_plan", messages, COMMUNICATION_PLAN_FIELDS, "communication_plan", route=route,
+        refresh=refresh,
+        on_text=preview if on_text else None,
     )
-    return response.choices[0].message.content.strip()
+    record_stream_metrics(metrics, result)
+    return render_communication_plan(data)
 
 # --- Conditional Logic ---
 def main():
@@ -466,6 +284,38 @@ def main():
 
     if uploaded_file:
 
+            # Section responses are cached, so reruns (e.g. the download button) cost no tokens.
+            # This button bypasses the cache and asks the model again.
+            regenerate = st.button(
+                "🔄 Regenerate Sections",
+                help="Ignore cached responses and generate every section again."
+            )
+            quick_draft = st.checkbox(
+                "⚡ Quick draft (condense the RFP locally, no extra LLM calls)",
+                help="Ranks RFP sentences with TextRank instead of summarizing them with the model."
+            )
+            reuse_similar = st.checkbox(
+                "♻️ Start from an earlier version or near-duplicate of this RFP when one exists",
+                value=True,
+                help="For a revised or re-issued RFP, sections of the earlier proposal are reused; only sections "
+                     "fed by changed pages (or changed relevant passages) are generated again."
+            )
+
+            # Every run checkpoints its sections under a run id; reruns of the page reuse the
+            # finished ones and "Retry Failed Sections" regenerates only the failed ones.
+            file_key = f"{uploaded_file.name}:{uploaded_file.size}:{'quick' if quick_draft else 'full'}"
+            run_ids = st.session_state.setdefault("proposal_runs", {})
+            if regenerate or file_key not in run_ids:
+                run_ids[file_key] = new_run_id()
+                cleanup_runs()
+            run = RunCheckpoint(run_ids[file_key])
+            set_usage_labels(run_id=run.run_id)          # usage store: attribute this run's LLM calls
+            retry_failed = st.session_state.pop("retry_failed", False)
+            failed_earlier = run.failed(SECTION_KEYS)
+
+            def should_generate(key):
+                return run.load(key) is None and (retry_failed or key not in failed_earlier)
+
             st.markdown("### ✍️ Step 2: Generating Your Proposal Response")
             with st.spinner("Analyzing RFP and preparing your AI-driven proposal response..."):
 
@@ -474,36 +324,14 @@ def main():
             
                     # STEP 1: Extract content
                     st.write("1/6 🔎 Extracting RFP content...")
-                    rfp_text = extract_text(uploaded_file)
+                    rfp_pages = extract_pages(uploaded_file)
+                    rfp_text = "\n".join(rfp_pages)
                     time.sleep(1)
                     # --- 🔍 Auto-detect number of interfaces / integrations from RFP text ---
                     # import re
                     rfp_text = rfp_text.replace(",", "")
 
-                    priority_keywords = ["ICOs?", "iCos?", "integration configuration objects?"]
-                    general_keywords = [
-                        "interfaces?", "integration points?", "flows?", "connections?",
-                        "touchpoints?", "IFlows?", "mappings?", "adapters?"
-                    ]
-
-                    # First: look specifically for ICO mentions
-                    ico_pattern = r'~?\b(\d{1,5})\s*(?:' + "|".join(priority_keywords) + r')\b'
-                    ico_matches = re.findall(ico_pattern, rfp_text, flags=re.IGNORECASE)
-
-                    if ico_matches:
-                        num_interfaces = max(map(int, ico_matches))
-                        detected_type = "ICOs"
-                    else:
-                        # fallback to general terms like 'interfaces' if ICOs not found
-                        pattern = r'~?\b(\d{1,5})\s*(?:' + "|".join(general_keywords) + r')\b'
-                        matches = re.findall(pattern, rfp_text, flags=re.IGNORECASE)
-
-                        if matches:
-                            num_interfaces = max(map(int, matches))
-                            detected_type = "interfaces"
-                        else:
-                            num_interfaces = None
-                            detected_type = None
+                    num_interfaces, detected_type = detect_interface_count(rfp_text)
 
                                     # Display result
                     if num_interfaces:
@@ -520,62 +348,174 @@ def main():
                     st.success("1/6 ✅ RFP content extracted!")
                     status.update(label="🚀 Generating Proposal Sections... (20% Complete)", state="running")
 
-                    # STEP 2: Build or load knowledge base & Retrieve context
-                    st.write("2/6 📚 Loading knowledge base and retrieving reference documents...")
-                    knowledge_db = build_knowledge_base()
-                    retriever = knowledge_db.as_retriever(search_kwargs={"k": 1})
-                    ref_docs = retriever.invoke(rfp_text)
-                    reference_text = "\n\n".join([d.page_content for d in ref_docs])
-                    st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference documents!")
+                    context = run.load_artifact("context")
+                    if context is None:
+                        # STEP 2: Build or load knowledge base & Retrieve context
+                        st.write("2/6 📚 Loading knowledge base and retrieving reference documents...")
+                        reference_text, ref_docs, retriever = retrieve_reference(build_knowledge_base(), rfp_text)
+                        if retriever.failovers:
+                            st.warning(f"⚠️ Knowledge base was slow or unreachable — answered from the local replica ({retriever.failovers[0]}).")
+                        st.success(f"2/6 ✅ Retrieved {len(ref_docs)} relevant reference documents!")
+
+                        # Condense the RFP once; every section prompt reuses the brief
+                        st.write("🧾 Condensing RFP into a proposal brief...")
+                        condense_mode = "extractive" if quick_draft else CONDENSE_MODE
+                        try:
+                            condensed_rfp = condense_rfp(rfp_text, mode=condense_mode, refresh=regenerate)
+                        except llm_gateway.LLMError as e:
+                            st.warning(f"⚠️ RFP condensation failed, using the full RFP text: {e}")
+                            condensed_rfp, condense_mode = rfp_text, "full_text"
+                        st.success(f"✅ RFP condensed ({len(rfp_text):,} → {len(condensed_rfp):,} characters)")
+                        # Embed the brief once; each section prompt gets only the passages routed to it
+                        brief_passages = RFPPassages(condensed_rfp)
+                        section_rfp = route_rfp(condensed_rfp, brief_passages)
+                        st.caption("🧭 Brief routed to sections: " + ", ".join(
+                            f"{label} {len(section_rfp[key]):,} chars" for label, key in zip(SECTION_LABELS, SECTION_KEYS)
+                        ))
+                        # Each section prompt gets only the matching part of the reference SOW as its exemplar
+                        reference_sections = split_reference_sections(reference_text)
+                        run.save_artifact("context", {
+                            "reference_text": reference_text,
+                            "reference_sections": reference_sections,
+                            "condensed_rfp": condensed_rfp,
+                            "section_rfp": section_rfp,
+                            "reference_documents": len(ref_docs),
+                            "boilerplate_version": library_version(),
+                        })
+
+                        # Index pages and fingerprint the brief so later revisions of this RFP can reuse this run
+                        # (only runs generated with the same reference, condensation and boilerplate are reused)
+                        settings = reuse_settings(reference_text, condense_mode, library_version())
+                        page_index = build_page_index(rfp_pages, settings, num_interfaces)
+                        run.save_artifact(PAGES_ARTIFACT, page_index)
+                        fingerprint = build_fingerprint(condensed_rfp, settings, num_interfaces, passages=brief_passages)
+                        run.save_artifact(FINGERPRINT_ARTIFACT, fingerprint)
+                        if reuse_similar and not regenerate:
+                            # an earlier version of this RFP (shared pages) first, then any near-duplicate
+                            source, share, changed_pages, reused, changed = reuse_previous_version(
+                                run, page_index, SECTION_KEYS
+                            )
+                            if source is not None:
+                                st.info(
+                                    f"♻️ Earlier version of this RFP found (run {source.run_id}, {share:.0%} of pages "
+                                    f"unchanged, {len(changed_pages)} changed). Reusing {len(reused)} section(s); "
+                                    f"regenerating: {', '.join(changed) or 'none'}."
+                                )
+                            else:
+                                source, similarity, reused, changed = reuse_from_similar(run, fingerprint, SECTION_KEYS)
+                                if source is not None:
+                                    st.info(
+                                        f"♻️ This RFP matches an earlier one ({similarity:.0%} similar, run {source.run_id}). "
+                                        f"Reusing {len(reused)} section(s); regenerating: "
+                                        f"{', '.join(changed) or 'none'}."
+                                    )
+                    else:
+                        reference_text, condensed_rfp = context["reference_text"], context["condensed_rfp"]
+                        section_rfp = context.get("section_rfp") or route_rfp(condensed_rfp)
+                        reference_sections = context.get("reference_sections") or split_reference_sections(reference_text)
+                        st.success(
+                            f"2/6 ♻️ Reusing {context['reference_documents']} reference documents "
+                            f"and the RFP brief of run {run.run_id}"
+                        )
                     status.update(label="🚀 Generating Proposal Sections... (40% Complete)", state="running")
 
 
                                     
                     # Create placeholders for live status updates
                     progress_placeholder = st.empty()
-                    status_messages = [
-                        "🧠 Generating Executive Summary & Objective...",
-                        "🧩 Generating Scope & Assumptions...",
-                        "📊 Generating Resource Schedule & Commercials...",
-                        "📢 Generating Communication Plan..."
-                    ]
                     completed = []
 
-                    async def generate_all_sections_async():
-                        async def wrapped_task(task_fn, label):
-                            try:
-                                result = await task_fn
-                                completed.append(f"✅ {label} generated successfully!")
-                                progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
-                                return result
-                            except Exception as e:
-                                completed.append(f"⚠️ {label} failed: {str(e)}")
-                                progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
-                                return None
-
-                        tasks = [
-                            wrapped_task(
-                                async_generate_exec_summary_and_objective(reference_text, rfp_text, num_interfaces),
-                                "Executive Summary & Objective"
-                            ),
-                            wrapped_task(
-                                async_generate_scope_sections(reference_text, rfp_text, num_interfaces),
-                                "Scope & Assumptions"
-                            ),
-                            wrapped_task(
-                                async_generate_resource_schedule_and_commercial(reference_text, rfp_text),
-                                "Resource Schedule & Commercials"
-                            ),
-                            wrapped_task(
-                                async_generate_communication_plan(reference_text, rfp_text),
-                                "Communication Plan"
-                            ),
-                        ]
-
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-                        return results
+                # --- Proposal Preview (sections stream into their tabs as tokens arrive) ---
+                st.markdown("## 🔍 Step 2: Review and Edit Content")
+                st.info("Review the AI-generated sections below before downloading the final document.")
+                
+                tab1, tab2, tab3, tab4, tab5 = st.tabs([
+                    "Executive Summary", "Objective", "Scope & Assumptions", 
+                    "Resource & Schedule", "Communication Plan"
+                ])
+                
+                with tab1: exec_placeholder = st.empty()
+                with tab2: objective_placeholder = st.empty()
+                with tab3: scope_placeholder = st.empty()
+                with tab4: resource_placeholder = st.empty()
+                with tab5: communication_placeholder = st.empty()
+
+                section_metrics = {label: {} for label in SECTION_LABELS}
+
+                async def generate_all_sections_async():
+                    async def wrapped_task(make_task, label, key):
+                        if not should_generate(key):
+                            result = load_section(run, key)
+                            if result is None:
+                                completed.append(f"⚠️ {label} failed earlier: {run.entry(key)['error']}")
+                            elif run.entry(key).get("unchanged_pages"):
+                                completed.append(f"♻️ {label} reused from the earlier version of this RFP (run {run.entry(key)['reused_from']})")
+                            elif run.entry(key).get("reused_from"):
+                                completed.append(f"♻️ {label} reused from similar RFP (run {run.entry(key)['reused_from']})")
+                            else:
+                                completed.append(f"♻️ {label} reused from this run's checkpoint")
+                            progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
+                            return result
+                        try:
+                            result = await make_task()
+                            run.save(key, result, metrics=section_metrics[label])
+                            completed.append(f"✅ {label} generated successfully! {format_stream_metrics(section_metrics[label])}")
+                            progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
+                            return result
+                        except Exception as e:
+                            run.fail(key, e)
+                            completed.append(f"⚠️ {label} failed: {str(e)}")
+                            progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
+                            return None
+
+                    exec_label, scope_label, resource_label, communication_label = SECTION_LABELS
+                    # Sections routed to the lead's deployment with the same reference exemplar share its
+                    # cached system prefix: send the lead first, then release them
+                    warmup = PrefixWarmup(PREFIX_WARMUP_SECONDS if should_generate("exec_summary") else 0)
+                    lead_deployment = model_routing.get_route("exec_summary").deployment
+
+                    def after_lead(task, coro):
+                        if (model_routing.get_route(task).deployment == lead_deployment
+                                and reference_sections[task] == reference_sections["exec_summary"]):
+                            return warmup.follow(coro)
+                        return coro
+
+                    tasks = [
+                        wrapped_task(
+                            lambda: warmup.lead(async_generate_exec_summary_and_objective(
+                                reference_sections["exec_summary"], section_rfp["exec_summary"], num_interfaces, refresh=regenerate,
+                                on_text=warmup.lead_callback(stream_to(exec_placeholder)),
+                                metrics=section_metrics[exec_label]
+                            )),
+                            exec_label, "exec_summary"
+                        ),
+                        wrapped_task(
+                            lambda: after_lead("scope", async_generate_scope_sections(
+                                reference_sections["scope"], section_rfp["scope"], num_interfaces, refresh=regenerate,
+                                on_text=stream_to(scope_placeholder), metrics=section_metrics[scope_label]
+                            )),
+                            scope_label, "scope"
+                        ),
+                        wrapped_task(
+                            lambda: after_lead("resource_schedule", async_generate_resource_schedule_and_commercial(
+                                reference_sections["resource_schedule"], section_rfp["resource_schedule"], refresh=regenerate,
+                                on_text=stream_to(resource_placeholder), metrics=section_metrics[resource_label]
+                            )),
+                            resource_label, "resource_schedule"
+                        ),
+                        wrapped_task(
+                            lambda: after_lead("communication_plan", async_generate_communication_plan(
+                                reference_sections["communication_plan"], section_rfp["communication_plan"], refresh=regenerate,
+                                on_text=stream_to(communication_placeholder), metrics=section_metrics[communication_label]
+                            )),
+                            communication_label, "communication_plan"
+                        ),
+                    ]
 
+                    results = await asyncio.gather(*tasks, return_exceptions=True)
+                    return results
 
+                with status:
                     with st.spinner("🚀 Generating all proposal sections concurrently..."):
                         loop = asyncio.new_event_loop()
                         asyncio.set_event_loop(loop)
@@ -585,24 +525,38 @@ def main():
                     exec_summary, objective = exec_obj if isinstance(exec_obj, tuple) else ("", "")
 
                     # Final success message
-                    progress_placeholder.markdown("<br>".join(completed) + "<br>🎉 All sections generated successfully!", unsafe_allow_html=True)
-                    st.success("✅ All proposal sections generated in parallel using async!")
-                    status.update(label="✅ Proposal Content Complete!", state="complete", expanded=False)
+                    failed_sections = run.failed(SECTION_KEYS)
+                    if failed_sections:
+                        progress_placeholder.markdown("<br>".join(completed), unsafe_allow_html=True)
+                        st.warning(f"⚠️ {len(failed_sections)} section(s) failed. Finished sections are saved in run {run.run_id}.")
+                        status.update(label="⚠️ Proposal Content Incomplete", state="error", expanded=True)
+                    else:
+                        progress_placeholder.markdown("<br>".join(completed) + "<br>🎉 All sections generated successfully!", unsafe_allow_html=True)
+                        st.success("✅ All proposal sections generated in parallel using async!")
+                        status.update(label="✅ Proposal Content Complete!", state="complete", expanded=False)
+
+                if failed_sections:
+                    st.button(
+                        f"🔁 Retry Failed Sections ({len(failed_sections)})",
+                        on_click=st.session_state.update, kwargs={"retry_failed": True},
+                        help="Generate only the failed sections again; finished sections are reused."
+                    )
 
-                # --- Proposal Preview ---
-                st.markdown("## 🔍 Step 2: Review and Edit Content")
-                st.info("Review the AI-generated sections below before downloading the final document.")
-                
-                tab1, tab2, tab3, tab4, tab5 = st.tabs([
-                    "Executive Summary", "Objective", "Scope & Assumptions", 
-                    "Resource & Schedule", "Communication Plan"
-                ])
-                
-                with tab1: st.markdown(exec_summary)
-                with tab2: st.markdown(objective)
-                with tab3: st.markdown(scope_text)
-                with tab4: st.markdown(resource_schedule_text)
-                with tab5: st.markdown(communication_plan_text)
+                for label, metrics in section_metrics.items():
+                    print(f"⏱️ {label}: {format_stream_metrics(metrics)}")
+                print(f"🧮 Prompt prefix cache: {llm_gateway.cached_prompt_share():.0%} of prompt tokens served from cache")
+                print(f"🔗 Single-flight: {llm_gateway.single_flight_stats['joined']} calls joined an identical in-flight request")
+                print(
+                    f"🪁 Hedging: {hedge_stats['hedged']}/{hedge_stats['requests']} calls hedged, "
+                    f"hedge won {hedge_stats['hedge_wins']}, primary won {hedge_stats['primary_wins']}"
+                )
+
+                # Final render (the Executive Summary tab streamed the combined output)
+                exec_placeholder.markdown(exec_summary)
+                objective_placeholder.markdown(objective)
+                scope_placeholder.markdown(scope_text or "")
+                resource_placeholder.markdown(resource_schedule_text or "")
+                communication_placeholder.markdown(communication_plan_text or "")
                 
                 # --- Download Section ---
                 st.markdown("---")
@@ -1,5 +1,6 @@
 import streamlit as st
 import integration, coreasses # 👈 This will call your current async generator
+import usage_admin
 
 
 # -------------------------------------------------------
@@ -111,6 +112,11 @@ if st.session_state.view == "home":
                 st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
+    with col2:
+        if st.button("📊 Usage & Cost", use_container_width=True):
+            st.session_state.view = "usage"
+            st.rerun()
+
 # -------------------------------------------------------
 # 5. INTEGRATION MODULE (your RFP app)
 # -------------------------------------------------------
@@ -133,3 +139,14 @@ elif st.session_state.view == "coreasses":
         st.session_state.view = "home"
         st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
+
+# -------------------------------------------------------
+# 7. USAGE & COST ADMIN
+# -------------------------------------------------------
+elif st.session_state.view == "usage":
+    usage_admin.main()
+    st.markdown("<div class='back-btn'>", unsafe_allow_html=True)
+    if st.button("⬅ Back to Home", key="back_home"):
+        st.session_state.view = "home"
+        st.rerun()
+    st.markdown("</div>", unsafe_allow_html=True)
@@ -25,7 +25,11 @@ from Modules.prompts import (
 import asyncio
 import concurrent.futures
 import aiohttp
-from openai import AsyncAzureOpenAI
+from Modules import model_routing
+from Modules.structured import (
+    COMMUNICATION_PLAN_FIELDS, EXEC_OBJECTIVE_FIELDS, agenerate_structured, render_objective,
+)
+from Modules.boilerplate import library_version, render_communication_plan, render_exec_summary
 
 
 
@@ -344,84 +348,33 @@ def insert_executive_summary_into_template(
 
 
 async def async_generate_exec_summary_and_objective(reference_text, condensed_rfp, num_interfaces=113):
-    client = AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
-
     prompt = get_executive_summary_and_objective_prompt(reference_text, condensed_rfp, num_interfaces)
 
-    response = await client.chat.completions.create(
-        model="Codetest",
-        temperature=0.3,
-        max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    full_output = response.choices[0].message.content.strip()
-
-    # Safer regex split
-    exec_text = ""
-    obj_text = ""
-
-    match_exec = re.search(r"(?i)\*\*?Executive Summary\*\*?\s*([\s\S]*?)(?=\*\*?Objective\*\*?)", full_output)
-    if match_exec:
-        exec_text = match_exec.group(1).strip()
+    # One JSON object (exec_summary, objective text + table); malformed fields are re-asked
+    data, _ = await agenerate_structured("exec_summary", prompt, EXEC_OBJECTIVE_FIELDS, "exec_summary_objective")
 
-    match_obj = re.search(r"(?i)\*\*?Objective\*\*?\s*(.*)", full_output, re.S)
-    if match_obj:
-        obj_text = match_obj.group(1).strip()
-
-    # fallback
-    if not exec_text:
-        exec_text = full_output[:len(full_output)//2]
-    if not obj_text:
-        obj_text = full_output[len(full_output)//2:]
-
-    return exec_text, obj_text
+    return render_exec_summary(data["exec_summary"]), render_objective(data["objective"])
 
 
 async def async_generate_scope_sections(reference_text, condensed_rfp, num_interfaces=None):
-    client = AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
     prompt = get_scope_prereq_assumptions_prompt(reference_text, condensed_rfp, num_interfaces)
-    response = await client.chat.completions.create(
-        model="Codetest", temperature=0.3, max_tokens=1200,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    result = await model_routing.achat("scope", prompt)
+    return result.text
 
 
 async def async_generate_resource_schedule_and_commercial(reference_text, condensed_rfp):
-    client = AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
     prompt = get_resource_schedule_and_commercial_prompt(reference_text, condensed_rfp)
-    response = await client.chat.completions.create(
-        model="Codetest", temperature=0.3, max_tokens=2000,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    result = await model_routing.achat("resource_schedule", prompt)
+    return result.text
 
 
 async def async_generate_communication_plan(reference_text, condensed_rfp):
-    client = AsyncAzureOpenAI(
-        azure_endpoint=os.getenv("AZURE_OPENAI_FRFP_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_FRFP_KEY"),
-        api_version=os.getenv("AZURE_OPENAI_FRFP_VERSION")
-    )
     prompt = get_communication_plan_prompt(reference_text, condensed_rfp)
-    response = await client.chat.completions.create(
-        model="Codetest", temperature=0.3, max_tokens=2500,
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+
+    # Client-specific intro and interaction table; the escalation procedure comes from the boilerplate library
+    data, _ = await agenerate_structured("communication_plan", prompt, COMMUNICATION_PLAN_FIELDS, "communication_plan")
+
+    return render_communication_plan(data)
 
 # -------------------------------------------------------
 # 3. STREAMLIT UI (Revamped Professional Look)
@@ -570,6 +523,8 @@ if uploaded_file:
                     resource_schedule_text=resource_schedule_text,
                     communication_plan_text=communication_plan_text
                 )
+                # trace the document back to the boilerplate text it was rendered with
+                final_doc.core_properties.comments = f"Boilerplate library {library_version()}"
 
                 buffer = BytesIO()
                 final_doc.save(buffer)
@@ -0,0 +1,66 @@
+"""
+Offline test setup: every LLM call goes to FakeBackend, and the response
+cache, usage store, run checkpoints and knowledge-base state live in a
+temporary folder. The environment is set before any Modules import reads it.
+Tokens are counted with a word-level stand-in, since tiktoken downloads its
+encodings on first use.
+"""
+import os
+import re
+import tempfile
+
+_state_dir = tempfile.mkdtemp(prefix="rfp-tests-")
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_CACHE"] = "off"
+os.environ["USAGE_DB"] = os.path.join(_state_dir, "usage.sqlite3")
+os.environ["RUNS_DIR"] = os.path.join(_state_dir, "runs")
+os.environ["KB_STATE_DIR"] = os.path.join(_state_dir, "kb")
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ["PASSAGE_EMBEDDINGS"] = "hashing"
+
+import pytest  # noqa: E402
+
+from Modules import llm_gateway, token_budget  # noqa: E402
+
+
+class WordEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per word and its trailing whitespace."""
+
+    _PIECE = re.compile(r"\s+|\S+\s*")
+
+    def __init__(self):
+        self.vocab, self.pieces = {}, []
+
+    def encode(self, text, disallowed_special=()):
+        tokens = []
+        for piece in self._PIECE.findall(text):
+            if piece not in self.vocab:
+                self.vocab[piece] = len(self.pieces)
+                self.pieces.append(piece)
+            tokens.append(self.vocab[piece])
+        return tokens
+
+    def decode(self, tokens):
+        return "".join(self.pieces[t] for t in tokens)
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch):
+    encoding = WordEncoding()
+    monkeypatch.setattr(token_budget, "_encoding", lambda name: encoding)
+    token_budget._count_static.cache_clear()
+
+
+@pytest.fixture
+def fake_backend():
+    """Install a FakeBackend(**kwargs) on the process-wide gateway and return it."""
+    def install(**kwargs):
+        backend = llm_gateway.FakeBackend(**kwargs)
+        llm_gateway.set_backend(backend)
+        return backend
+    return install
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "BACKOFF_BASE_SECONDS", 0.01)
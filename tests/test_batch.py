@@ -0,0 +1,86 @@
+import json
+
+from Modules import batch, llm_gateway, model_routing
+from Modules.checkpoints import RunCheckpoint
+from Modules.model_routing import Route
+
+
+MESSAGES = [{"role": "user", "content": "Write the scope"}]
+
+
+def output_line(custom_id, model, content, finish_reason="stop", status=200):
+    body = {
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "prompt_tokens_details": {"cached_tokens": 40}},
+    }
+    if status != 200:
+        body = {"error": {"message": "content filtered"}}
+    return {"custom_id": custom_id, "response": {"status_code": status, "body": body}, "error": None}
+
+
+def test_request_line():
+    line = batch.request_line("run-1::scope", "4o-batch", MESSAGES, max_tokens=1200, temperature=0.3)
+    assert line == {
+        "custom_id": "run-1::scope",
+        "method": "POST",
+        "url": "/chat/completions",
+        "body": {"model": "4o-batch", "messages": MESSAGES, "max_tokens": 1200, "temperature": 0.3},
+    }
+
+
+def test_batch_results_take_the_deployment_from_the_request():
+    requests = [
+        batch.request_line("run-1::scope", "4o-batch", MESSAGES),
+        batch.request_line("run-1::communication_plan", "4o-batch", MESSAGES),
+    ]
+    output = [
+        output_line("run-1::scope", "gpt-4o-2024-08-06", "Scope text ", finish_reason="length"),
+        output_line("run-1::communication_plan", "gpt-4o-2024-08-06", None, status=400),
+    ]
+    results = batch.batch_results(output, requests)
+
+    scope = results["run-1::scope"]
+    assert isinstance(scope, llm_gateway.LLMResult)
+    assert scope.deployment == "4o-batch"
+    assert scope.text == "Scope text "
+    assert scope.finish_reason == "length"
+    assert scope.usage == {"prompt_tokens": 100, "completion_tokens": 20, "cached_tokens": 40}
+
+    failed = results["run-1::communication_plan"]
+    assert isinstance(failed, llm_gateway.LLMError)
+    assert failed.deployment == "4o-batch"
+    assert failed.status == 400
+    assert "content filtered" in str(failed)
+
+
+def test_local_backend_round_trip(fake_backend, tmp_path):
+    fake_backend()
+    lines = [batch.request_line("run-1::scope", "bt-local", MESSAGES, max_tokens=200)]
+    job = batch.submit_batch(lines, backend=batch.LocalBatchBackend(), batch_dir=str(tmp_path), runs={"run-1": "a.pdf"})
+    output = batch.poll_batch(job, interval=0, batch_dir=str(tmp_path))
+
+    assert batch.load_job(job["job_id"], str(tmp_path))["status"] == "completed"
+    assert batch.load_requests(job, str(tmp_path)) == lines
+    results = batch.batch_results(output, batch.load_requests(job, str(tmp_path)))
+    assert results["run-1::scope"].text == "[bt-local] Write the scope"
+    with open(tmp_path / job["job_id"] / "output.jsonl", encoding="utf-8") as f:
+        assert [json.loads(line)["custom_id"] for line in f] == ["run-1::scope"]
+
+
+def test_truncated_batch_answer_is_continued_on_the_live_deployment(fake_backend, monkeypatch, tmp_path):
+    import batch_proposals
+
+    backend = fake_backend(responder=lambda deployment, messages, params: " and the rest.")
+    route = Route(task="scope", deployment="bt-live", batch_deployment="bt-batch", latency_seconds=5)
+    monkeypatch.setattr(model_routing, "get_route", lambda task: route)
+    partial = llm_gateway.LLMResult(
+        text="Scope covers 113 ICOs", deployment="bt-batch", finish_reason="length", usage={"completion_tokens": 5}
+    )
+    run = RunCheckpoint("run-1", str(tmp_path))
+
+    section = batch_proposals.finish_section(run, "scope", MESSAGES, partial)
+
+    assert section == "Scope covers 113 ICOs and the rest."
+    assert [c["deployment"] for c in backend.calls] == ["bt-live"]
+    assert run.entry("scope")["deployment"] == "bt-batch"
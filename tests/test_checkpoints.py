@@ -0,0 +1,114 @@
+import os
+import time
+
+from Modules.checkpoints import RunCheckpoint, cleanup_runs
+from Modules.proposal_memory import build_fingerprint, reuse_from_similar, reuse_settings
+
+
+SECTIONS = ["exec_summary", "scope", "resource_schedule", "communication_plan"]
+RFP = "\n\n".join([
+    "The county seeks a vendor to migrate its permitting system to the cloud and integrate it with GIS.",
+    "Scope includes data migration, interfaces to the finance ERP and the document management system.",
+    "The project runs twelve months with a project manager, two developers and a QA analyst on site.",
+    "Weekly status meetings, a steering committee every month and a shared issue log are required.",
+])
+
+
+def test_save_load_and_status(tmp_path):
+    run = RunCheckpoint("run-1", str(tmp_path))
+    run.save("scope", "Scope text", deployment="4o")
+    run.fail("resource_schedule", ValueError("timed out"))
+
+    assert run.load("scope") == "Scope text"
+    assert run.entry("scope")["deployment"] == "4o"
+    assert run.load("resource_schedule") is None
+    assert run.entry("resource_schedule")["error"] == "timed out"
+    assert run.status(SECTIONS) == {
+        "exec_summary": "pending", "scope": "done",
+        "resource_schedule": "failed", "communication_plan": "pending",
+    }
+    assert run.failed(SECTIONS) == ["resource_schedule"]
+
+
+def test_resume_regenerates_only_unfinished_sections(tmp_path):
+    first = RunCheckpoint("run-1", str(tmp_path))
+    first.save("exec_summary", ["Summary", "Objective"])
+    first.save("scope", "Scope text")
+    first.fail("resource_schedule", "boom")
+
+    resumed = RunCheckpoint("run-1", str(tmp_path))
+    assert [s for s in SECTIONS if resumed.load(s) is None] == ["resource_schedule", "communication_plan"]
+    resumed.save("resource_schedule", "Schedule")
+    assert resumed.failed(SECTIONS) == []
+    assert resumed.load("exec_summary") == ["Summary", "Objective"]
+
+
+def test_artifacts_round_trip(tmp_path):
+    run = RunCheckpoint("run/with:odd chars", str(tmp_path))
+    assert run.load_artifact("context") is None
+    run.save_artifact("context", {"condensed_rfp": "brief", "num_interfaces": 3})
+    assert RunCheckpoint("run/with:odd chars", str(tmp_path)).load_artifact("context") == {
+        "condensed_rfp": "brief", "num_interfaces": 3,
+    }
+    assert os.path.dirname(run.path) == str(tmp_path)
+
+
+def test_cleanup_runs_removes_only_stale_runs(tmp_path):
+    old, fresh = RunCheckpoint("run-old", str(tmp_path)), RunCheckpoint("run-new", str(tmp_path))
+    old.save("scope", "old")
+    fresh.save("scope", "new")
+    stale = time.time() - 3600
+    os.utime(old.path, (stale, stale))
+
+    cleanup_runs(str(tmp_path), retention=60)
+    assert not os.path.exists(old.path)
+    assert fresh.load("scope") == "new"
+
+
+def finished_run(runs_dir, run_id, settings, num_interfaces=2):
+    run = RunCheckpoint(run_id, runs_dir)
+    run.save_artifact("fingerprint", build_fingerprint(RFP, settings, num_interfaces))
+    for section in SECTIONS:
+        run.save(section, f"{section} of {run_id}")
+    return run
+
+
+def test_reissued_rfp_reuses_earlier_sections(tmp_path):
+    settings = reuse_settings("reference", "extractive", "v1")
+    finished_run(str(tmp_path), "run-1", settings)
+
+    run = RunCheckpoint("run-2", str(tmp_path))
+    source, similarity, reused, remaining = reuse_from_similar(
+        run, build_fingerprint(RFP, settings, 2), SECTIONS, runs_dir=str(tmp_path)
+    )
+    assert source.run_id == "run-1" and similarity > 0.99
+    assert reused == SECTIONS and remaining == []
+    assert run.load("scope") == "scope of run-1"
+    assert run.entry("scope")["reused_from"] == "run-1"
+
+
+def test_reuse_regenerates_sections_with_changed_inputs(tmp_path):
+    settings = reuse_settings("reference", "extractive", "v1")
+    finished_run(str(tmp_path), "run-1", settings, num_interfaces=2)
+
+    run = RunCheckpoint("run-2", str(tmp_path))
+    run.save("resource_schedule", "already generated")
+    _, _, reused, remaining = reuse_from_similar(
+        run, build_fingerprint(RFP, settings, 5), SECTIONS, runs_dir=str(tmp_path)
+    )
+    # the interface count feeds exec_summary and scope; resource_schedule was finished in this run
+    assert reused == ["communication_plan"]
+    assert remaining == ["exec_summary", "scope", "resource_schedule"]
+    assert run.load("resource_schedule") == "already generated"
+
+
+def test_no_reuse_across_different_settings(tmp_path):
+    finished_run(str(tmp_path), "run-1", reuse_settings("reference", "extractive", "v1"))
+
+    run = RunCheckpoint("run-2", str(tmp_path))
+    source, _, reused, remaining = reuse_from_similar(
+        run, build_fingerprint(RFP, reuse_settings("reference", "extractive", "v2"), 2), SECTIONS,
+        runs_dir=str(tmp_path),
+    )
+    assert source is None and reused == [] and remaining == SECTIONS
+    assert run.status(SECTIONS) == dict.fromkeys(SECTIONS, "pending")
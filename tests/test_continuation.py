@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from Modules import llm_gateway, model_routing
+from Modules.model_routing import Route, join_continuation
+
+
+MESSAGES = [{"role": "user", "content": "Write the scope"}]
+
+
+# -------------------------------------------------------
+# join_continuation
+# -------------------------------------------------------
+
+def test_join_keeps_whitespace_at_the_cut():
+    assert join_continuation("The scope covers", " all interfaces.") == "The scope covers all interfaces."
+    assert join_continuation("Line one\n", "Line two") == "Line one\nLine two"
+
+
+def test_join_drops_repeated_overlap():
+    partial = "Interfaces will be migrated in three waves"
+    more = "migrated in three waves, starting with finance."
+    assert join_continuation(partial, more) == (
+        "Interfaces will be migrated in three waves, starting with finance."
+    )
+
+
+def test_join_ignores_short_accidental_overlap():
+    # "the" repeats by chance; shorter than MIN_OVERLAP_CHARS, so nothing is dropped
+    assert join_continuation("Signed by the", "the client.") == "Signed by thethe client."
+
+
+# -------------------------------------------------------
+# Continuation of truncated answers
+# -------------------------------------------------------
+
+FULL_ANSWER = (
+    "Crave will migrate 113 interfaces from SAP PI to Integration Suite. "
+    "Testing covers unit, SIT and UAT cycles.\n\n- Wave 1: finance\n- Wave 2: logistics "
+)
+
+
+def continuing(deployment, messages, params):
+    """Carries on from the partial answer sent back as the assistant turn."""
+    if messages[-1]["content"] == model_routing.CONTINUE_PROMPT:
+        return FULL_ANSWER[len(messages[-2]["content"]):]
+    return FULL_ANSWER
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_truncated_answer_is_continued_exactly(fake_backend, streamed):
+    backend = fake_backend(responder=continuing)
+    route = Route(task="scope", deployment="rt-long", max_tokens=13, latency_seconds=5, max_continuations=3)
+    kwargs = {"on_text": lambda text: None} if streamed else {}
+    result = asyncio.run(model_routing.achat("scope", MESSAGES, route=route, **kwargs))
+    assert result.text == FULL_ANSWER.strip()
+    assert result.finish_reason == "stop"
+    assert len(backend.calls) == 3
+
+
+def test_continue_truncated_for_batch_answers(fake_backend):
+    fake_backend(responder=continuing)
+    route = Route(task="scope", deployment="rt-long", max_tokens=13, latency_seconds=5, max_continuations=3)
+    partial = llm_gateway.LLMResult(
+        text=FULL_ANSWER[:52], deployment="rt-long", finish_reason="length", usage={"completion_tokens": 13}
+    )
+    result = model_routing.continue_truncated("scope", MESSAGES, partial, route=route)
+    assert result.text == FULL_ANSWER.strip()
+
+
+def test_gives_up_after_max_continuations(fake_backend):
+    backend = fake_backend(responder=continuing)
+    route = Route(task="scope", deployment="rt-long", max_tokens=13, latency_seconds=5, max_continuations=1)
+    result = model_routing.chat("scope", MESSAGES, route=route)
+    assert result.finish_reason == "length"
+    assert FULL_ANSWER.startswith(result.text)
+    assert len(backend.calls) == 2
+    assert result.usage["completion_tokens"] == 26
+
+
+def test_streamed_continuation_reports_the_whole_answer(fake_backend):
+    fake_backend(responder=continuing)
+    route = Route(task="scope", deployment="rt-long", max_tokens=13, latency_seconds=5, max_continuations=3)
+    seen = []
+    asyncio.run(model_routing.achat("scope", MESSAGES, route=route, on_text=seen.append))
+    assert all(FULL_ANSWER.startswith(text) for text in seen)
+    assert seen[-1] == FULL_ANSWER
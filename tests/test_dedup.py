@@ -0,0 +1,52 @@
+import pytest
+
+from Modules.dedup import MinHasher, NearDuplicateIndex, estimated_similarity, shingles
+
+
+BOILERPLATE = (
+    "Crave InfoTech has been closely associated with SAP since 2007 and has earned the confidence "
+    "of clientele across North America, Africa, Australia and Asia as an Independent Software "
+    "Solutions Vendor. Companies from the public and private sectors have turned to us for our "
+    "expertise, dependability, flexibility and collaborative approach to achieve their business objectives."
+)
+
+
+def test_shingles_are_lower_cased_word_ngrams():
+    assert shingles("One two Three four five six", size=5) == {"one two three four five", "two three four five six"}
+    assert shingles("Short text", size=5) == {"short text"}
+    assert shingles("", size=5) == set()
+
+
+def test_signatures_are_deterministic():
+    assert MinHasher().signature(BOILERPLATE) == MinHasher().signature(BOILERPLATE)
+    assert estimated_similarity(MinHasher().signature(BOILERPLATE), MinHasher().signature(BOILERPLATE)) == 1.0
+
+
+def test_near_duplicate_is_mapped_to_the_canonical_chunk():
+    index = NearDuplicateIndex()
+    assert index.add("sow-1#0", BOILERPLATE) is None
+    assert index.add("sow-2#3", BOILERPLATE.replace("2007", "2007,")) == "sow-1#0"
+    assert index.duplicated() == {"sow-1#0": ["sow-1#0", "sow-2#3"]}
+
+
+def test_different_text_stays_canonical():
+    index = NearDuplicateIndex()
+    index.add("sow-1#0", BOILERPLATE)
+    other = (
+        "The resource schedule lists one project manager, two integration consultants and a test lead "
+        "for the twelve week migration of the remaining interfaces to Integration Suite."
+    )
+    assert index.add("sow-1#1", other) is None
+    assert index.duplicated() == {}
+
+
+def test_occurrences_record_where_each_copy_appeared():
+    index = NearDuplicateIndex()
+    index.add("sow-1#0", BOILERPLATE, occurrence={"source": "sow-1.docx", "chunk": 0})
+    index.add("sow-2#0", BOILERPLATE, occurrence={"source": "sow-2.docx", "chunk": 0})
+    assert [o["source"] for o in index.duplicated()["sow-1#0"]] == ["sow-1.docx", "sow-2.docx"]
+
+
+def test_bands_must_divide_the_signature():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=64, bands=10)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from Modules import hedging, llm_gateway, model_routing
+from Modules.model_routing import Route
+from Modules.usage_store import get_store, usage_labels
+
+
+MESSAGES = [{"role": "system", "content": "You write SOW sections. " * 20}, {"role": "user", "content": "Scope"}]
+
+
+class PerDeploymentBackend(llm_gateway.FakeBackend):
+    """FakeBackend with a latency and an optional failure status per deployment."""
+
+    def __init__(self, latency=None, fail=None):
+        super().__init__(responder=lambda deployment, messages, params: f"scope from {deployment}")
+        self.latency_of = latency or {}
+        self.fail = fail or {}
+
+    async def create(self, deployment, messages, **params):
+        self.latency = self.latency_of.get(deployment, 0.0)
+        if deployment in self.fail:
+            self.failures = [self.fail[deployment]]
+        return await super().create(deployment, messages, **params)
+
+
+@pytest.fixture(autouse=True)
+def quick_hedge(monkeypatch):
+    monkeypatch.setattr(hedging, "DEFAULT_HEDGE_AFTER_SECONDS", 0.2)
+
+
+def deployments(backend):
+    return [c["deployment"] for c in backend.calls]
+
+
+def test_primary_failing_before_the_threshold_goes_to_the_alternate():
+    backend = PerDeploymentBackend(fail={"hd-primary": 400})
+    llm_gateway.set_backend(backend)
+    result = asyncio.run(hedging.hedged_achat(MESSAGES, "hd-primary", "hd-alternate", timeout=5))
+    assert result.deployment == "hd-alternate"
+    assert deployments(backend) == ["hd-primary", "hd-alternate"]
+
+
+def test_slow_primary_is_hedged_and_the_loser_is_recorded_as_cancelled():
+    backend = PerDeploymentBackend(latency={"hd-slow": 2.0})
+    llm_gateway.set_backend(backend)
+    run_id = f"hedge-{uuid.uuid4().hex[:8]}"
+
+    async def run():
+        with usage_labels(run_id=run_id):
+            return await hedging.hedged_achat(MESSAGES, "hd-slow", "hd-fast", timeout=5)
+
+    result = asyncio.run(run())
+    assert result.deployment == "hd-fast"
+
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        calls = {c["deployment"]: c for c in get_store().run_calls(run_id)}
+        if len(calls) == 2:
+            break
+        time.sleep(0.05)
+    assert calls["hd-fast"]["status"] == "ok"
+    assert calls["hd-slow"]["status"] == "cancelled"
+    assert calls["hd-slow"]["prompt_tokens"] > 0
+    assert calls["hd-slow"]["cost_usd"] > 0
+
+
+def test_both_failing_raise_hedge_error_naming_both():
+    llm_gateway.set_backend(PerDeploymentBackend(fail={"hd-x": 400, "hd-y": 400}))
+    with pytest.raises(hedging.HedgeError) as raised:
+        asyncio.run(hedging.hedged_achat(MESSAGES, "hd-x", "hd-y", timeout=5))
+    assert set(raised.value.errors) == {"hd-x", "hd-y"}
+
+
+def test_hedged_route_falls_back_to_the_rest_of_the_chain(monkeypatch):
+    monkeypatch.setattr(model_routing, "HEDGING_ENABLED", True)
+    backend = PerDeploymentBackend(fail={"hd-r1": 400, "hd-r2": 400})
+    llm_gateway.set_backend(backend)
+    route = Route(task="scope", deployment="hd-r1", fallbacks=["hd-r2", "hd-r3"], latency_seconds=5, hedge=True)
+    result = asyncio.run(model_routing.achat("scope", MESSAGES, route=route))
+    assert result.text == "scope from hd-r3"
+    assert deployments(backend) == ["hd-r1", "hd-r2", "hd-r3"]
+
+
+def test_loser_cancelled_while_queued_is_not_recorded():
+    backend = PerDeploymentBackend(latency={"hd-late": 0.5, "hd-busy": 2.0})
+    llm_gateway.set_backend(backend)
+    llm_gateway.get_gateway().limiter.slot("hd-busy").limit = 1
+    run_id = f"hedge-{uuid.uuid4().hex[:8]}"
+
+    async def run():
+        # holds the alternate's only slot, so the hedge waits in the limiter until it loses
+        blocker = asyncio.ensure_future(llm_gateway.achat([{"role": "user", "content": "other"}], "hd-busy", timeout=5))
+        await asyncio.sleep(0.05)
+        with usage_labels(run_id=run_id):
+            result = await hedging.hedged_achat(MESSAGES, "hd-late", "hd-busy", timeout=5)
+        blocker.cancel()
+        return result
+
+    result = asyncio.run(run())
+    assert result.deployment == "hd-late"
+    time.sleep(0.3)
+    calls = get_store().run_calls(run_id)
+    assert [(c["deployment"], c["status"]) for c in calls] == [("hd-late", "ok")]
+    assert [c["deployment"] for c in backend.calls] == ["hd-busy", "hd-late"]
+
+
+def test_threshold_is_the_p95_ttft_once_there_are_enough_samples(monkeypatch):
+    monkeypatch.setattr(hedging, "_ttft_samples", {})
+    for seconds in range(1, hedging.MIN_SAMPLES):
+        hedging.record_ttft("hd-p95", float(seconds))
+    assert hedging.hedge_threshold("hd-p95") == hedging.DEFAULT_HEDGE_AFTER_SECONDS
+
+    hedging.record_ttft("hd-p95", 20.0)
+    hedging.record_ttft("hd-p95", None)                # non-streamed calls have no TTFT
+    assert hedging.hedge_threshold("hd-p95") == 20.0
+
+    for _ in range(hedging.SAMPLE_WINDOW):
+        hedging.record_ttft("hd-p95", 0.1)
+    assert hedging.hedge_threshold("hd-p95") == hedging.MIN_HEDGE_AFTER_SECONDS
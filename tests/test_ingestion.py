@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from Modules.ingestion import _join_overlapping, build_chunk_records, chunk_text, expand_to_documents
+
+
+LINES = [f"Line {i:02d} of the reference statement of work." for i in range(40)]
+TEXT = "\n".join(LINES)
+
+
+def test_chunks_respect_the_size_and_overlap():
+    chunks = chunk_text(TEXT, chunk_size=300, overlap=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    for first, second in zip(chunks, chunks[1:]):
+        assert second.split("\n")[0] in first.split("\n")      # carried over as overlap
+
+
+def test_long_lines_are_hard_split():
+    chunks = chunk_text("x" * 250, chunk_size=100, overlap=0)
+    assert chunks == ["x" * 100, "x" * 100, "x" * 50]
+
+
+def test_joining_the_chunks_restores_the_document():
+    assert _join_overlapping(chunk_text(TEXT, chunk_size=300, overlap=100)) == TEXT
+
+
+def test_chunk_records_point_at_their_document_position():
+    records = build_chunk_records("/refs/SOW Acme.docx", TEXT)
+    doc_id = records[0][2]["doc_id"]
+    assert [r[0] for r in records] == [f"{doc_id}#{i}" for i in range(len(records))]
+    assert records[1][2]["positions"] == [f"{doc_id}:1"]
+    assert {r[2]["chunk_count"] for r in records} == {len(records)}
+    assert records[0][2]["source"] == "SOW Acme.docx"
+
+
+class FakeStore:
+    def __init__(self, records):
+        self.docs = [SimpleNamespace(page_content=text, metadata=meta) for _, text, meta in records]
+
+    def similarity_search(self, query, k, filter):
+        wanted = set(filter["doc_ids"]["$in"])
+        return [d for d in reversed(self.docs) if wanted & set(d.metadata["doc_ids"])][:k]
+
+
+def test_hits_are_expanded_to_whole_documents_in_order():
+    records = build_chunk_records("sow-a.docx", TEXT)
+    store = FakeStore(records)
+    hits = [store.docs[1], store.docs[0], SimpleNamespace(page_content="legacy document", metadata={})]
+    assert expand_to_documents(store, hits) == [TEXT, "legacy document"]
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+from Modules import llm_cache, llm_gateway
+from Modules.llm_cache import ResponseCache, cache_key
+
+
+MESSAGES = [{"role": "user", "content": "Summarise the RFP"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 1000.0}
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: now["t"]))
+    return now
+
+
+def test_cache_key_depends_on_everything_that_shapes_the_answer():
+    key = cache_key("4o", MESSAGES, {"temperature": 0.3, "max_tokens": 100})
+    assert key == cache_key("4o", MESSAGES, {"max_tokens": 100, "temperature": 0.3})
+    assert key != cache_key("Codetest", MESSAGES, {"temperature": 0.3, "max_tokens": 100})
+    assert key != cache_key("4o", MESSAGES, {"temperature": 0.0, "max_tokens": 100})
+    assert key != cache_key("4o", [{"role": "user", "content": "Summarise the SOW"}], {"temperature": 0.3, "max_tokens": 100})
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    cache.put("k", "4o", {"text": "cached"})
+    clock["t"] += 59
+    assert cache.get("k") == {"text": "cached"}
+    clock["t"] += 2
+    assert cache.get("k") is None
+
+
+def test_eviction_keeps_the_most_recently_used(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=3600, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, "4o", {"text": key})
+        clock["t"] += 1
+    assert cache.get("a") == {"text": "a"}        # touching "a" makes "b" the least recently used
+    clock["t"] += 1
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") == {"text": "a"}
+    assert cache.get("c") == {"text": "c"}
+
+
+def test_eviction_drops_expired_entries_first(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl=10, max_entries=10)
+    cache.put("old", "4o", {"text": "old"})
+    clock["t"] += 20
+    cache.put("new", "4o", {"text": "new"})
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("new") == {"text": "new"}
+
+
+def test_gateway_serves_repeated_calls_from_the_cache(tmp_path):
+    backend = llm_gateway.FakeBackend()
+    gateway = llm_gateway.LLMGateway(backend=backend, cache=ResponseCache(str(tmp_path / "cache.sqlite3")))
+    first = gateway.complete(MESSAGES, "cache-dep", temperature=0.3)
+    again = gateway.complete(MESSAGES, "cache-dep", temperature=0.3)
+    refreshed = gateway.complete(MESSAGES, "cache-dep", temperature=0.3, refresh=True)
+
+    assert not first.cached and again.cached and not refreshed.cached
+    assert again.text == first.text
+    assert len(backend.calls) == 2
@@ -0,0 +1,38 @@
+import pytest
+
+from Modules import llm_gateway
+
+
+MESSAGES = [{"role": "user", "content": "Summarise the RFP"}]
+
+
+def test_retries_transient_errors(fake_backend):
+    backend = fake_backend(failures=[503, 500])
+    result = llm_gateway.chat(MESSAGES, "gw-retry")
+    assert result.text == "[gw-retry] Summarise the RFP"
+    assert result.attempts == 3
+    assert len(backend.calls) == 3
+
+
+def test_does_not_retry_client_errors(fake_backend):
+    backend = fake_backend(failures=[400])
+    with pytest.raises(llm_gateway.LLMError) as raised:
+        llm_gateway.chat(MESSAGES, "gw-400")
+    assert raised.value.status == 400
+    assert raised.value.attempts == 1
+    assert not raised.value.retryable
+    assert len(backend.calls) == 1
+
+
+def test_gives_up_after_max_attempts(fake_backend):
+    backend = fake_backend(failures=[503, 503, 503])
+    with pytest.raises(llm_gateway.LLMError) as raised:
+        llm_gateway.chat(MESSAGES, "gw-exhausted", max_attempts=2)
+    assert raised.value.attempts == 2
+    assert len(backend.calls) == 2
+
+
+def test_deadline_covers_the_call(fake_backend):
+    fake_backend(latency=0.5)
+    with pytest.raises(llm_gateway.LLMTimeoutError):
+        llm_gateway.chat(MESSAGES, "gw-slow", timeout=0.1)
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from Modules import llm_gateway, model_routing
+from Modules.model_routing import Route
+
+
+MESSAGES = [{"role": "user", "content": "Write the scope"}]
+
+
+def failing_on(*deployments):
+    def responder(deployment, messages, params):
+        if deployment in deployments:
+            raise llm_gateway.FakeStatusError(400)
+        return f"answer from {deployment}"
+    return responder
+
+
+def test_falls_back_along_the_chain(fake_backend):
+    backend = fake_backend(responder=failing_on("rt-a", "rt-b"))
+    route = Route(task="scope", deployment="rt-a", fallbacks=["rt-b", "rt-c"], latency_seconds=5)
+    result = asyncio.run(model_routing.achat("scope", MESSAGES, route=route))
+    assert result.text == "answer from rt-c"
+    assert [c["deployment"] for c in backend.calls] == ["rt-a", "rt-b", "rt-c"]
+
+
+def test_raises_the_last_error_when_every_deployment_fails(fake_backend):
+    fake_backend(responder=failing_on("rt-a", "rt-b"))
+    route = Route(task="scope", deployment="rt-a", fallbacks=["rt-b"], latency_seconds=5)
+    with pytest.raises(llm_gateway.LLMError) as raised:
+        model_routing.chat("scope", MESSAGES, route=route)
+    assert raised.value.deployment == "rt-b"
+
+
+def write_routes(path, table, mtime):
+    path.write_text(json.dumps(table), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_routes_file_is_reread_when_it_changes(tmp_path):
+    path = tmp_path / "model_routes.json"
+    write_routes(path, {"scope": {"deployment": "rt-a"}}, 1000)
+    assert model_routing.load_routes(str(path))["scope"]["deployment"] == "rt-a"
+    write_routes(path, {"scope": {"deployment": "rt-b"}}, 2000)
+    assert model_routing.load_routes(str(path))["scope"]["deployment"] == "rt-b"
+    assert model_routing.load_routes(str(tmp_path / "missing.json")) == {}
+
+
+def test_task_route_is_merged_over_the_default(monkeypatch):
+    table = {
+        "default": {"deployment": "rt-default", "temperature": 0.1, "slo": {"latency_seconds": 60}},
+        "scope": {"deployment": "rt-a", "fallbacks": ["rt-b", "rt-a"], "max_tokens": 900,
+                  "slo": {"latency_seconds": 30, "max_cost_usd": 0.05}},
+    }
+    monkeypatch.setattr(model_routing, "load_routes", lambda: table)
+
+    scope = model_routing.get_route("scope")
+    assert (scope.deployment, scope.temperature, scope.max_tokens) == ("rt-a", 0.1, 900)
+    assert (scope.latency_seconds, scope.max_cost_usd) == (30, 0.05)
+    assert scope.chain == ["rt-a", "rt-b"]
+    assert scope.params() == {"temperature": 0.1, "max_tokens": 900}
+
+    other = model_routing.get_route("communication_plan")
+    assert (other.deployment, other.latency_seconds, other.fallbacks) == ("rt-default", 60, [])
+    assert other.params() == {"temperature": 0.1}
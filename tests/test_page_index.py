@@ -0,0 +1,78 @@
+import numpy as np
+
+from Modules.checkpoints import RunCheckpoint
+from Modules.page_index import (
+    PAGES_ARTIFACT, SECTION_MAX_PAGES, build_page_index, diff_pages, reuse_previous_version, section_pages,
+    sections_to_regenerate,
+)
+from Modules.proposal_memory import reuse_settings
+from Modules.sections import SECTION_KEYS, load_section
+
+
+def index(hashes, sections, num_interfaces=None):
+    return {"hashes": hashes, "sections": sections, "num_interfaces": num_interfaces}
+
+
+def test_diff_pages_of_identical_versions_is_empty():
+    assert diff_pages(["a", "b", "c"], ["a", "b", "c"]) == ([], [])
+
+
+def test_diff_pages_changed_page():
+    assert diff_pages(["a", "B", "c"], ["a", "b", "c"]) == ([1], [1])
+
+
+def test_diff_pages_inserted_page_does_not_shift_the_rest():
+    assert diff_pages(["a", "new", "b", "c"], ["a", "b", "c"]) == ([1], [])
+
+
+def test_diff_pages_removed_page():
+    assert diff_pages(["a", "c"], ["a", "b", "c"]) == ([], [1])
+
+
+def test_only_sections_fed_by_changed_pages_are_regenerated():
+    old = index(["p0", "p1", "p2", "p3"], {"scope": [0, 1], "resource_schedule": [3]}, num_interfaces=40)
+    new = index(["p0", "p1", "p2", "p3-v2"], {"scope": [0, 1], "resource_schedule": [3]}, num_interfaces=40)
+    assert sections_to_regenerate(new, old, sections=("scope", "resource_schedule")) == ["resource_schedule"]
+
+
+def test_section_pages_keeps_pages_close_to_the_best():
+    scores = np.array([0.9, 0.2, 0.85, 0.5, 0.1])
+    page_of = np.array([0, 0, 1, 2, 3])
+    assert section_pages(scores, page_of, pages=4) == [0, 1]
+
+
+def test_section_pages_is_capped():
+    pages = SECTION_MAX_PAGES + 4
+    scores = np.full(pages, 0.9)
+    assert len(section_pages(scores, np.arange(pages), pages)) == SECTION_MAX_PAGES
+
+
+def test_section_pages_without_passages():
+    assert section_pages(np.array([]), np.array([], dtype=int), pages=3) == []
+
+
+RFP_PAGES = [
+    "Acme Utilities invites proposals to migrate 113 SAP PI interfaces to SAP Integration Suite.",
+    "Scope: all ICOs listed in Annex A, including IDoc, SOAP and SFTP adapters, with unit and SIT testing.",
+    "Schedule: the migration must complete within twelve weeks. Bidders list roles, rates and payment terms.",
+    "Communication: weekly status meetings, a steering committee each month and an escalation path.",
+]
+
+
+def test_unchanged_rfp_reuses_every_section_with_its_summary(tmp_path):
+    settings = reuse_settings("reference SOW", "extractive", "2024.08-1")
+    first = RunCheckpoint("first", str(tmp_path))
+    first.save_artifact(PAGES_ARTIFACT, build_page_index(RFP_PAGES, settings, num_interfaces=113))
+    first.save("exec_summary", ("Acme wants its interfaces on Integration Suite.", "Objective text"))
+    for key in SECTION_KEYS[1:]:
+        first.save(key, f"{key} text")
+
+    again = RunCheckpoint("again", str(tmp_path))
+    index = build_page_index(RFP_PAGES, settings, num_interfaces=113)
+    again.save_artifact(PAGES_ARTIFACT, index)
+    source, share, changed, reused, regenerate = reuse_previous_version(again, index, SECTION_KEYS, str(tmp_path))
+
+    assert source.run_id == "first" and share == 1.0
+    assert changed == [] and regenerate == []
+    assert load_section(again, "exec_summary") == ("Acme wants its interfaces on Integration Suite.", "Objective text")
+    assert load_section(again, "scope") == "scope text"
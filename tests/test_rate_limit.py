@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from Modules import llm_gateway
+from Modules.rate_limit import AdaptiveConcurrency, SQLiteBucketStore, _take
+
+
+SPECS = {"tokens": (1000.0, 100.0), "requests": (10.0, 1.0)}
+
+
+def full():
+    return {"tokens": 1000.0, "requests": 10.0}
+
+
+def test_take_fits_in_a_full_bucket():
+    levels = full()
+    assert _take(levels, SPECS, {"tokens": 400, "requests": 1}, 0.0, now=0.0, updated_at=0.0) == 0
+    assert levels == {"tokens": 600.0, "requests": 9.0}
+
+
+def test_take_returns_the_wait_and_takes_nothing_when_short():
+    levels = {"tokens": 100.0, "requests": 10.0}
+    wait = _take(levels, SPECS, {"tokens": 400, "requests": 1}, 0.0, now=0.0, updated_at=0.0)
+    assert wait == pytest.approx(3.0)          # 300 tokens at 100 tokens/s
+    assert levels == {"tokens": 100.0, "requests": 10.0}
+
+
+def test_take_refills_up_to_capacity():
+    levels = {"tokens": 0.0, "requests": 0.0}
+    assert _take(levels, SPECS, {"tokens": 500, "requests": 1}, 0.0, now=60.0, updated_at=0.0) == 0
+    assert levels == {"tokens": 500.0, "requests": 9.0}
+
+
+def test_batch_reserve_is_left_for_interactive_calls():
+    levels = {"tokens": 500.0, "requests": 10.0}
+    costs = {"tokens": 300, "requests": 1}
+    assert _take(dict(levels), SPECS, costs, 0.0, now=0.0, updated_at=0.0) == 0
+    # with a quarter of the bucket reserved, 300 + 250 tokens must be available
+    assert _take(dict(levels), SPECS, costs, 0.25, now=0.0, updated_at=0.0) == pytest.approx(0.5)
+
+
+def test_cost_above_capacity_needs_a_full_bucket_and_leaves_debt():
+    levels = full()
+    assert _take(levels, SPECS, {"tokens": 1500, "requests": 1}, 0.0, now=0.0, updated_at=0.0) == 0
+    assert levels["tokens"] == -500.0
+
+
+def test_throttle_is_shared_through_the_sqlite_store(tmp_path):
+    path = str(tmp_path / "ratelimit.sqlite3")
+    first, second = SQLiteBucketStore(path), SQLiteBucketStore(path)
+    assert first.try_acquire("rl-shared", 100) == 0
+    first.block("rl-shared", 30)
+    assert second.try_acquire("rl-shared", 100) == pytest.approx(30, abs=1)
+
+
+def test_concurrency_halves_on_throttle_and_grows_back_slowly():
+    slot = AdaptiveConcurrency(8)
+    slot.on_throttle()
+    slot.on_throttle()                    # within the decrease interval: no second halving
+    assert slot.limit == 4
+    slot.on_success()
+    assert slot.limit == pytest.approx(4.25)
+
+
+def test_slot_wait_gives_up_without_taking_the_slot():
+    slot = AdaptiveConcurrency(1)
+
+    async def run():
+        async with slot:
+            with pytest.raises(asyncio.TimeoutError):
+                async with slot.within(0.05):
+                    pass
+            assert slot.in_flight == 1
+        async with slot.within(0.05):
+            assert slot.in_flight == 1
+
+    asyncio.run(run())
+    assert slot.in_flight == 0
+
+
+def test_waiting_for_a_concurrency_slot_counts_against_the_deadline():
+    gateway = llm_gateway.LLMGateway(backend=llm_gateway.FakeBackend(latency=1.0))
+    gateway.limiter.slot("gw-slot").limit = 1
+
+    async def late():
+        await asyncio.sleep(0.05)                 # queue behind the call holding the only slot
+        started = time.monotonic()
+        with pytest.raises(llm_gateway.LLMTimeoutError):
+            await gateway.acomplete([{"role": "user", "content": "Another RFP"}], "gw-slot", timeout=0.3)
+        return time.monotonic() - started
+
+    async def run():
+        holder = asyncio.ensure_future(gateway.acomplete([{"role": "user", "content": "An RFP"}], "gw-slot", timeout=5))
+        waited = await late()
+        await holder
+        return waited
+
+    assert asyncio.run(run()) < 0.6
@@ -0,0 +1,62 @@
+from Modules.ingestion import heading_section, split_reference_sections
+
+
+REFERENCE_SOW = "\n".join([
+    "Statement of Work",
+    "Table of Contents",
+    "Executive Summary3",
+    "Scope and Out of Scope5",
+    "1. Executive Summary",
+    "Crave InfoTech will migrate the client's SAP PI interfaces.",
+    "Objective",
+    "Move 113 ICOs to Integration Suite.",
+    "2. Scope and Out of Scope",
+    "All ICOs listed in the appendix.",
+    "Assumptions:",
+    "The client provides system access.",
+    "3. Resource Schedule & Commercials",
+    "| Role | Weeks |",
+    "Communication Plan",
+    "Weekly status meetings.",
+    "Sign off",
+    "Name, title, date",
+])
+
+
+def test_headings_are_recognised_with_numbering_and_colons():
+    assert heading_section("2. Scope and Out of Scope") == (True, "scope")
+    assert heading_section("Assumptions:") == (True, "scope")
+    assert heading_section("Sign off") == (True, None)
+    assert heading_section("All ICOs listed in the appendix.") == (False, None)
+
+
+def test_table_of_contents_entries_are_not_headings():
+    assert heading_section("Scope and Out of Scope5") == (False, None)
+
+
+def test_split_reference_sections():
+    sections = split_reference_sections(REFERENCE_SOW)
+    assert sections["exec_summary"].splitlines() == [
+        "1. Executive Summary",
+        "Crave InfoTech will migrate the client's SAP PI interfaces.",
+        "Objective",
+        "Move 113 ICOs to Integration Suite.",
+    ]
+    assert "The client provides system access." in sections["scope"]
+    assert sections["resource_schedule"] == "3. Resource Schedule & Commercials\n| Role | Weeks |"
+    assert sections["communication_plan"] == "Communication Plan\nWeekly status meetings."
+    assert all("Name, title, date" not in text for text in sections.values())
+
+
+def test_section_without_headings_gets_the_whole_text():
+    text = "Executive Summary\nSome summary.\nNo other headings here."
+    sections = split_reference_sections(text)
+    assert sections["exec_summary"] == text
+    assert sections["scope"] == text
+
+
+def test_cover_page_is_dropped_and_only_requested_sections_returned():
+    sections = split_reference_sections(REFERENCE_SOW, sections=("scope",))
+    assert list(sections) == ["scope"]
+    assert sections["scope"].startswith("2. Scope and Out of Scope")
+    assert "Table of Contents" not in sections["scope"]
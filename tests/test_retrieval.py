@@ -0,0 +1,94 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from Modules.retrieval import LocalReplica, RetrievalRouter, get_replica, sync_replica
+
+
+VECTORS = {
+    "scope-1": ([1.0, 0.0, 0.0], {"text": "Scope of the migration", "section": "scope"}),
+    "pay-1": ([0.0, 1.0, 0.0], {"text": "Payment terms", "section": ["commercials", "terms"]}),
+    "plan-1": ([0.0, 0.0, 1.0], {"text": "Communication plan", "section": "communication_plan"}),
+}
+
+
+class FakeIndex:
+    """The slice of the Pinecone index API that sync_replica uses."""
+
+    def list(self, namespace=None):
+        ids = list(VECTORS)
+        return [ids[:2], ids[2:]]
+
+    def fetch(self, ids, namespace=None):
+        return SimpleNamespace(vectors={
+            vec_id: SimpleNamespace(values=VECTORS[vec_id][0], metadata=VECTORS[vec_id][1]) for vec_id in ids
+        })
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [1.0, 0.1, 0.0]
+
+
+class RemoteStore:
+    def __init__(self, delay=0.0, error=None):
+        self.delay, self.error = delay, error
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [("remote answer", 1.0)]
+
+
+@pytest.fixture
+def revision():
+    name = f"rev-{uuid.uuid4().hex[:8]}"
+    sync_replica(FakeIndex(), name)
+    return name
+
+
+def test_replica_answers_by_cosine_similarity(revision):
+    replica = get_replica(revision)
+    results = replica.similarity_search_by_vector_with_score([0.9, 0.2, 0.0], k=2)
+    assert [doc.page_content for doc, _ in results] == ["Scope of the migration", "Payment terms"]
+    assert results[0][0].metadata == {"section": "scope"}
+    assert results[0][1] > results[1][1]
+
+
+def test_replica_filters_like_pinecone():
+    replica = LocalReplica(list(VECTORS), np.array([v for v, _ in VECTORS.values()]), [m for _, m in VECTORS.values()])
+    in_terms = replica.similarity_search_by_vector_with_score([1.0, 0.0, 0.0], k=3, filter={"section": {"$in": ["terms"]}})
+    assert [doc.page_content for doc, _ in in_terms] == ["Payment terms"]
+    equal = replica.similarity_search_by_vector_with_score([1.0, 0.0, 0.0], k=3, filter={"section": "communication_plan"})
+    assert [doc.page_content for doc, _ in equal] == ["Communication plan"]
+
+
+def test_router_uses_pinecone_within_the_deadline(revision):
+    router = RetrievalRouter(RemoteStore(), FakeEmbeddings(), revision, deadline=1.0)
+    assert router.similarity_search_with_score("scope") == [("remote answer", 1.0)]
+    assert router.failovers == []
+
+
+def test_router_fails_over_to_the_replica_on_timeout(revision):
+    router = RetrievalRouter(RemoteStore(delay=0.5), FakeEmbeddings(), revision, deadline=0.1)
+    started = time.monotonic()
+    docs = router.similarity_search("scope", k=1)
+    assert time.monotonic() - started < 0.4
+    assert [doc.page_content for doc in docs] == ["Scope of the migration"]
+    assert router.failovers == ["timeout: no answer within 0.1s"]
+
+
+def test_router_fails_over_to_the_replica_on_error(revision):
+    router = RetrievalRouter(RemoteStore(error=ConnectionError("pinecone down")), FakeEmbeddings(), revision)
+    assert [doc.page_content for doc in router.similarity_search("scope", k=1)] == ["Scope of the migration"]
+    assert router.failovers == ["error: pinecone down"]
+
+
+def test_router_without_replica_raises():
+    router = RetrievalRouter(RemoteStore(error=ConnectionError("pinecone down")), FakeEmbeddings(), "rev-never-synced")
+    with pytest.raises(RuntimeError, match="no local replica"):
+        router.similarity_search("scope")
@@ -0,0 +1,62 @@
+import asyncio
+
+from Modules import llm_gateway
+
+
+MESSAGES = [{"role": "user", "content": "Summarise the RFP"}]
+
+
+def test_identical_requests_in_flight_are_joined(fake_backend):
+    backend = fake_backend(latency=0.2)
+
+    async def run():
+        return await asyncio.gather(*[llm_gateway.achat(MESSAGES, "gw-flight") for _ in range(3)])
+
+    results = asyncio.run(run())
+    assert len(backend.calls) == 1
+    assert sorted(r.shared for r in results) == [False, True, True]
+    assert {r.text for r in results} == {"[gw-flight] Summarise the RFP"}
+
+
+def test_single_flight_does_not_cross_lanes_or_parameters(fake_backend):
+    backend = fake_backend(latency=0.2)
+
+    async def run():
+        return await asyncio.gather(
+            llm_gateway.achat(MESSAGES, "gw-lanes"),
+            llm_gateway.achat(MESSAGES, "gw-lanes", lane="batch"),
+            llm_gateway.achat(MESSAGES, "gw-lanes", temperature=0),
+        )
+
+    results = asyncio.run(run())
+    assert len(backend.calls) == 3
+    assert not any(r.shared for r in results)
+
+
+def test_a_failure_reaches_every_joined_caller(fake_backend):
+    backend = fake_backend(latency=0.1, failures=[400])
+
+    async def run():
+        return await asyncio.gather(
+            *[llm_gateway.achat(MESSAGES, "gw-flight-error") for _ in range(2)], return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert len(backend.calls) == 1
+    assert all(isinstance(r, llm_gateway.LLMError) and r.status == 400 for r in results)
+
+
+def test_request_keeps_running_while_a_joined_caller_waits(fake_backend):
+    backend = fake_backend(latency=0.2)
+
+    async def run():
+        leader = asyncio.ensure_future(llm_gateway.achat(MESSAGES, "gw-flight-leader"))
+        await asyncio.sleep(0.02)
+        joined = asyncio.ensure_future(llm_gateway.achat(MESSAGES, "gw-flight-leader"))
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        return await joined
+
+    result = asyncio.run(run())
+    assert result.shared and result.text == "[gw-flight-leader] Summarise the RFP"
+    assert len(backend.calls) == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from Modules import llm_gateway
+
+
+MESSAGES = [{"role": "user", "content": "Summarise the RFP"}]
+
+
+def test_streamed_text_is_reported_as_it_grows(fake_backend):
+    backend = fake_backend(responder=lambda deployment, messages, params: "one two three")
+    seen = []
+    result = llm_gateway.chat(MESSAGES, "gw-stream-grow", on_text=seen.append)
+    assert seen == ["one", "one two", "one two three"]
+    assert backend.calls[0]["params"]["stream"] is True
+    assert result.finish_reason == "stop"
+    assert result.ttft is not None and result.ttft <= result.latency
+
+
+def test_streamed_text_is_reported_and_kept_unstripped(fake_backend):
+    fake_backend(responder=lambda deployment, messages, params: "first second ")
+    seen = []
+    result = llm_gateway.chat(MESSAGES, "gw-stream", on_text=seen.append)
+    assert seen[-1] == result.text == "first second "
+
+
+def test_call_is_not_streamed_without_a_callback(fake_backend):
+    backend = fake_backend()
+    result = llm_gateway.chat(MESSAGES, "gw-no-stream")
+    assert "stream" not in backend.calls[0]["params"]
+    assert result.ttft is None and result.tokens_per_sec is None
+
+
+def test_tokens_per_sec_counts_after_the_first_token():
+    result = llm_gateway.LLMResult(
+        text="x", deployment="gw", usage={"completion_tokens": 100}, latency=2.5, ttft=0.5
+    )
+    assert result.tokens_per_sec == pytest.approx(50.0)
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from Modules.model_routing import Route
+from Modules.structured import (
+    COMMUNICATION_PLAN_FIELDS, Field, StructuredOutputError, TABLE_SCHEMA, build_schema, generate_structured,
+    parse_json, partial_string_field, repair_structured, table_check, table_to_markdown, text_check, validate,
+)
+
+
+PLAN = {
+    "client_name": "Acme Utilities",
+    "intro": "Crave InfoTech and Acme Utilities will keep each other informed through the "
+             "meetings and reports below for the whole migration.",
+    "daily_interaction": {
+        "headers": ["Meeting", "Frequency", "Participants", "Purpose", "Owner"],
+        "rows": [
+            ["Stand-up", "Daily", "Team", "Progress", "PM"],
+            ["Status", "Weekly", "Leads", "Risks", "PM"],
+            ["Steering", "Monthly", "Sponsors", "Decisions", "AE"],
+        ],
+    },
+}
+
+
+MESSAGES = [{"role": "user", "content": "Write the communication plan"}]
+
+
+def test_text_check():
+    check = text_check(min_words=3)
+    assert check("one two three") is None
+    assert check("one two") == "must have at least 3 words"
+    assert check("  ") == "must be a non-empty string"
+    assert check(42) == "must be a non-empty string"
+
+
+def test_table_check():
+    check = table_check(columns=2, min_rows=1)
+    assert check({"headers": ["No.", "Objective"], "rows": [["1", "Migrate"]]}) is None
+    assert check({"headers": ["No."], "rows": [["1"]]}) == "must have exactly 2 columns"
+    assert check({"headers": ["No.", "Objective"], "rows": []}) == "must have at least 1 row(s)"
+    assert check({"headers": ["No.", "Objective"], "rows": [["1"]]}) == "row 1 must be a list of 2 strings"
+    assert check("| No. | Objective |") == "must be an object with headers and rows"
+
+
+def test_validate_reports_missing_and_malformed_fields():
+    assert validate(PLAN, COMMUNICATION_PLAN_FIELDS) == {}
+    broken = {**PLAN, "intro": "Too short.", "daily_interaction": {"headers": ["Meeting"], "rows": [["x"]]}}
+    del broken["client_name"]
+    assert validate(broken, COMMUNICATION_PLAN_FIELDS) == {
+        "client_name": "missing",
+        "intro": "must have at least 20 words",
+        "daily_interaction": "must have exactly 5 columns",
+    }
+
+
+def test_build_schema_nests_dotted_paths():
+    schema = build_schema([Field("summary", {"type": "string"}), Field("objective.table", TABLE_SCHEMA)])
+    assert schema["required"] == ["summary", "objective"]
+    objective = schema["properties"]["objective"]
+    assert objective["required"] == ["table"]
+    assert objective["properties"]["table"] is TABLE_SCHEMA
+    assert objective["additionalProperties"] is False
+
+
+def test_parse_json_tolerates_fences_and_prose():
+    assert parse_json('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parse_json('Here it is: {"a": {"b": 2}} Thanks') == {"a": {"b": 2}}
+    assert parse_json('{"a": 1') is None
+    assert parse_json("[1, 2]") is None
+
+
+def test_partial_string_field_of_a_streaming_object():
+    assert partial_string_field('{"exec_summary": "Acme wants to', "exec_summary") == "Acme wants to"
+    assert partial_string_field('{"exec_summary": "Line\\nnext", "x"', "exec_summary") == "Line\nnext"
+    assert partial_string_field('{"exec_summary": "caf\\u00', "exec_summary") == "caf"
+    assert partial_string_field('{"objective": {', "exec_summary") is None
+
+
+def test_table_to_markdown():
+    assert table_to_markdown({"headers": ["A", "B"], "rows": [["1", "x|y"]]}) == "| A | B |\n|---|---|\n| 1 | x/y |"
+
+
+def test_only_malformed_fields_are_reasked(fake_backend):
+    def responder(deployment, messages, params):
+        if params["response_format"]["json_schema"]["name"] == "plan_intro":
+            return json.dumps({"value": PLAN["intro"]})
+        return json.dumps(dict(PLAN, intro="Too short."))
+
+    backend = fake_backend(responder=responder)
+    route = Route(task="communication_plan", deployment="st-plan", latency_seconds=5)
+    data, _ = generate_structured("communication_plan", MESSAGES, COMMUNICATION_PLAN_FIELDS, "plan", route=route)
+    assert data == PLAN
+    assert len(backend.calls) == 2
+    assert "`intro`" in backend.calls[1]["messages"][-1]["content"]
+
+
+def test_fields_still_malformed_after_reasks_raise(fake_backend):
+    fake_backend(responder=lambda deployment, messages, params: json.dumps({"value": "Too short."}))
+    route = Route(task="communication_plan", deployment="st-plan", latency_seconds=5)
+    with pytest.raises(StructuredOutputError):
+        repair_structured("communication_plan", MESSAGES, json.dumps(dict(PLAN, intro="Too short.")),
+                          COMMUNICATION_PLAN_FIELDS, "plan", route=route, max_reasks=1)
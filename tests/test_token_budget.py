@@ -0,0 +1,79 @@
+from Modules.token_budget import SAFETY_MARGIN_TOKENS, Segment, TokenBudget, fit_prompt
+
+
+MAX_TOKENS = 100
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(1, n + 1))
+
+
+def build_prompt(reference, rfp):
+    return [{"role": "system", "content": f"REF:\n{reference}"}, {"role": "user", "content": f"RFP:\n{rfp}"}]
+
+
+def budget_of(prompt_tokens, max_cost=1.0):
+    """TokenBudget whose prompt budget is `prompt_tokens` (context-bound) with MAX_TOKENS for the answer."""
+    limits = {
+        "context": prompt_tokens + MAX_TOKENS + SAFETY_MARGIN_TOKENS,
+        "prompt_price": 0.001, "completion_price": 0.0, "max_cost": max_cost,
+    }
+    return TokenBudget("tb-test", limits)
+
+
+def fit(budget, reference_floor=8, rfp_floor=8):
+    return budget.fit(
+        build_prompt,
+        [Segment("reference", words("ref", 10), reference_floor), Segment("rfp", words("rfp", 10), rfp_floor)],
+        MAX_TOKENS,
+    )
+
+
+def test_prompt_that_fits_is_left_alone():
+    budget = budget_of(100)
+    prompt, report = fit(budget)
+    assert prompt == build_prompt(words("ref", 10), words("rfp", 10))
+    assert not report["trimmed"]
+
+
+def test_floors_are_kept_on_the_first_pass():
+    budget = budget_of(budget_of(0).count_static("REF:\n\nRFP:\n") + 16)
+    prompt, report = fit(budget)
+    # 4 tokens over: the reference gives 2 down to its floor, then the RFP 2 down to its floor
+    assert report["segments"] == {"reference": (10, 8), "rfp": (10, 8)}
+    assert report["trimmed"]
+    assert prompt[0]["content"].split() == ["REF:", *words("ref", 8).split()]
+    assert prompt[1]["content"].split() == ["RFP:", *words("rfp", 8).split()]
+
+
+def test_second_pass_trims_below_floors_in_trim_order():
+    budget = budget_of(budget_of(0).count_static("REF:\n\nRFP:\n") + 14)
+    _, report = fit(budget)
+    # 6 tokens over: 2 + 2 down to the floors, then the last 2 from the reference again
+    assert report["segments"] == {"reference": (10, 6), "rfp": (10, 8)}
+
+
+def test_tight_budget_can_empty_a_segment():
+    budget = budget_of(budget_of(0).count_static("REF:\n\nRFP:\n") + 2)
+    prompt, report = fit(budget, reference_floor=2, rfp_floor=2)
+    assert report["segments"] == {"reference": (10, 0), "rfp": (10, 2)}
+    assert prompt[0]["content"] == "REF:\n"
+
+
+def test_cost_budget_caps_the_prompt():
+    budget = budget_of(10_000, max_cost=0.02)      # 0.02 USD at 0.001 per 1k prompt tokens
+    assert budget.prompt_budget(MAX_TOKENS) == 10_000
+    cheap = budget_of(10_000, max_cost=0.005)
+    assert cheap.prompt_budget(MAX_TOKENS) == 5_000
+
+
+def test_fit_prompt_trims_the_reference_before_the_rfp():
+    def build(reference_text, condensed_rfp):
+        return build_prompt(reference_text, condensed_rfp)
+
+    # 4o: 0.0025 USD per 1k prompt tokens, 0.001 USD reserved for 100 completion tokens -> ~30 prompt tokens
+    _, report = fit_prompt("4o", build, words("ref", 20), words("rfp", 20), MAX_TOKENS, max_cost=0.001075)
+    assert report["budget"] < 42
+    assert report["segments"]["condensed_rfp"] == (20, 20)
+    assert report["segments"]["reference_text"][1] < 20
+    assert report["prompt_tokens"] <= report["budget"]
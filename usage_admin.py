@@ -0,0 +1,57 @@
+import datetime
+
+import pandas as pd
+import streamlit as st
+
+from Modules.usage_store import get_store
+
+
+# -------------------------------------------------------
+# Usage & cost admin page
+# -------------------------------------------------------
+
+def _frame(rows, money=("cost_usd", "avg_cost_usd")):
+    df = pd.DataFrame(rows)
+    for column in money:
+        if column in df:
+            df[column] = df[column].round(4)
+    return df
+
+
+def main():
+    st.markdown("## 📊 LLM Usage & Cost")
+    store = get_store()
+
+    days = st.slider("Period (days)", min_value=1, max_value=90, value=30)
+    daily = store.daily_totals(days)
+    if not daily:
+        st.info("No LLM calls recorded yet.")
+        return
+
+    total_cost = sum(d["cost_usd"] or 0 for d in daily)
+    total_runs = sum(d["runs"] or 0 for d in daily)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Estimated cost", f"${total_cost:,.2f}")
+    col2.metric("Runs", f"{total_runs:,}")
+    col3.metric("Cost per run", f"${total_cost / total_runs:,.3f}" if total_runs else "–")
+
+    st.markdown("### 📅 Per day")
+    daily_df = _frame(daily)
+    st.bar_chart(daily_df.set_index("day")["cost_usd"].sort_index())
+    st.dataframe(daily_df, use_container_width=True, hide_index=True)
+
+    st.markdown("### 💸 Most expensive sections")
+    st.dataframe(_frame(store.top_sections(days=days)), use_container_width=True, hide_index=True)
+
+    st.markdown("### 🧾 Runs")
+    runs = store.run_totals()
+    runs_df = _frame(runs)
+    if not runs_df.empty:
+        runs_df["started_at"] = runs_df["started_at"].map(
+            lambda ts: datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+        )
+    st.dataframe(runs_df, use_container_width=True, hide_index=True)
+
+    run_id = st.selectbox("Calls of run", [r["run_id"] for r in runs])
+    if run_id:
+        st.dataframe(_frame(store.run_calls(run_id)), use_container_width=True, hide_index=True)